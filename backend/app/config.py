@@ -12,8 +12,107 @@ class Config:
     SECRET_KEY = config('SECRET_KEY', cast=str)
     ALGORITHM = config('ALGORITHM', default='HS256', cast=str)
     ACCESS_TOKEN_EXPIRE_MINUTES = config('ACCESS_TOKEN_EXPIRE_MINUTES', default=30, cast=int)
+    # Password hashing: bcrypt cost, hashing threads, and hashes queued or
+    # running before login/register answer 503
+    BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+    HASH_WORKERS = config('HASH_WORKERS', default=2, cast=int)
+    HASH_MAX_PENDING = config('HASH_MAX_PENDING', default=32, cast=int)
+    # Authenticated users cached per process (0 disables)
+    AUTH_CACHE_SIZE = config('AUTH_CACHE_SIZE', default=10000, cast=int)
+    AUTH_CACHE_TTL_SECONDS = config('AUTH_CACHE_TTL_SECONDS', default=60, cast=float)
 
     # Upload configuration
     UPLOAD_DIR = config('UPLOAD_DIR', default='uploads', cast=str)
 
+    # Text extraction (longer PDFs are parsed in a process pool)
+    PDF_WORKERS = config('PDF_WORKERS', default=2, cast=int)
+    PDF_PAGES_PER_TASK = config('PDF_PAGES_PER_TASK', default=25, cast=int)
+    # Shorter PDFs are extracted in the calling thread, skipping the pool's IPC
+    PDF_POOL_MIN_PAGES = config('PDF_POOL_MIN_PAGES', default=25, cast=int)
+    # Parser for quiz and results PDFs: "PyPDF2" (faster) or "pypdf" (the default elsewhere)
+    QUIZ_PDF_PARSER = config('QUIZ_PDF_PARSER', default='PyPDF2', cast=str)
+    PDF_EXTRACT_TIMEOUT = config('PDF_EXTRACT_TIMEOUT', default=120, cast=float)
+    # Extracted text beyond this many characters is dropped
+    EXTRACT_MAX_CHARS = config('EXTRACT_MAX_CHARS', default=4_000_000, cast=int)
+
+    # Bulk lecture import (POST /lectures/import)
+    IMPORT_MAX_LECTURES = config('IMPORT_MAX_LECTURES', default=200, cast=int)
+    # Uncompressed size of all files referenced by one import
+    IMPORT_MAX_BYTES = config('IMPORT_MAX_BYTES', default=1 << 30, cast=int)
+    # Lectures inserted per transaction
+    IMPORT_BATCH_SIZE = config('IMPORT_BATCH_SIZE', default=25, cast=int)
+    # Documents extracted at once (PDFs still share the PDF_WORKERS pool)
+    IMPORT_EXTRACT_CONCURRENCY = config('IMPORT_EXTRACT_CONCURRENCY', default=4, cast=int)
+
+    # Full-text search: "oracle" (Oracle Text), "local" (in-process index, for
+    # development) or "auto" (Oracle Text if its index exists)
+    SEARCH_BACKEND = config('SEARCH_BACKEND', default='auto', cast=str)
+
+    # Chunk embeddings (Cohere embed on OCI): chunk size and overlap in
+    # estimated tokens, inputs per embed request (the API takes at most 96),
+    # requests in flight, and documents embedded per transaction
+    EMBED_CHUNK_TOKENS = config('EMBED_CHUNK_TOKENS', default=400, cast=int)
+    EMBED_CHUNK_OVERLAP_TOKENS = config('EMBED_CHUNK_OVERLAP_TOKENS', default=40, cast=int)
+    EMBED_BATCH_SIZE = config('EMBED_BATCH_SIZE', default=96, cast=int)
+    EMBED_CONCURRENCY = config('EMBED_CONCURRENCY', default=4, cast=int)
+    EMBED_DOCUMENTS_PER_RUN = config('EMBED_DOCUMENTS_PER_RUN', default=50, cast=int)
+
+    # Local vector index over chunk embeddings (memory-mapped files, one
+    # directory per embedding model): partitions probed per query, the row
+    # count from which partitions are trained and probed instead of scanning
+    # every vector, and query embeddings kept in memory per process
+    VECTOR_INDEX_DIR = config('VECTOR_INDEX_DIR', default='cache/vector_index', cast=str)
+    VECTOR_NPROBE = config('VECTOR_NPROBE', default=8, cast=int)
+    VECTOR_IVF_MIN_ROWS = config('VECTOR_IVF_MIN_ROWS', default=20000, cast=int)
+    VECTOR_QUERY_CACHE_SIZE = config('VECTOR_QUERY_CACHE_SIZE', default=1024, cast=int)
+
+    # Class analytics job queue
+    ANALYTICS_WORKERS = config('ANALYTICS_WORKERS', default=2, cast=int)
+    ANALYTICS_MAX_PENDING = config('ANALYTICS_MAX_PENDING', default=20, cast=int)
+
+    # Label name -> id cache entries kept per process
+    LABEL_CACHE_SIZE = config('LABEL_CACHE_SIZE', default=10000, cast=int)
+
+    # Lecture digest job queue
+    DIGEST_WORKERS = config('DIGEST_WORKERS', default=1, cast=int)
+    DIGEST_MAX_PENDING = config('DIGEST_MAX_PENDING', default=200, cast=int)
+
+    # Class analysis prompt construction (token counts are estimates)
+    ANALYSIS_TOKEN_BUDGET = config('ANALYSIS_TOKEN_BUDGET', default=12000, cast=int)
+    ANALYSIS_CHUNK_TOKENS = config('ANALYSIS_CHUNK_TOKENS', default=3000, cast=int)
+    ANALYSIS_MAP_CONCURRENCY = config('ANALYSIS_MAP_CONCURRENCY', default=4, cast=int)
+
+    # Model provider for chat and embeddings: "oci" (OCI Generative AI) or
+    # "fake", an offline stand-in that answers after LLM_FAKE_LATENCY_SECONDS
+    # give or take LLM_FAKE_JITTER_SECONDS and fails LLM_FAKE_ERROR_RATE of
+    # its calls, for load tests without OCI credentials; after that wait it
+    # generates LLM_FAKE_TOKENS_PER_SECOND words a second
+    LLM_BACKEND = config('LLM_BACKEND', default='oci', cast=str)
+    LLM_FAKE_LATENCY_SECONDS = config('LLM_FAKE_LATENCY_SECONDS', default=1.0, cast=float)
+    LLM_FAKE_JITTER_SECONDS = config('LLM_FAKE_JITTER_SECONDS', default=0.5, cast=float)
+    LLM_FAKE_ERROR_RATE = config('LLM_FAKE_ERROR_RATE', default=0.0, cast=float)
+    LLM_FAKE_DIMENSIONS = config('LLM_FAKE_DIMENSIONS', default=384, cast=int)
+    LLM_FAKE_TOKENS_PER_SECOND = config('LLM_FAKE_TOKENS_PER_SECOND', default=100.0, cast=float)
+
+    # Limits on every LLM call of the process: calls in flight at once and
+    # seconds a call may wait for a slot; retries of throttled, failed or
+    # timed-out calls after a jittered exponential backoff; the circuit
+    # breaker, which fails calls fast for LLM_BREAKER_RESET_SECONDS after
+    # LLM_BREAKER_FAILURES failures in a row; and OCI request timeouts
+    LLM_MAX_IN_FLIGHT = config('LLM_MAX_IN_FLIGHT', default=4, cast=int)
+    LLM_QUEUE_TIMEOUT_SECONDS = config('LLM_QUEUE_TIMEOUT_SECONDS', default=120.0, cast=float)
+    LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=3, cast=int)
+    LLM_BACKOFF_BASE_SECONDS = config('LLM_BACKOFF_BASE_SECONDS', default=1.0, cast=float)
+    LLM_BACKOFF_MAX_SECONDS = config('LLM_BACKOFF_MAX_SECONDS', default=20.0, cast=float)
+    LLM_BREAKER_FAILURES = config('LLM_BREAKER_FAILURES', default=5, cast=int)
+    LLM_BREAKER_RESET_SECONDS = config('LLM_BREAKER_RESET_SECONDS', default=30.0, cast=float)
+    LLM_CONNECT_TIMEOUT_SECONDS = config('LLM_CONNECT_TIMEOUT_SECONDS', default=10.0, cast=float)
+    LLM_READ_TIMEOUT_SECONDS = config('LLM_READ_TIMEOUT_SECONDS', default=240.0, cast=float)
+
+    # LLM response cache
+    LLM_CACHE_ENABLED = config('LLM_CACHE_ENABLED', default=True, cast=bool)
+    LLM_CACHE_PATH = config('LLM_CACHE_PATH', default='cache/llm_cache.sqlite3', cast=str)
+    LLM_CACHE_TTL_SECONDS = config('LLM_CACHE_TTL_SECONDS', default=7 * 24 * 3600, cast=int)
+    LLM_CACHE_MAX_ENTRIES = config('LLM_CACHE_MAX_ENTRIES', default=500, cast=int)
+
 config = Config()
\ No newline at end of file
@@ -1,6 +1,7 @@
 import oracledb
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,22 +14,54 @@ CONNECTION_STRING = '''(description= (retry_count=20)(retry_delay=3)(address=(pr
 # Set fetch_lobs to False for better performance
 oracledb.defaults.fetch_lobs = False
 
-# Create connection pool using TCPS (SSL/TLS) - no wallet needed
+# Pool sizing, shared by the sync and async pools
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", str(POOL_MAX)))
+
+# Sync pool, created by get_pool() on first use (the app's startup calls it),
+# so importing this module opens no connections and starts no threads
 pool = None
-try:
-    pool = oracledb.create_pool(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        dsn=CONNECTION_STRING,
-        min=2,
-        max=10,
-        increment=1
-    )
-    print("✅ Oracle connection pool created successfully (TCPS direct connection)")
-except Exception as e:
-    print(f"❌ Failed to create Oracle connection pool: {e}")
-    print("Make sure DB_USER and DB_PASSWORD are set in .env file")
-    pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    The sync pool, created on first call using TCPS (SSL/TLS), no wallet
+    needed. Raises if it cannot be created, e.g. when credentials are missing.
+    """
+    global pool
+    if pool is None:
+        with _pool_lock:
+            if pool is None:
+                if not os.getenv("DB_USER") or not os.getenv("DB_PASSWORD"):
+                    raise Exception("DB_USER and DB_PASSWORD must be set (e.g. in the .env file)")
+                pool = oracledb.create_pool(
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    dsn=CONNECTION_STRING,
+                    min=POOL_MIN,
+                    max=POOL_MAX,
+                    increment=1
+                )
+                print("✅ Oracle connection pool created successfully (TCPS direct connection)")
+    return pool
+
+def close_pool():
+    global pool
+    if pool is not None:
+        pool.close(force=True)
+        pool = None
+
+# ORA-00001: unique constraint violated
+UNIQUE_VIOLATION = 1
+
+def is_unique_violation(error: oracledb.IntegrityError) -> bool:
+    """
+    True if the integrity error is ORA-00001. NOT NULL (ORA-01400), foreign
+    key (ORA-02291) and other constraint errors are not.
+    """
+    details = error.args[0] if error.args else None
+    return getattr(details, "code", None) == UNIQUE_VIOLATION
 
 @contextmanager
 def get_connection():
@@ -36,8 +69,10 @@ def get_connection():
     Context manager for Oracle database connections.
     Automatically handles connection acquisition and release.
     """
-    if pool is None:
-        raise Exception("Database connection pool not available. Check your connection string and credentials.")
+    try:
+        pool = get_pool()
+    except Exception as e:
+        raise Exception(f"Database connection pool not available: {e}")
 
     connection = None
     try:
@@ -58,6 +93,73 @@ def get_connection():
             except:
                 pass  # Connection might already be closed
 
-# Keep SQLAlchemy Base for model definitions (if needed)
-from sqlalchemy.ext.declarative import declarative_base
-Base = declarative_base()
+# Async pool for async def handlers. It needs a running event loop, so it is
+# created on first use inside the worker's loop rather than at import time.
+async_pool = None
+
+def get_async_pool():
+    global async_pool
+    if async_pool is None:
+        async_pool = oracledb.create_pool_async(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            dsn=CONNECTION_STRING,
+            min=POOL_MIN,
+            max=ASYNC_POOL_MAX,
+            increment=1
+        )
+    return async_pool
+
+async def close_async_pool():
+    global async_pool
+    if async_pool is not None:
+        await async_pool.close(force=True)
+        async_pool = None
+
+@asynccontextmanager
+async def get_async_connection():
+    """
+    Async counterpart of get_connection() for ``async def`` handlers.
+    Waiting on the database yields to the event loop instead of holding a
+    threadpool worker.
+    """
+    try:
+        pool = get_async_pool()
+    except Exception as e:
+        raise Exception(f"Database connection pool not available: {e}")
+
+    connection = None
+    try:
+        connection = await pool.acquire()
+        yield connection
+    except oracledb.Error as e:
+        if connection:
+            await connection.rollback()
+        raise Exception(f"Database error: {e}")
+    except Exception as e:
+        if connection:
+            await connection.rollback()
+        raise e
+    finally:
+        if connection:
+            try:
+                await connection.close()
+            except:
+                pass  # Connection might already be closed
+
+# Oracle rejects IN-lists with more than 1000 expressions
+MAX_IN_LIST = 1000
+
+def chunked(values, size=MAX_IN_LIST):
+    """Yield successive slices of at most ``size`` values."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def in_list_binds(values, prefix="id"):
+    """
+    Build the placeholder list and bind dict for ``col IN (...)``.
+    Returns e.g. (":id0, :id1", {"id0": 4, "id1": 7}).
+    """
+    binds = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    return ", ".join(f":{name}" for name in binds), binds
@@ -1,12 +1,37 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import lectures_router, classes_router
+from .database import close_async_pool, close_pool, get_pool
+from .routers import lectures_router, classes_router, search_router
 from .routers import quizzes as quizzes_router
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from .utils.blob_reaper import blob_reaper
+from .utils.digests import digest_jobs
+from .utils.pagination import NEXT_CURSOR_HEADER
+from .utils.search import search_service
+from .utils.security import shutdown_hash_executor
+from .utils.text_extraction import shutdown_pdf_pool
 
-app = FastAPI(title="Lecture Management System", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing the app creates no clients, so a worker starts quickly. The
+    # database pool is opened here so a bad configuration (e.g. missing
+    # credentials) fails startup instead of the first request; the LLM client
+    # is created on the first LLM call.
+    get_pool()
+    yield
+    quizzes_router.analytics_jobs.shutdown()
+    digest_jobs.shutdown()
+    shutdown_pdf_pool()
+    blob_reaper.shutdown()
+    search_service.shutdown()
+    shutdown_hash_executor()
+    close_pool()
+    await close_async_pool()
+
+app = FastAPI(title="Lecture Management System", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -15,12 +40,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # lets the browser read list pagination cursors
 )
 
 # Include routers
 app.include_router(classes_router, prefix="/classes", tags=["classes"])
 app.include_router(lectures_router, prefix="/lectures", tags=["lectures"])
 app.include_router(quizzes_router.router, prefix="/quizzes", tags=["quizzes"])
+app.include_router(search_router, prefix="/search", tags=["search"])
 
 # Serve React static files
 static_dir = os.path.join(os.path.dirname(__file__), "static")
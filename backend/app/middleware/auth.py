@@ -4,9 +4,31 @@ from jose import JWTError, jwt
 from ..database import get_connection
 from ..config import config
 from ..schemas.user import TokenData
+from ..utils.principal_cache import PrincipalCache
 
 security = HTTPBearer()
 
+# Resolved users by token subject, so most requests skip the users query
+principal_cache = PrincipalCache(config.AUTH_CACHE_SIZE, config.AUTH_CACHE_TTL_SECONDS)
+
+
+class CurrentUser:
+    """The authenticated user handed to protected endpoints."""
+
+    __slots__ = ("id", "email", "password_hash", "created_at")
+
+    def __init__(self, id, email, password_hash, created_at):
+        self.id = id
+        self.email = email
+        self.password_hash = password_hash
+        self.created_at = created_at
+
+
+def invalidate_user(email: str):
+    """Call after changing or deleting a user row, so its cached principal is reloaded."""
+    principal_cache.invalidate(email)
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -22,7 +44,12 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except JWTError:
         raise credentials_exception
 
+    user = principal_cache.get(token_data.email)
+    if user is not None:
+        return user
+
     try:
+        generation = principal_cache.generation
         with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, email, password_hash, created_at FROM users WHERE email = :email",
@@ -32,15 +59,11 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             if user_data is None:
                 raise credentials_exception
 
-            # Create a simple user object
-            class User:
-                def __init__(self, id, email, password_hash, created_at):
-                    self.id = id
-                    self.email = email
-                    self.password_hash = password_hash
-                    self.created_at = created_at
-
-            return User(user_data[0], user_data[1], user_data[2], user_data[3])
+            user = CurrentUser(user_data[0], user_data[1], user_data[2], user_data[3])
+            principal_cache.put(token_data.email, user, generation)
+            return user
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
@@ -0,0 +1,6 @@
+# SQLAlchemy Base for the model definitions. It lives here rather than in
+# app.database so the API process, which never imports the models, does not
+# load SQLAlchemy.
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
-from ..database import Base
+from .base import Base
 
 class LectureLabel(Base):
     __tablename__ = "lecture_labels"
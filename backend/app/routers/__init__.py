@@ -1,2 +1,3 @@
 from .lectures import router as lectures_router
-from .classes import router as classes_router
\ No newline at end of file
+from .classes import router as classes_router
+from .search import router as search_router
\ No newline at end of file
@@ -1,80 +1,113 @@
+import oracledb
 from fastapi import APIRouter, HTTPException, status
-from ..database import get_connection
+from ..database import get_async_connection, is_unique_violation
+from ..middleware.auth import invalidate_user, principal_cache
 from ..schemas.user import UserCreate, User, Token
-from ..utils.security import get_password_hash, verify_password, create_access_token
+from ..utils.security import HashingBusy, hash_password, verify_and_update_password, create_access_token
 
 router = APIRouter()
 
+def hashing_busy(e: HashingBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Too many sign-ins right now, try again shortly: {str(e)}",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=User)
-def register(user: UserCreate):
+async def register(user: UserCreate):
     try:
-        with get_connection() as conn:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
 
             # Check if user already exists
-            cursor.execute("SELECT id, email, password_hash, created_at FROM users WHERE email = :email",
-                         {"email": user.email})
-            existing_user = cursor.fetchone()
+            await cursor.execute("SELECT id FROM users WHERE email = :email", {"email": user.email})
+            existing_user = await cursor.fetchone()
 
             if existing_user:
                 raise HTTPException(status_code=400, detail="Email already registered")
 
+        # Hash on the hashing executor, without holding a pooled connection
+        hashed_password = await hash_password(user.password)
+
+        async with get_async_connection() as conn:
+            cursor = conn.cursor()
+
             # Create new user
-            hashed_password = get_password_hash(user.password)
-            cursor.execute("""
-                INSERT INTO users (email, password_hash)
-                VALUES (:email, :password_hash)
-            """, {
-                "email": user.email,
-                "password_hash": hashed_password
-            })
-
-            # Get the inserted user data (Oracle doesn't support RETURNING INTO the same way)
-            cursor.execute("""
-                SELECT id, email, password_hash, created_at
-                FROM users
-                WHERE email = :email
-                ORDER BY created_at DESC
-                FETCH FIRST 1 ROW ONLY
-            """, {"email": user.email})
-
-            user_data = cursor.fetchone()
-            if not user_data:
-                raise HTTPException(status_code=500, detail="Failed to create user")
-
-            conn.commit()
+            user_id = cursor.var(int)
+            created_at = cursor.var(oracledb.DB_TYPE_TIMESTAMP)
+            try:
+                await cursor.execute("""
+                    INSERT INTO users (email, password_hash)
+                    VALUES (:email, :password_hash)
+                    RETURNING id, created_at INTO :user_id, :created_at
+                """, {
+                    "email": user.email,
+                    "password_hash": hashed_password,
+                    "user_id": user_id,
+                    "created_at": created_at
+                })
+            except oracledb.IntegrityError as e:
+                if not is_unique_violation(e):
+                    raise
+                # Unique violation (ORA-00001): registered concurrently while we were hashing
+                raise HTTPException(status_code=400, detail="Email already registered")
+
+            await conn.commit()
+            # Drop anything cached under this email (e.g. a user deleted out of band and re-registered)
+            invalidate_user(user.email)
 
             return User(
-                id=user_data[0],
-                email=user_data[1],
-                created_at=user_data[3]
+                id=user_id.getvalue()[0],
+                email=user.email,
+                created_at=created_at.getvalue()[0]
             )
 
     except HTTPException:
         raise
+    except HashingBusy as e:
+        raise hashing_busy(e)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @router.post("/login", response_model=Token)
-def login(user: UserCreate):
+async def login(user: UserCreate):
     try:
-        with get_connection() as conn:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id, email, password_hash FROM users WHERE email = :email",
-                         {"email": user.email})
-            db_user = cursor.fetchone()
+            await cursor.execute("SELECT id, email, password_hash FROM users WHERE email = :email",
+                                 {"email": user.email})
+            db_user = await cursor.fetchone()
 
-            if not db_user:
-                raise HTTPException(status_code=400, detail="Incorrect email or password")
+        if not db_user:
+            raise HTTPException(status_code=400, detail="Incorrect email or password")
 
-            if not verify_password(user.password, db_user[2]):
-                raise HTTPException(status_code=400, detail="Incorrect email or password")
+        valid, new_hash = await verify_and_update_password(user.password, db_user[2])
+        if not valid:
+            raise HTTPException(status_code=400, detail="Incorrect email or password")
 
-            access_token = create_access_token(data={"sub": db_user[1]})
-            return {"access_token": access_token, "token_type": "bearer"}
+        if new_hash:
+            # Stored with other bcrypt settings than BCRYPT_ROUNDS: upgrade it now that we know the password
+            async with get_async_connection() as conn:
+                cursor = conn.cursor()
+                await cursor.execute(
+                    "UPDATE users SET password_hash = :password_hash WHERE id = :user_id AND password_hash = :old_hash",
+                    {"password_hash": new_hash, "user_id": db_user[0], "old_hash": db_user[2]}
+                )
+                await conn.commit()
+            invalidate_user(db_user[1])
+
+        access_token = create_access_token(data={"sub": db_user[1]})
+        return {"access_token": access_token, "token_type": "bearer"}
 
     except HTTPException:
         raise
+    except HashingBusy as e:
+        raise hashing_busy(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
+
+# Get authenticated user cache counters
+@router.get("/cache/stats")
+def get_auth_cache_stats():
+    return principal_cache.stats()
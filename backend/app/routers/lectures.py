@@ -1,49 +1,68 @@
 import os
-import shutil
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, status
-from typing import List
+import traceback
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from datetime import date
-from ..database import get_connection
-from ..schemas.lecture import Lecture as LectureSchema, LectureCreate, LectureLabel, LectureFile
+from ..database import get_connection, get_async_connection, chunked, in_list_binds
+from ..schemas.lecture import (
+    Lecture as LectureSchema, LectureCreate, LectureLabel, LectureFile, LectureImportItem, LectureImportResult
+)
 from ..config import config
-from pypdf import PdfReader
+from ..utils.pagination import MAX_PAGE_SIZE, keyset_sql, limit_sql, split_page
+from ..utils.streaming import (
+    iter_batches, ndjson_line, ndjson_response, stream_arraysize, tune_cursor, wants_ndjson
+)
+from ..utils.blob_store import blob_store
+from ..utils.blob_reaper import blob_reaper
+from ..utils.deletion import delete_lecture_rows
+from ..utils.documents import add_document_reference, find_documents
+from ..utils.embeddings import queue_embeddings
+from ..utils.labels import label_cache, link_lecture_labels, unique_labels
+from ..utils.search import search_service
+from ..utils.lecture_import import ImportSources, ManifestError, import_lectures as run_import, parse_manifest
+from ..utils.text_extraction import PdfExtractionTimeout, extract_document
 
 router = APIRouter()
 
-# Default user ID for proof of concept
-DEFAULT_USER_ID = 1
-
 # Get lectures for a specific class
 @router.get("/by_class/{class_id}", response_model=List[LectureSchema])
-def get_lectures_by_class(class_id: int):
+async def get_lectures_by_class(
+    class_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full",
+):
+    keyset, keyset_binds = keyset_sql(cursor)
+    if wants_ndjson(request):
+        return ndjson_response(stream_lectures(
+            "class_id = :class_id", {"class_id": class_id, **keyset_binds}, keyset,
+            include_text=fields == "full"
+        ))
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM lectures WHERE class_id = :class_id ORDER BY created_at DESC", {"class_id": class_id})
-            lecture_ids = [row[0] for row in cursor.fetchall()]
-            lectures = []
-            for lecture_id in lecture_ids:
-                lecture_data = get_lecture_data(cursor, lecture_id)
-                if lecture_data:
-                    lectures.append(lecture_data)
-            return lectures
+        async with get_async_connection() as conn:
+            db_cursor = conn.cursor()
+            return await list_lectures_page(
+                db_cursor, response, "class_id = :class_id", {"class_id": class_id, **keyset_binds},
+                keyset, limit, include_text=fields == "full"
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve lectures for class: {str(e)}")
 
 # Delete a single lecture and its files/labels
 @router.delete("/{lecture_id}", status_code=204)
 def delete_lecture(lecture_id: int):
-    """Delete a single lecture and its associated files and labels."""
+    """Delete a single lecture and its associated files, labels and digest."""
     try:
         with get_connection() as conn:
             cursor = conn.cursor()
-            # Delete lecture_labels for this lecture
-            cursor.execute("DELETE FROM lecture_labels WHERE lecture_id = :lecture_id", {"lecture_id": lecture_id})
-            # Delete lecture_files for this lecture
-            cursor.execute("DELETE FROM lecture_files WHERE lecture_id = :lecture_id", {"lecture_id": lecture_id})
-            # Delete the lecture itself
-            cursor.execute("DELETE FROM lectures WHERE id = :lecture_id", {"lecture_id": lecture_id})
+            released = delete_lecture_rows(cursor, lecture_id)
             conn.commit()
+        search_service.lectures_removed([lecture_id])
+        # Files go only once nothing references them any more, off the request path
+        blob_reaper.reap(released)
         return
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete lecture: {str(e)}")
@@ -52,53 +71,128 @@ def validate_file_type(file: UploadFile, allowed_types: List[str]):
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: {', '.join(allowed_types)}")
 
-def get_lecture_data(cursor, lecture_id):
+async def list_lectures_page(cursor, response, where, binds, keyset, limit, include_text=True):
+    """
+    Fetch one keyset page of lectures (newest first) matching ``where`` and hydrate it.
+    Sets the X-Next-Cursor header when more rows follow.
+    """
+    page_sql, page_binds = limit_sql(limit)
+    await cursor.execute(f"""
+        SELECT id, created_at FROM lectures
+        WHERE {where}{keyset}
+        ORDER BY created_at DESC, id DESC{page_sql}
+    """, {**binds, **page_binds})
+    rows = split_page(await cursor.fetchall(), limit, response, key=lambda row: (row[1], row[0]))
+    return await get_lectures_data_async(cursor, [row[0] for row in rows], include_text=include_text)
+
+def stream_lectures(where, binds, keyset, include_text=True):
+    """
+    Yield every lecture matching ``where`` (newest first) as an NDJSON line.
+    IDs are fetched one cursor batch at a time and each batch is hydrated
+    separately, so memory stays bounded by the batch size, not the row count.
+    """
+    with get_connection() as conn:
+        id_cursor = tune_cursor(conn.cursor(), stream_arraysize(include_text))
+        id_cursor.execute(f"""
+            SELECT id FROM lectures
+            WHERE {where}{keyset}
+            ORDER BY created_at DESC, id DESC
+        """, binds)
+        data_cursor = conn.cursor()
+        for rows in iter_batches(id_cursor):
+            for lecture in get_lectures_data(data_cursor, [row[0] for row in rows], include_text=include_text):
+                yield ndjson_line(lecture)
+
+def lecture_queries(lecture_ids, include_text=True):
+    """
+    Build the (sql, binds) pairs that load lectures, files and labels for one
+    chunk of at most 1000 lecture IDs.
+    With ``include_text=False`` the large pdf_text column is left out of the files.
+    """
+    placeholders, binds = in_list_binds(lecture_ids)
+    # Text lives in documents; pdf_text only holds it for files stored before that
+    text_column = "COALESCE(lf.pdf_text, d.extracted_text)" if include_text else "NULL"
+    return [
+        # Lecture basic info
+        (f"""
+            SELECT id, class_id, lecture_title, lecture_date, created_at
+            FROM lectures
+            WHERE id IN ({placeholders})
+        """, binds),
+        # Files
+        (f"""
+            SELECT lf.id, lf.file_type, {text_column}, lf.uploaded_at, lf.lecture_id
+            FROM lecture_files lf
+            LEFT JOIN documents d ON d.id = lf.document_id
+            WHERE lf.lecture_id IN ({placeholders})
+        """, binds),
+        # Labels
+        (f"""
+            SELECT l.id, l.label_name, ll.lecture_id
+            FROM labels l
+            JOIN lecture_labels ll ON l.id = ll.label_id
+            WHERE ll.lecture_id IN ({placeholders})
+        """, binds),
+    ]
+
+def assemble_lectures(lecture_ids, lecture_rows, file_rows, label_rows):
+    """Group fetched file and label rows under their lectures, in lecture_ids order."""
+    lectures_by_id = {row[0]: row for row in lecture_rows}
+    files_by_lecture = {}
+    for f in file_rows:
+        files_by_lecture.setdefault(f[4], []).append(LectureFile(
+            id=f[0], file_type=f[1], pdf_text=f[2], uploaded_at=f[3]
+        ))
+    labels_by_lecture = {}
+    for l in label_rows:
+        labels_by_lecture.setdefault(l[2], []).append(LectureLabel(
+            id=l[0], label_name=l[1], lecture_id=l[2]
+        ))
+
+    lectures = []
+    for lecture_id in lecture_ids:
+        lecture_data = lectures_by_id.get(lecture_id)
+        if not lecture_data:
+            continue
+        lectures.append(LectureSchema(
+            id=lecture_data[0],
+            class_id=lecture_data[1],
+            lecture_title=lecture_data[2],
+            lecture_date=lecture_data[3],
+            created_at=lecture_data[4],
+            files=files_by_lecture.get(lecture_id, []),
+            labels=labels_by_lecture.get(lecture_id, [])
+        ))
+    return lectures
+
+def get_lectures_data(cursor, lecture_ids, include_text=True):
+    """
+    Load complete lecture data (files and labels) for a set of lecture IDs.
+    Runs three queries per chunk of up to 1000 IDs instead of three per lecture,
+    and returns the lectures in the order the IDs were given.
+    """
+    lecture_ids = list(dict.fromkeys(lecture_ids))
+    results = ([], [], [])
+    for chunk in chunked(lecture_ids):
+        for rows, (sql, binds) in zip(results, lecture_queries(chunk, include_text)):
+            cursor.execute(sql, binds)
+            rows.extend(cursor.fetchall())
+    return assemble_lectures(lecture_ids, *results)
+
+async def get_lectures_data_async(cursor, lecture_ids, include_text=True):
+    """Async counterpart of get_lectures_data for an oracledb AsyncCursor."""
+    lecture_ids = list(dict.fromkeys(lecture_ids))
+    results = ([], [], [])
+    for chunk in chunked(lecture_ids):
+        for rows, (sql, binds) in zip(results, lecture_queries(chunk, include_text)):
+            await cursor.execute(sql, binds)
+            rows.extend(await cursor.fetchall())
+    return assemble_lectures(lecture_ids, *results)
+
+async def get_lecture_data_async(cursor, lecture_id):
     """Helper function to get complete lecture data with files and labels"""
-    # Get lecture basic info
-    cursor.execute("""
-        SELECT id, class_id, lecture_title, lecture_date, created_at
-        FROM lectures
-        WHERE id = :lecture_id
-    """, {"lecture_id": lecture_id})
-
-    lecture_data = cursor.fetchone()
-    if not lecture_data:
-        return None
-
-    # Get files
-    cursor.execute("""
-        SELECT id, file_type, pdf_text, uploaded_at
-        FROM lecture_files
-        WHERE lecture_id = :lecture_id
-    """, {"lecture_id": lecture_id})
-
-    files_data = cursor.fetchall()
-    files = [LectureFile(
-        id=f[0], file_type=f[1], pdf_text=f[2], uploaded_at=f[3]
-    ) for f in files_data]
-
-    # Get labels
-    cursor.execute("""
-        SELECT l.id, l.label_name, ll.lecture_id
-        FROM labels l
-        JOIN lecture_labels ll ON l.id = ll.label_id
-        WHERE ll.lecture_id = :lecture_id
-    """, {"lecture_id": lecture_id})
-
-    labels_data = cursor.fetchall()
-    labels = [LectureLabel(
-        id=l[0], label_name=l[1], lecture_id=l[2]
-    ) for l in labels_data]
-
-    return LectureSchema(
-        id=lecture_data[0],
-        class_id=lecture_data[1],
-        lecture_title=lecture_data[2],
-        lecture_date=lecture_data[3],
-        created_at=lecture_data[4],
-        files=files,
-        labels=labels
-    )
+    lectures = await get_lectures_data_async(cursor, [lecture_id])
+    return lectures[0] if lectures else None
 
 @router.post("/upload", response_model=LectureSchema)
 async def upload_lecture(
@@ -116,163 +210,203 @@ async def upload_lecture(
         validate_file_type(transcript_file, ["text/plain"])
 
     # Parse labels
-    label_list = [label.strip() for label in labels.split(",") if label.strip()]
-
-    # Create upload directory if it doesn't exist
-    os.makedirs(config.UPLOAD_DIR, exist_ok=True) # type: ignore
+    label_list = unique_labels(labels.split(","))
 
-    pdf_path = None
-    transcript_path = None
+    # Blobs this request added to the store, reaped again if nothing gets committed
+    created_blobs = []
 
     try:
-        # Save PDF file
-        if pdf_file:
-            pdf_filename = f"{DEFAULT_USER_ID}_{pdf_file.filename}"
-            pdf_path = os.path.join(config.UPLOAD_DIR, pdf_filename) # type: ignore
-            with open(pdf_path, "wb") as buffer:
-                shutil.copyfileobj(pdf_file.file, buffer)
-
-        # Save transcript file
-        if transcript_file:
-            transcript_filename = f"{DEFAULT_USER_ID}_{transcript_file.filename}"
-            transcript_path = os.path.join(config.UPLOAD_DIR, transcript_filename) # type: ignore
-            with open(transcript_path, "wb") as buffer:
-                shutil.copyfileobj(transcript_file.file, buffer)
-
-        with get_connection() as conn:
+        # (file_type, content_type, sha256, byte_size) of each stored file
+        uploads = []
+        for file_type, upload, content_type in (
+            ("pdf", pdf_file, "application/pdf"),
+            ("transcript", transcript_file, "text/plain"),
+        ):
+            if upload:
+                # Hashed, then written to the content-addressed store unless already there
+                sha256, byte_size, created = await run_in_threadpool(blob_store.put, upload.file)
+                if created:
+                    created_blobs.append(sha256)
+                uploads.append((file_type, content_type, sha256, byte_size))
+
+        # Only content never uploaded before is extracted, before taking the
+        # transaction's connection; PDFs are parsed in the process pool
+        known_documents = {}
+        if uploads:
+            async with get_async_connection() as conn:
+                known_documents = await find_documents(conn.cursor(), [upload[2] for upload in uploads])
+        new_texts = {}
+        for _, content_type, sha256, _ in uploads:
+            if sha256 not in known_documents and sha256 not in new_texts:
+                new_texts[sha256] = await extract_document(blob_store.path(sha256), content_type=content_type)
+
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
 
-            # Create lecture record
-            cursor.execute("""
+            # Create lecture record; its id comes back in the same round trip
+            lecture_var = cursor.var(int)
+            await cursor.execute("""
                 INSERT INTO lectures (class_id, lecture_title, lecture_date)
                 VALUES (:class_id, :lecture_title, :lecture_date)
+                RETURNING id INTO :lecture_id
             """, {
                 "class_id": class_id,
                 "lecture_title": lecture_title,
-                "lecture_date": lecture_date
-            })
-
-            # Get the inserted lecture data
-            cursor.execute("""
-                SELECT id, class_id, lecture_title, lecture_date, created_at
-                FROM lectures
-                WHERE class_id = :class_id AND lecture_title = :lecture_title
-                ORDER BY created_at DESC
-                FETCH FIRST 1 ROW ONLY
-            """, {
-                "class_id": class_id,
-                "lecture_title": lecture_title
+                "lecture_date": lecture_date,
+                "lecture_id": lecture_var
             })
-
-            lecture_data = cursor.fetchone()
-            if not lecture_data:
-                raise HTTPException(status_code=500, detail="Failed to create lecture")
-
-            lecture_id = lecture_data[0]
-
-            # Insert files
-            if pdf_path:
-                reader = PdfReader(pdf_path)
-                text = ""
-
-                for page in reader.pages:
-                    text += page.extract_text()
-                
-                cursor.execute("""
-                    INSERT INTO lecture_files (lecture_id, file_type, pdf_text)
-                    VALUES (:lecture_id, :file_type, :pdf_text)
+            lecture_id = lecture_var.getvalue()[0]
+
+            # Insert files, each holding a reference to its (possibly shared) document
+            for file_type, _, sha256, byte_size in uploads:
+                document_id = await add_document_reference(cursor, sha256, byte_size, new_texts.get(sha256))
+                await cursor.execute("""
+                    INSERT INTO lecture_files (lecture_id, file_type, document_id)
+                    VALUES (:lecture_id, :file_type, :document_id)
                 """, {
                     "lecture_id": lecture_id,
-                    "file_type": "pdf",
-                    "pdf_text": text
+                    "file_type": file_type,
+                    "document_id": document_id
                 })
 
-            if transcript_path:
-                with open(transcript_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                cursor.execute("""
-                    INSERT INTO lecture_files (lecture_id, file_type, pdf_text)
-                    VALUES (:lecture_id, :file_type, :pdf_text)
-                """, {
-                    "lecture_id": lecture_id,
-                    "file_type": "transcript",
-                    "pdf_text": text
-                })
+            # Handle labels: one MERGE for new names, one executemany for the links
+            label_ids = await link_lecture_labels(cursor, lecture_id, label_list)
 
-            # Handle labels
-            for label in label_list:
-                # Insert label if it doesn't exist (Oracle syntax for upsert)
-                try:
-                    cursor.execute("""
-                        INSERT INTO labels (label_name)
-                        VALUES (:label_name)
-                    """, {"label_name": label})
-                except:
-                    # Label already exists, continue
-                    pass
-
-                # Get label ID
-                cursor.execute("""
-                    SELECT id FROM labels WHERE label_name = :label_name
-                """, {"label_name": label})
-
-                label_data = cursor.fetchone()
-                if label_data:
-                    label_id = label_data[0]
-
-                    # Link lecture to label
-                    cursor.execute("""
-                        INSERT INTO lecture_labels (lecture_id, label_id)
-                        VALUES (:lecture_id, :label_id)
-                    """, {
-                        "lecture_id": lecture_id,
-                        "label_id": label_id
-                    })
+            await conn.commit()
 
-            conn.commit()
+    except Exception as e:
+        # Nothing committed. The reaper re-checks documents before removing a
+        # blob, so one a concurrent upload of the same content committed stays.
+        blob_reaper.reap(created_blobs)
+        if isinstance(e, PdfExtractionTimeout):
+            raise HTTPException(status_code=422, detail=f"Failed to upload lecture: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to upload lecture: {str(e)}")
 
-            # Get complete lecture data with files and labels
-            return get_lecture_data(cursor, lecture_id)
+    # The lecture exists from here on: its follow-up work cannot fail the upload
+    label_cache.put_many(label_ids)
+    if uploads:
+        try:
+            search_service.lectures_changed([lecture_id])
+            # Digest the new material once, in the background, for class analytics.
+            # Deferred: the digest module pulls in the OCI client
+            from ..utils.digests import queue_lecture_digests
+            queue_lecture_digests([lecture_id])
+            # Only documents that are new get chunked and embedded
+            queue_embeddings()
+        except Exception:
+            print(f"[lectures] follow-up work for lecture {lecture_id} failed:")
+            print(traceback.format_exc())
+
+    # Get complete lecture data with files and labels
+    try:
+        async with get_async_connection() as conn:
+            return await get_lecture_data_async(conn.cursor(), lecture_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lecture {lecture_id} was created, but loading it failed: {str(e)}")
 
+@router.post("/import", response_model=LectureImportResult)
+async def import_lectures(
+    class_id: int = Form(...),
+    archive: UploadFile = File(None),
+    files: List[UploadFile] = File(None),
+    manifest: str = Form(None),
+):
+    """
+    Create many lectures in one request, from a zip ``archive`` (with a
+    manifest.json at its root) or a multipart batch of ``files``. The
+    ``manifest`` field, a JSON list of {"title", "date", "labels", "pdf",
+    "transcript"}, overrides the archive's. Reports a status per lecture.
+    """
+    sources = None
+    try:
+        if archive is not None:
+            sources = await run_in_threadpool(ImportSources.from_zip, archive.file)
+        elif files:
+            sources = ImportSources.from_uploads([f for f in files if f.filename])
+        else:
+            raise HTTPException(status_code=400, detail="Send a zip archive or a batch of files")
+        manifest_data = manifest if manifest is not None else sources.manifest
+        if manifest_data is None:
+            raise HTTPException(status_code=400, detail="Missing manifest")
+
+        items = await run_import(class_id, parse_manifest(manifest_data), sources)
+        created = sum(1 for item in items if item.status == "created")
+        return LectureImportResult(
+            created=created,
+            failed=len(items) - created,
+            items=[
+                LectureImportItem(
+                    index=item.index, lecture_title=item.lecture_title, status=item.status,
+                    lecture_id=item.lecture_id, error=item.error
+                )
+                for item in items
+            ]
+        )
+    except HTTPException:
+        raise
+    except ManifestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        # Clean up files if database operation fails
-        if pdf_path and os.path.exists(pdf_path):
-            os.remove(pdf_path)
-        if transcript_path and os.path.exists(transcript_path):
-            os.remove(transcript_path)
-        raise HTTPException(status_code=500, detail=f"Failed to upload lecture: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import lectures: {str(e)}")
+    finally:
+        if sources is not None:
+            sources.close()
 
 @router.get("/", response_model=List[LectureSchema])
-def get_lectures():
+async def get_lectures(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full",
+):
+    keyset, keyset_binds = keyset_sql(cursor)
+    if wants_ndjson(request):
+        return ndjson_response(stream_lectures("1 = 1", keyset_binds, keyset, include_text=fields == "full"))
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
+        async with get_async_connection() as conn:
+            db_cursor = conn.cursor()
+            return await list_lectures_page(
+                db_cursor, response, "1 = 1", keyset_binds, keyset, limit,
+                include_text=fields == "full"
+            )
 
-            # Get all lectures
-            cursor.execute("""
-                SELECT id FROM lectures ORDER BY created_at DESC
-            """)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve lectures: {str(e)}")
 
-            lecture_ids = [row[0] for row in cursor.fetchall()]
-            lectures = []
+@router.get("/files/{file_id}", response_model=LectureFile)
+async def get_lecture_file(file_id: int):
+    """Get a single lecture file including its extracted text"""
+    try:
+        async with get_async_connection() as conn:
+            cursor = conn.cursor()
+            await cursor.execute("""
+                SELECT lf.id, lf.file_type, COALESCE(lf.pdf_text, d.extracted_text), lf.uploaded_at
+                FROM lecture_files lf
+                LEFT JOIN documents d ON d.id = lf.document_id
+                WHERE lf.id = :file_id
+            """, {"file_id": file_id})
 
-            for lecture_id in lecture_ids:
-                lecture_data = get_lecture_data(cursor, lecture_id)
-                if lecture_data:
-                    lectures.append(lecture_data)
+            file_data = await cursor.fetchone()
+            if not file_data:
+                raise HTTPException(status_code=404, detail="Lecture file not found")
 
-            return lectures
+            return LectureFile(
+                id=file_data[0], file_type=file_data[1], pdf_text=file_data[2], uploaded_at=file_data[3]
+            )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve lectures: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve lecture file: {str(e)}")
 
 @router.get("/{lecture_id}", response_model=LectureSchema)
-def get_lecture(lecture_id: int):
+async def get_lecture(lecture_id: int):
     try:
-        with get_connection() as conn:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
 
-            lecture_data = get_lecture_data(cursor, lecture_id)
+            lecture_data = await get_lecture_data_async(cursor, lecture_id)
             if not lecture_data:
                 raise HTTPException(status_code=404, detail="Lecture not found")
 
@@ -1,107 +1,254 @@
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from datetime import datetime
+import json
 import os
+import threading
 
-from ..database import get_connection
+from ..database import chunked, get_connection, get_async_connection, in_list_binds
 from ..config import config
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
+from ..utils.pagination import MAX_PAGE_SIZE, keyset_sql, limit_sql, split_page
+from ..utils.streaming import (
+    iter_batches, iterate_in_thread, ndjson_line, ndjson_response, sse_event, sse_response, stream_arraysize, tune_cursor,
+    wants_ndjson,
+)
+from ..utils.documents import add_document_reference, find_documents, read_and_hash
+from ..utils.embeddings import queue_embeddings
+from ..utils.text_extraction import (
+    PdfExtractionTimeout, UnsupportedDocument, extract_document, extract_document_sync,
+    extract_pdf, is_plain_text,
+)
+from ..utils.search import search_service
+from ..utils.jobs import FAILED, SUCCEEDED, JobQueue, JobQueueFull
 
 # Import Oracle AI utility (absolute import for FastAPI)
-from app.utils.oracle_ai import run_class_analysis
+from app.utils.oracle_ai import (
+    cached_chunk_summary, get_cached_class_analysis, response_text, run_class_analysis, stream_class_analysis,
+    summarize_chunk,
+)
+from app.utils.prompt_builder import build_analysis_prompt
+from app.utils.llm_cache import llm_cache
+from app.utils.llm_backends import get_llm_backend
+from app.utils.digests import queue_lecture_digests
 
 
 router = APIRouter()
 
 
-# Class Analytics Route
-@router.post("/class_analytics/{class_id}")
-def run_class_analytics(class_id: int):
-    from ..database import get_connection
-    # Aggregate lecture text
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT pdf_text FROM lecture_files lf JOIN lectures l ON lf.lecture_id = l.id WHERE l.class_id = :class_id", {"class_id": class_id})
-        lecture_texts = [row[0] for row in cursor.fetchall() if row[0]]
-        cursor.execute("SELECT quiz_content, quiz_results FROM quizzes WHERE class_id = :class_id", {"class_id": class_id})
-        quiz_rows = cursor.fetchall()
-        if not quiz_rows:
-            raise HTTPException(status_code=400, detail="Cannot run analysis: No quizzes found for this class.")
-        quiz_contents = [row[0] for row in quiz_rows if row[0]]
-        quiz_results = [row[1] for row in quiz_rows if row[1]]
-
-    lecture_text = "\n".join(lecture_texts)
-    quiz_content = "\n".join(quiz_contents)
-    quiz_results_text = "\n".join(quiz_results)
-    prompt = (
-        "You are an AI teaching assistant analyzing a university course.\n\n"
-
-        "Below are lecture transcripts and slide content:\n"
-        f"{lecture_text}\n\n"
-
-        "Below are quiz questions:\n"
-        f"{quiz_content}\n\n"
-
-        "Below are quiz performance results:\n"
-        f"{quiz_results_text}\n\n"
-
-        "Your task:\n"
-        "1. Identify the concepts students are struggling with most based on quiz performance.\n"
-        "2. Cross-reference those weak concepts with the lecture transcripts and slides.\n"
-        "3. Determine where (which lecture topic, section, or example) each concept was originally covered.\n"
-        "4. Infer why students may have misunderstood it (e.g., insufficient examples, rushed explanation, abstract treatment, lack of practice alignment).\n"
-        "5. Suggest specific ways the professor could revisit or improve coverage of each concept.\n\n"
-
-        "Output Requirements:\n"
-        "- Only provide the TOP 3 weakest concepts.\n"
-        "- For each concept, provide:\n"
-        "   - Concept Name\n"
-        "   - Estimated Mastery Score (0-100)\n"
-        "   - Where It Was Covered (cite lecture title or topic if possible)\n"
-        "   - Why Students Struggled\n"
-        "   - How to Revisit / Improve It\n\n"
-
-        "Be concise but specific. Ground your reasoning in the lecture and quiz content provided. List sections titles exaclty as provided."
-    )
-    import json
+# Background runner for class analyses; LLM calls can take minutes
+analytics_jobs = JobQueue(max_workers=config.ANALYTICS_WORKERS, max_pending=config.ANALYTICS_MAX_PENDING)
+
+
+async def load_class_material(cursor, class_id: int):
+    """
+    Fetch the lecture material, quiz contents and quiz results the analysis
+    prompt is built from. Each lecture contributes its stored digest, or its raw
+    file text while the digest is not ready yet. Returns the material and the
+    ids of lectures without a digest.
+    """
+    await cursor.execute("""
+        SELECT l.id, l.lecture_title, d.digest_text
+        FROM lectures l
+        LEFT JOIN lecture_digests d ON d.lecture_id = l.id
+        WHERE l.class_id = :class_id
+        ORDER BY l.lecture_date, l.id
+    """, {"class_id": class_id})
+    lecture_rows = await cursor.fetchall()
+
+    # Raw text only for the lectures that still need it
+    undigested = [row[0] for row in lecture_rows if not row[2]]
+    raw_texts = {}
+    for ids in chunked(undigested):
+        placeholders, binds = in_list_binds(ids)
+        await cursor.execute(
+            f"""
+            SELECT lf.lecture_id, COALESCE(lf.pdf_text, d.extracted_text)
+            FROM lecture_files lf
+            LEFT JOIN documents d ON d.id = lf.document_id
+            WHERE lf.lecture_id IN ({placeholders})
+            ORDER BY lf.lecture_id, lf.id
+            """,
+            binds
+        )
+        for lecture_id, text in await cursor.fetchall():
+            if text:
+                raw_texts.setdefault(lecture_id, []).append(text)
+
+    lecture_texts = []
+    for lecture_id, title, digest in lecture_rows:
+        text = digest or "\n".join(raw_texts.get(lecture_id, []))
+        if text:
+            lecture_texts.append(f"Lecture: {title}\n{text}")
+
+    await cursor.execute("""
+        SELECT COALESCE(q.quiz_content, d.extracted_text), q.quiz_results
+        FROM quizzes q
+        LEFT JOIN documents d ON d.id = q.document_id
+        WHERE q.class_id = :class_id
+    """, {"class_id": class_id})
+    quiz_rows = await cursor.fetchall()
+    if not quiz_rows:
+        raise HTTPException(status_code=400, detail="Cannot run analysis: No quizzes found for this class.")
+    quiz_contents = [row[0] for row in quiz_rows if row[0]]
+    quiz_results = [row[1] for row in quiz_rows if row[1]]
+    return (lecture_texts, quiz_contents, quiz_results), undigested
+
+
+def analyze_class(class_id: int, material, prompt: Optional[str] = None):
+    """
+    Build the analysis prompt from the class material, run it and store the
+    result. Runs on analytics_jobs. A ``prompt`` passed in was already built
+    and found uncached by the request handler.
+    """
     try:
-        analysis = run_class_analysis(prompt)
+        if prompt is None:
+            prompt = build_analysis_prompt(*material, summarize=summarize_chunk)
+            analysis = run_class_analysis(prompt)
+        else:
+            analysis = run_class_analysis(prompt, check_cache=False)
         print("Got promt")
-        # Delete any existing analysis for this class, then insert new
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM class_analysis WHERE class_id = :class_id",
-                {"class_id": class_id}
-            )
-            cursor.execute(
-                """
-                INSERT INTO class_analysis (class_id, analysis_text)
-                VALUES (:class_id, :analysis_text)
-                """,
-                {"class_id": class_id, "analysis_text": json.dumps(analysis)}
-            )
-            conn.commit()
-        return {"analysis": analysis}
+        save_class_analysis(class_id, analysis)
+        return analysis
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to run class analysis: {str(e)}")
 
-# Get latest class analysis
-@router.get("/class_analytics/{class_id}")
-def get_class_analytics(class_id: int):
-    from ..database import get_connection
-    import json
+def save_class_analysis(class_id: int, analysis):
+    # Delete any existing analysis for this class, then insert new
     with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
+            "DELETE FROM class_analysis WHERE class_id = :class_id",
+            {"class_id": class_id}
+        )
+        cursor.execute(
+            """
+            INSERT INTO class_analysis (class_id, analysis_text)
+            VALUES (:class_id, :analysis_text)
+            """,
+            {"class_id": class_id, "analysis_text": json.dumps(analysis)}
+        )
+        conn.commit()
+
+# Class Analytics Route
+@router.post("/class_analytics/{class_id}", status_code=202)
+async def run_class_analytics(class_id: int, response: Response):
+    """
+    Queue an analysis of the class and return its job right away.
+    If an analysis for this class is already queued or running, that job is returned.
+    When the prompt's response is already cached, the job comes back finished (200).
+    """
+    key = ("class_analytics", class_id)
+    job = analytics_jobs.active(key)
+    if job is not None:
+        return {"class_id": class_id, "cached": False, **job.to_dict()}
+
+    async with get_async_connection() as conn:
+        cursor = conn.cursor()
+        material, undigested = await load_class_material(cursor, class_id)
+        # Lectures uploaded before digests existed, or whose digest job failed
+        queue_lecture_digests(undigested)
+        # Only consults the cache: None when some chunk summary has not been computed yet
+        prompt = await run_in_threadpool(build_analysis_prompt, *material, summarize=cached_chunk_summary)
+
+    cached = await run_in_threadpool(get_cached_class_analysis, prompt) if prompt is not None else None
+    if cached is not None:
+        await run_in_threadpool(save_class_analysis, class_id, cached)
+        response.status_code = 200
+        return {"class_id": class_id, "cached": True, **analytics_jobs.completed(key, cached).to_dict()}
+
+    try:
+        job = analytics_jobs.submit(key, analyze_class, class_id, material, prompt)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Analysis queue is full, try again later: {str(e)}")
+    return {"class_id": class_id, "cached": False, **job.to_dict()}
+
+# Class Analytics, streamed as server-sent events
+@router.post("/class_analytics/{class_id}/stream")
+async def stream_class_analytics(class_id: int):
+    """
+    Run the analysis within the request and stream it as server-sent events:
+    ``status`` as soon as the class material is loaded, ``token`` for each
+    piece of text as the model generates it (a cached analysis comes as one
+    piece), and ``done`` with the analysis once it is stored in
+    class_analysis, or ``error``. No job is queued; the shared LLM call
+    limits still apply.
+    """
+    async with get_async_connection() as conn:
+        cursor = conn.cursor()
+        material, undigested = await load_class_material(cursor, class_id)
+    queue_lecture_digests(undigested)
+
+    async def events():
+        yield sse_event("status", {"class_id": class_id, "stage": "building_prompt"})
+        # Set when the stream ends for any reason, e.g. the browser disconnecting
+        # mid-stream; the token generator then stops and frees its LLM call slot
+        cancel = threading.Event()
+        try:
+            prompt = await run_in_threadpool(build_analysis_prompt, *material, summarize=summarize_chunk)
+            analysis = await run_in_threadpool(get_cached_class_analysis, prompt)
+            cached = analysis is not None
+            if cached:
+                yield sse_event("token", {"text": response_text(analysis)})
+            else:
+                yield sse_event("status", {"class_id": class_id, "stage": "generating"})
+                pieces = []
+                async for piece in iterate_in_thread(stream_class_analysis(prompt, cancel)):
+                    pieces.append(piece)
+                    yield sse_event("token", {"text": piece})
+                analysis = {"text": "".join(pieces)}
+            await run_in_threadpool(save_class_analysis, class_id, analysis)
+            yield sse_event("done", {"class_id": class_id, "cached": cached, "analysis": analysis})
+        except Exception as e:
+            yield sse_event("error", {"class_id": class_id, "detail": f"Failed to run class analysis: {str(e)}"})
+        finally:
+            cancel.set()
+
+    return sse_response(events())
+
+# Get analytics LLM response cache counters
+@router.get("/class_analytics/cache/stats")
+def get_class_analytics_cache_stats():
+    return llm_cache.stats()
+
+# Get the LLM backend in use and its counters
+@router.get("/class_analytics/backend/stats")
+def get_class_analytics_backend_stats():
+    return get_llm_backend().stats()
+
+def get_analytics_job(job_id: str):
+    job = analytics_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job
+
+# Get the state of a class analysis job
+@router.get("/class_analytics/jobs/{job_id}")
+def get_class_analytics_job(job_id: str):
+    job = get_analytics_job(job_id)
+    return {"class_id": job.key[1], **job.to_dict()}
+
+# Get the result of a finished class analysis job
+@router.get("/class_analytics/jobs/{job_id}/result")
+def get_class_analytics_job_result(job_id: str):
+    job = get_analytics_job(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Analysis job is still {job.status}")
+    return {"analysis": job.result, "finished_at": job.finished_at}
+
+# Get latest class analysis
+@router.get("/class_analytics/{class_id}")
+async def get_class_analytics(class_id: int):
+    async with get_async_connection() as conn:
+        cursor = conn.cursor()
+        await cursor.execute(
             "SELECT analysis_text, created_at FROM class_analysis WHERE class_id = :class_id ORDER BY created_at DESC FETCH FIRST 1 ROW ONLY",
             {"class_id": class_id}
         )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="No analysis found for this class.")
         try:
@@ -110,24 +257,73 @@ def get_class_analytics(class_id: int):
             analysis_obj = row[0]
         return {"analysis": analysis_obj, "created_at": row[1]}
 
+def quiz_select_sql(where, keyset, include_content=True):
+    # Content lives in documents; quiz_content only holds it for quizzes stored before that
+    content_column = (
+        "COALESCE(quiz_content, (SELECT d.extracted_text FROM documents d WHERE d.id = quizzes.document_id))"
+        if include_content else "NULL"
+    )
+    return f"""
+        SELECT id, class_id, quiz_title, {content_column}, created_at
+        FROM quizzes
+        WHERE {where}{keyset}
+        ORDER BY created_at DESC, id DESC"""
+
+def quiz_row_to_dict(row, include_content=True):
+    quiz = {
+        "id": row[0],
+        "class_id": row[1],
+        "quiz_title": row[2],
+        "quiz_content": row[3],
+        "created_at": row[4],
+    }
+    if not include_content:
+        del quiz["quiz_content"]
+    return quiz
+
+async def list_quizzes_page(cursor, response, where, binds, keyset, limit, include_content=True):
+    """
+    Fetch one keyset page of quizzes (newest first) matching ``where``.
+    Sets the X-Next-Cursor header when more rows follow; with
+    ``include_content=False`` the quiz_content body is left out.
+    """
+    page_sql, page_binds = limit_sql(limit)
+    await cursor.execute(quiz_select_sql(where, keyset, include_content) + page_sql, {**binds, **page_binds})
+    rows = split_page(await cursor.fetchall(), limit, response, key=lambda row: (row[4], row[0]))
+    return [quiz_row_to_dict(row, include_content) for row in rows]
+
+def stream_quizzes(where, binds, keyset, include_content=True):
+    """Yield every quiz matching ``where`` (newest first) as an NDJSON line."""
+    with get_connection() as conn:
+        cursor = tune_cursor(conn.cursor(), stream_arraysize(include_content))
+        cursor.execute(quiz_select_sql(where, keyset, include_content), binds)
+        for rows in iter_batches(cursor):
+            for row in rows:
+                yield ndjson_line(quiz_row_to_dict(row, include_content))
+
 # Get all quizzes for a specific class
 @router.get("/by_class/{class_id}")
-def get_quizzes_by_class(class_id: int):
+async def get_quizzes_by_class(
+    class_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full",
+):
+    keyset, keyset_binds = keyset_sql(cursor)
+    if wants_ndjson(request):
+        return ndjson_response(stream_quizzes(
+            "class_id = :class_id", {"class_id": class_id, **keyset_binds}, keyset,
+            include_content=fields == "full"
+        ))
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, class_id, quiz_title, quiz_content, created_at FROM quizzes WHERE class_id = :class_id ORDER BY created_at DESC", {"class_id": class_id})
-            quizzes = [
-                {
-                    "id": row[0],
-                    "class_id": row[1],
-                    "quiz_title": row[2],
-                    "quiz_content": row[3],
-                    "created_at": row[4],
-                }
-                for row in cursor.fetchall()
-            ]
-            return quizzes
+        async with get_async_connection() as conn:
+            db_cursor = conn.cursor()
+            return await list_quizzes_page(
+                db_cursor, response, "class_id = :class_id", {"class_id": class_id, **keyset_binds},
+                keyset, limit, include_content=fields == "full"
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve quizzes for class: {str(e)}")
 
@@ -138,113 +334,102 @@ async def upload_quiz_plain(
     file: UploadFile = File(...),
     results_file: UploadFile = File(None)
 ):
-    from PyPDF2 import PdfReader
-    import io
-    # Parse quiz file
-    content = await file.read()
-    reader = PdfReader(io.BytesIO(content))
-    quiz_text = ""
-    for page in reader.pages:
-        quiz_text += page.extract_text() or ""
-
-    # Parse results file if present
-    results_text = None
-    if results_file:
-        results_content = await results_file.read()
-        if results_file.filename and results_file.filename.lower().endswith('.pdf'):
-            results_reader = PdfReader(io.BytesIO(results_content))
-            results_text = ""
-            for page in results_reader.pages:
-                results_text += page.extract_text() or ""
-        else:
-            try:
-                results_text = results_content.decode('utf-8')
-            except Exception:
-                results_text = results_content.decode('latin-1', errors='replace')
+    try:
+        # Read and hash the quiz file; only content never uploaded before is parsed
+        content, quiz_hash = await read_and_hash(file)
+        async with get_async_connection() as conn:
+            known_documents = await find_documents(conn.cursor(), [quiz_hash])
+        quiz_text = None if quiz_hash in known_documents else await extract_pdf(content, parser=config.QUIZ_PDF_PARSER)
+
+        # Parse results file if present; anything but a .pdf is read as text
+        results_text = None
+        if results_file:
+            results_content = await results_file.read()
+            if results_file.filename and results_file.filename.lower().endswith('.pdf'):
+                results_text = (await extract_pdf(results_content, parser=config.QUIZ_PDF_PARSER)).text
+            else:
+                results_text = (await extract_document(results_content, content_type="text/plain")).text
+    except PdfExtractionTimeout as e:
+        raise HTTPException(status_code=422, detail=f"Failed to read quiz: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read quiz: {str(e)}")
 
     try:
-        with get_connection() as conn:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            document_id = await add_document_reference(cursor, quiz_hash, len(content), quiz_text)
+            quiz_var = cursor.var(int)
+            await cursor.execute(
                 """
-                INSERT INTO quizzes (class_id, quiz_title, quiz_content, quiz_results)
-                VALUES (:class_id, :quiz_title, :quiz_content, :quiz_results)
+                INSERT INTO quizzes (class_id, quiz_title, document_id, quiz_results)
+                VALUES (:class_id, :quiz_title, :document_id, :quiz_results)
+                RETURNING id INTO :quiz_id
                 """,
                 {
                     "class_id": class_id,
                     "quiz_title": quiz_title,
-                    "quiz_content": quiz_text,
+                    "document_id": document_id,
                     "quiz_results": results_text,
+                    "quiz_id": quiz_var,
                 },
             )
-            conn.commit()
+            await conn.commit()
+        search_service.quizzes_changed(quiz_var.getvalue())
+        queue_embeddings()
         return {"message": "Quiz stored"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store quiz: {str(e)}")
 
 def extract_text_from_file(upload_file: UploadFile) -> str:
     """Extract text from uploaded .txt or .pdf file."""
-    filename = upload_file.filename or ""
-    content_type = upload_file.content_type or ""
     upload_file.file.seek(0)
     content = upload_file.file.read()
-    if filename.lower().endswith('.txt') or content_type == 'text/plain':
-        try:
-            text = content.decode('utf-8')
-        except UnicodeDecodeError:
-            text = content.decode('latin-1', errors='replace')
-        if not isinstance(text, str):
-            raise HTTPException(status_code=400, detail="Uploaded .txt file could not be decoded as text.")
-        return text
-    elif filename.lower().endswith('.pdf') or content_type == 'application/pdf':
-        if PdfReader is None:
-            raise HTTPException(status_code=500, detail="PyPDF2 is not installed on the server.")
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=True, suffix='.pdf') as tmp:
-            tmp.write(content)
-            tmp.flush()
-            reader = PdfReader(tmp.name)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text
-        if not text or not isinstance(text, str):
-            raise HTTPException(status_code=400, detail="No extractable text found in PDF. Please upload a PDF with selectable text.")
-        return text
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported file type. Only .txt and .pdf are allowed.")
+    try:
+        extracted = extract_document_sync(content, upload_file.filename, upload_file.content_type, parser=config.QUIZ_PDF_PARSER)
+    except UnsupportedDocument as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PdfExtractionTimeout as e:
+        raise HTTPException(status_code=422, detail=f"Failed to read file: {str(e)}")
+    if not extracted.text and not is_plain_text(upload_file.filename, upload_file.content_type):
+        raise HTTPException(status_code=400, detail="No extractable text found in PDF. Please upload a PDF with selectable text.")
+    return extracted.text
 
 
 # Removed /upload endpoint and QuizSchema usage
 
 @router.get("/")
-def get_quizzes():
+async def get_quizzes(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full",
+):
+    keyset, keyset_binds = keyset_sql(cursor)
+    if wants_ndjson(request):
+        return ndjson_response(stream_quizzes("1 = 1", keyset_binds, keyset, include_content=fields == "full"))
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, class_id, quiz_title, quiz_content, created_at FROM quizzes ORDER BY created_at DESC")
-            quizzes = [
-                {
-                    "id": row[0],
-                    "class_id": row[1],
-                    "quiz_title": row[2],
-                    "quiz_content": row[3],
-                    "created_at": row[4],
-                }
-                for row in cursor.fetchall()
-            ]
-            return quizzes
+        async with get_async_connection() as conn:
+            db_cursor = conn.cursor()
+            return await list_quizzes_page(
+                db_cursor, response, "1 = 1", keyset_binds, keyset, limit,
+                include_content=fields == "full"
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve quizzes: {str(e)}")
 
 @router.get("/{quiz_id}")
-def get_quiz(quiz_id: int):
+async def get_quiz(quiz_id: int):
     try:
-        with get_connection() as conn:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id, class_id, quiz_title, quiz_content, created_at FROM quizzes WHERE id = :quiz_id", {"quiz_id": quiz_id})
-            row = cursor.fetchone()
+            await cursor.execute("""
+                SELECT q.id, q.class_id, q.quiz_title, COALESCE(q.quiz_content, d.extracted_text), q.created_at
+                FROM quizzes q
+                LEFT JOIN documents d ON d.id = q.document_id
+                WHERE q.id = :quiz_id
+            """, {"quiz_id": quiz_id})
+            row = await cursor.fetchone()
             if not row:
                 raise HTTPException(status_code=404, detail="Quiz not found")
             return {
@@ -254,37 +439,47 @@ def get_quiz(quiz_id: int):
                 "quiz_content": row[3],
                 "created_at": row[4],
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve quiz: {str(e)}")
 
 @router.post("/")
-def create_quiz(
+async def create_quiz(
     class_id: int = Form(...),
     quiz_title: str = Form(...),
     file: UploadFile = File(...)
 ):
-    content = file.file.read()
-    from PyPDF2 import PdfReader
-    import io
-    reader = PdfReader(io.BytesIO(content))
-    quiz_text = ""
-    for page in reader.pages:
-        quiz_text += page.extract_text() or ""
     try:
-        with get_connection() as conn:
+        content, quiz_hash = await read_and_hash(file)
+        async with get_async_connection() as conn:
+            known_documents = await find_documents(conn.cursor(), [quiz_hash])
+        quiz_text = None if quiz_hash in known_documents else await extract_pdf(content, parser=config.QUIZ_PDF_PARSER)
+    except PdfExtractionTimeout as e:
+        raise HTTPException(status_code=422, detail=f"Failed to read quiz: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read quiz: {str(e)}")
+    try:
+        async with get_async_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            document_id = await add_document_reference(cursor, quiz_hash, len(content), quiz_text)
+            quiz_var = cursor.var(int)
+            await cursor.execute(
                 """
-                INSERT INTO quizzes (class_id, quiz_title, quiz_content)
-                VALUES (:class_id, :quiz_title, :quiz_content)
+                INSERT INTO quizzes (class_id, quiz_title, document_id)
+                VALUES (:class_id, :quiz_title, :document_id)
+                RETURNING id INTO :quiz_id
                 """,
                 {
                     "class_id": class_id,
                     "quiz_title": quiz_title,
-                    "quiz_content": quiz_text,
+                    "document_id": document_id,
+                    "quiz_id": quiz_var,
                 },
             )
-            conn.commit()
+            await conn.commit()
+        search_service.quizzes_changed(quiz_var.getvalue())
+        queue_embeddings()
         return {"message": "Quiz stored"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create quiz: {str(e)}")
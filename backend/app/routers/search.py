@@ -0,0 +1,54 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from ..schemas.search import PassagesResponse, SearchResponse
+from ..utils.embeddings import find_passages, vector_index_stats
+from ..utils.search import SearchUnavailable, search_service
+
+router = APIRouter()
+
+MAX_CONCEPTS = 20
+
+# Search lecture files and quizzes; served at /search itself, ahead of the SPA catch-all
+@router.get("", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    class_id: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    try:
+        backend, hits = await search_service.search(q, class_id, limit)
+        return {"query": q, "backend": backend, "results": [hit.to_dict() for hit in hits]}
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Search is unavailable, try again shortly: {str(e)}",
+                            headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search: {str(e)}")
+
+@router.get("/stats")
+async def search_stats():
+    return search_service.stats()
+
+# Lecture passages of a class closest in meaning to each concept (e.g. the
+# weak concepts of a class analysis); repeat q for several concepts
+@router.get("/passages", response_model=PassagesResponse)
+async def search_passages(
+    class_id: int,
+    q: List[str] = Query(...),
+    k: int = Query(5, ge=1, le=20),
+):
+    if len(q) > MAX_CONCEPTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CONCEPTS} concepts per request")
+    try:
+        found = await run_in_threadpool(find_passages, class_id, q, k)
+        return {
+            "class_id": class_id,
+            "results": [{"concept": concept, "passages": passages} for concept, passages in zip(q, found)],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to find passages: {str(e)}")
+
+@router.get("/passages/stats")
+async def passages_stats():
+    return await run_in_threadpool(vector_index_stats)
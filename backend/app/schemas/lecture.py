@@ -15,7 +15,7 @@ class LectureLabel(LectureLabelBase):
 class LectureFile(BaseModel):
     id: int
     file_type: str  # 'pdf', 'transcript'
-    pdf_text: str
+    pdf_text: Optional[str] = None  # omitted in summary listings
     uploaded_at: datetime
 
     class Config:
@@ -40,4 +40,16 @@ class Lecture(LectureBase):
         from_attributes = True
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class LectureImportItem(BaseModel):
+    index: int  # position in the manifest
+    lecture_title: Optional[str] = None
+    status: str  # 'created', 'failed'
+    lecture_id: Optional[int] = None
+    error: Optional[str] = None
+
+class LectureImportResult(BaseModel):
+    created: int
+    failed: int
+    items: List[LectureImportItem]
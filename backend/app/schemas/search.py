@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class SearchResult(BaseModel):
+    kind: str  # 'lecture', 'quiz'
+    lecture_id: Optional[int] = None
+    file_id: Optional[int] = None  # lecture_files.id for lecture hits
+    quiz_id: Optional[int] = None
+    class_id: int
+    title: str
+    file_type: Optional[str] = None
+    page: int  # 1-based page of the snippet
+    score: float
+    snippet: str
+
+class SearchResponse(BaseModel):
+    query: str
+    backend: str  # 'oracle', 'local'
+    results: List[SearchResult]
+
+class Passage(BaseModel):
+    lecture_id: int
+    lecture_title: str
+    file_type: str
+    document_id: int
+    page: int  # 1-based page the passage starts on
+    score: float  # cosine similarity to the concept
+    text: str
+
+class ConceptPassages(BaseModel):
+    concept: str
+    passages: List[Passage]
+
+class PassagesResponse(BaseModel):
+    class_id: int
+    results: List[ConceptPassages]
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Iterable, List, Set, Tuple
+
+from ..database import chunked, get_connection, in_list_binds
+from .blob_store import BlobStore, blob_store
+
+# Temp files of puts that died half way are swept once they are this old
+TMP_MAX_AGE = 3600
+
+
+class BlobReaper:
+    """
+    Removes released blobs on a background thread, so deletes return as soon
+    as their transaction commits.
+
+    A blob is skipped if it was touched by BlobStore.put after it was queued,
+    or if a documents row for it exists again: both mean a new upload of the
+    same content now relies on the file.
+    """
+
+    def __init__(self, store: BlobStore, batch_size: int = 1000):
+        self.store = store
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Tuple[str, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.removed = 0
+        self.skipped = 0
+
+    def reap(self, hashes: Iterable[str]):
+        """Queue the blobs of released documents for removal. Call after commit."""
+        queued_at = time.time()
+        hashes = list(hashes)
+        if not hashes:
+            return
+        for sha256 in hashes:
+            self._queue.put((sha256, queued_at))
+        self._ensure_thread()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="blob-reaper", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self.sweep_tmp()
+        while not self._stopping:
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.reap_now(batch)
+            except Exception:
+                print("[blob_reaper] batch failed:")
+                print(traceback.format_exc())
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def reap_now(self, batch: List[Tuple[str, float]]):
+        """Remove the (sha256, queued_at) blobs that nothing wants any more."""
+        referenced = self._referenced({sha256 for sha256, _ in batch})
+        os.makedirs(self.store.tmp_dir, exist_ok=True)
+        for sha256, queued_at in batch:
+            if sha256 in referenced:
+                self.skipped += 1
+                continue
+            # Move the blob aside first: a put that touches it before the
+            # rename shows in its mtime, one that comes after finds no blob
+            # and writes a fresh copy.
+            path = self.store.path(sha256)
+            doomed = os.path.join(self.store.tmp_dir, f"reap-{sha256}")
+            try:
+                os.rename(path, doomed)
+            except FileNotFoundError:
+                continue
+            if os.stat(doomed).st_mtime >= queued_at:
+                os.replace(doomed, path)
+                self.skipped += 1
+                continue
+            os.remove(doomed)
+            self.removed += 1
+
+    def _referenced(self, hashes: Set[str]) -> Set[str]:
+        found = set()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            for chunk in chunked(hashes):
+                placeholders, binds = in_list_binds(chunk, prefix="sha")
+                cursor.execute(f"SELECT sha256 FROM documents WHERE sha256 IN ({placeholders})", binds)
+                found.update(row[0] for row in cursor.fetchall())
+        return found
+
+    def sweep_tmp(self):
+        """Delete temp files left behind by puts that crashed before their rename."""
+        cutoff = time.time() - TMP_MAX_AGE
+        try:
+            entries = list(os.scandir(self.store.tmp_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def drain(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is processed. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: float = 5):
+        """Finish what is queued (up to ``timeout`` seconds) and stop the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self.drain(timeout)
+        self._stopping = True
+
+
+blob_reaper = BlobReaper(blob_store)
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import os
+import tempfile
+from typing import BinaryIO, Tuple
+
+from ..config import config
+
+# Blocks read for hashing, and written when zero-copy is not possible
+BLOCK_SIZE = 1 << 20
+
+
+def _has_descriptor(source: BinaryIO) -> bool:
+    # An in-memory spool (small upload) would be written to disk just to get a descriptor
+    if not getattr(source, "_rolled", True):
+        return False
+    try:
+        source.fileno()
+        return True
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _zero_copy(src_fd: int, dst_fd: int, size: int):
+    """
+    Copy ``size`` bytes from the start of ``src_fd`` into ``dst_fd`` inside the
+    kernel: copy_file_range where the platform has it, sendfile otherwise, and
+    plain read/write as the last resort.
+    """
+    offset = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset_src=offset)
+                if copied == 0:
+                    break
+                offset += copied
+            if offset == size:
+                return
+        except OSError:
+            # e.g. EXDEV across filesystems on older kernels; continue where it stopped
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            if offset == size:
+                return
+        except OSError:
+            pass
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    while offset < size:
+        block = os.read(src_fd, min(BLOCK_SIZE, size - offset))
+        if not block:
+            break
+        _write_all(dst_fd, block)
+        offset += len(block)
+
+
+class BlobStore:
+    """
+    Content-addressed file store: each distinct upload is kept once, at
+    ``root/ab/cd/<sha256>``. The two directory levels cap any directory at a
+    few entries even with millions of blobs. Blobs are written to ``root/tmp``
+    and renamed into place, so readers never see a partial file.
+    Reference counts live in the documents table (see app.utils.documents).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def put(self, source: BinaryIO) -> Tuple[str, int, bool]:
+        """
+        Store the contents of ``source`` and return (sha256, size, created).
+        The source is hashed first; content that is already stored is not
+        written again, only its mtime is refreshed. Sources backed by a real file (large uploads that were
+        spooled to disk) are copied with _zero_copy.
+        """
+        source.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        # Without a file descriptor to copy from, keep the blocks for writing
+        blocks = None if _has_descriptor(source) else []
+        while True:
+            block = source.read(BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+            if blocks is not None:
+                blocks.append(block)
+        sha256 = digest.hexdigest()
+
+        final_path = self.path(sha256)
+        try:
+            # Touch it, so a pending reap of the same content (see
+            # app.utils.blob_reaper) knows the blob is wanted again
+            os.utime(final_path)
+            return sha256, size, False
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            if blocks is None:
+                source.flush()
+                _zero_copy(source.fileno(), fd, size)
+            else:
+                for block in blocks:
+                    _write_all(fd, block)
+            os.fsync(fd)
+            os.close(fd)
+            fd = None
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size, True
+
+    def remove(self, sha256: str):
+        try:
+            os.remove(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+blob_store = BlobStore(os.path.join(config.UPLOAD_DIR, "blobs"))
@@ -0,0 +1,49 @@
+from typing import List
+
+from .documents import release_documents
+
+# Rows keyed by lecture_id, deleted before their lectures
+LECTURE_CHILDREN = ("lecture_labels", "lecture_files", "lecture_digests")
+
+
+def _delete_lectures(cursor, where: str, binds: dict):
+    """Delete the lectures matching ``where`` and their children, one statement per table."""
+    for table in LECTURE_CHILDREN:
+        cursor.execute(f"DELETE FROM {table} WHERE lecture_id IN (SELECT id FROM lectures WHERE {where})", binds)
+    cursor.execute(f"DELETE FROM lectures WHERE {where}", binds)
+
+
+def delete_lecture_rows(cursor, lecture_id: int) -> List[str]:
+    """
+    Delete a lecture with its labels, files and digest, releasing the
+    documents its files used. Returns the hashes of blobs to reap after commit.
+    """
+    binds = {"lecture_id": lecture_id}
+    cursor.execute(
+        "SELECT document_id FROM lecture_files WHERE lecture_id = :lecture_id AND document_id IS NOT NULL", binds
+    )
+    released = release_documents(cursor, [row[0] for row in cursor.fetchall()])
+    _delete_lectures(cursor, "id = :lecture_id", binds)
+    return released
+
+
+def delete_class_rows(cursor, class_id: int) -> List[str]:
+    """
+    Delete a class with all its lectures (and their children), quizzes and
+    analyses in a fixed number of statements, however many lectures it has.
+    Returns the hashes of blobs to reap after commit.
+    """
+    binds = {"class_id": class_id}
+    cursor.execute("""
+        SELECT lf.document_id FROM lecture_files lf
+        WHERE lf.lecture_id IN (SELECT id FROM lectures WHERE class_id = :class_id)
+          AND lf.document_id IS NOT NULL
+        UNION ALL
+        SELECT document_id FROM quizzes WHERE class_id = :class_id AND document_id IS NOT NULL
+    """, binds)
+    released = release_documents(cursor, [row[0] for row in cursor.fetchall()])
+    _delete_lectures(cursor, "class_id = :class_id", binds)
+    cursor.execute("DELETE FROM quizzes WHERE class_id = :class_id", binds)
+    cursor.execute("DELETE FROM class_analysis WHERE class_id = :class_id", binds)
+    cursor.execute("DELETE FROM classes WHERE id = :class_id", binds)
+    return released
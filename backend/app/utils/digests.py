@@ -0,0 +1,66 @@
+from typing import Iterable, Optional
+
+from ..config import config
+from ..database import get_connection
+from .jobs import JobQueue, JobQueueFull
+from .oracle_ai import digest_lecture
+
+# Background runner for lecture digests, one LLM call (plus chunk summaries) each
+digest_jobs = JobQueue(max_workers=config.DIGEST_WORKERS, max_pending=config.DIGEST_MAX_PENDING)
+
+
+def generate_lecture_digest(lecture_id: int) -> Optional[str]:
+    """
+    Digest the lecture's files and store the result in lecture_digests.
+    Returns None when the lecture is gone or has no text to digest.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT lecture_title FROM lectures WHERE id = :lecture_id", {"lecture_id": lecture_id})
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        title = row[0]
+        cursor.execute("""
+            SELECT COALESCE(lf.pdf_text, d.extracted_text)
+            FROM lecture_files lf
+            LEFT JOIN documents d ON d.id = lf.document_id
+            WHERE lf.lecture_id = :lecture_id
+            ORDER BY lf.id
+        """, {"lecture_id": lecture_id})
+        text = "\n".join(r[0] for r in cursor.fetchall() if r[0])
+    if not text.strip():
+        return None
+
+    # The LLM call happens without holding a pooled connection
+    digest = digest_lecture(title, text)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM lecture_digests WHERE lecture_id = :lecture_id", {"lecture_id": lecture_id})
+        cursor.execute(
+            """
+            INSERT INTO lecture_digests (lecture_id, digest_text)
+            VALUES (:lecture_id, :digest_text)
+            """,
+            {"lecture_id": lecture_id, "digest_text": digest}
+        )
+        conn.commit()
+    return digest
+
+
+def queue_lecture_digests(lecture_ids: Iterable[int]) -> int:
+    """
+    Queue digest generation for the lectures; already queued ones are not
+    duplicated. Stops quietly when the queue is full, since analytics falls
+    back to raw text and re-queues missing digests on its next run.
+    Returns the number of lectures queued.
+    """
+    queued = 0
+    for lecture_id in lecture_ids:
+        try:
+            digest_jobs.submit(("lecture_digest", lecture_id), generate_lecture_digest, lecture_id)
+        except JobQueueFull:
+            break
+        queued += 1
+    return queued
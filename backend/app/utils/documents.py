@@ -0,0 +1,162 @@
+import hashlib
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import oracledb
+from fastapi import UploadFile
+
+from ..database import chunked, in_list_binds, is_unique_violation
+from .text_extraction import ExtractedText
+
+# Uploads are read and hashed in blocks of this many bytes
+HASH_BLOCK = 1 << 20
+
+
+async def read_and_hash(upload: UploadFile) -> Tuple[bytes, str]:
+    """Read an upload into memory, hashing it as the blocks come in. Returns (content, SHA-256 hex)."""
+    digest = hashlib.sha256()
+    blocks = []
+    while True:
+        block = await upload.read(HASH_BLOCK)
+        if not block:
+            break
+        digest.update(block)
+        blocks.append(block)
+    return b"".join(blocks), digest.hexdigest()
+
+
+def encode_page_offsets(offsets: List[int]) -> Optional[str]:
+    """documents.page_offsets for a document whose pages start at ``offsets``; NULL for a single page."""
+    if len(offsets) <= 1:
+        return None
+    return ",".join(str(offset) for offset in offsets)
+
+
+def decode_page_offsets(value: Optional[str]) -> List[int]:
+    return [int(offset) for offset in value.split(",")] if value else [0]
+
+
+def page_at(page_offsets: List[int], position: int) -> int:
+    """1-based page number holding character ``position``."""
+    return max(bisect_right(page_offsets, position), 1)
+
+
+async def find_documents(cursor, hashes: Iterable[str]) -> Dict[str, int]:
+    """Map each already stored SHA-256 in ``hashes`` to its documents.id."""
+    found = {}
+    for chunk in chunked(list(set(hashes))):
+        placeholders, binds = in_list_binds(chunk, prefix="sha")
+        await cursor.execute(f"SELECT sha256, id FROM documents WHERE sha256 IN ({placeholders})", binds)
+        found.update({row[0]: row[1] for row in await cursor.fetchall()})
+    return found
+
+
+async def add_document_reference(cursor, sha256: str, byte_size: int, extracted: Optional[ExtractedText]) -> int:
+    """
+    Count one more reference to the document with this hash and return its
+    id, inserting it with the ``extracted`` text if it is not stored yet. If a concurrent
+    upload of the same content inserted it first, that row is used instead.
+    """
+    await cursor.execute(
+        "UPDATE documents SET ref_count = ref_count + 1 WHERE sha256 = :sha256", {"sha256": sha256}
+    )
+    if cursor.rowcount == 0:
+        if extracted is None:
+            # Found by find_documents, then released by a delete in between
+            raise Exception("Uploaded document was deleted during the upload, please retry")
+        try:
+            await cursor.execute("""
+                INSERT INTO documents (sha256, byte_size, extracted_text, page_offsets, ref_count)
+                VALUES (:sha256, :byte_size, :extracted_text, :page_offsets, 1)
+            """, {
+                "sha256": sha256,
+                "byte_size": byte_size,
+                "extracted_text": extracted.text,
+                "page_offsets": encode_page_offsets(extracted.page_offsets),
+            })
+        except oracledb.IntegrityError as e:
+            if not is_unique_violation(e):
+                raise
+            # Unique violation on sha256: stored meanwhile, count this reference
+            await cursor.execute(
+                "UPDATE documents SET ref_count = ref_count + 1 WHERE sha256 = :sha256", {"sha256": sha256}
+            )
+    await cursor.execute("SELECT id FROM documents WHERE sha256 = :sha256", {"sha256": sha256})
+    row = await cursor.fetchone()
+    if row is None:
+        raise Exception(f"Failed to store document {sha256}")
+    return row[0]
+
+
+async def add_document_references(
+    cursor, references: Dict[str, Tuple[int, Optional[ExtractedText], int]]
+) -> Dict[str, int]:
+    """
+    Array form of add_document_reference for bulk imports. ``references``
+    maps SHA-256 to (byte_size, extracted, count); extracted is None for documents
+    find_documents already found. Known documents get their counts with one
+    array UPDATE, new ones are inserted (or counted, if a concurrent upload
+    stored them first) with one array MERGE. Returns SHA-256 -> documents.id.
+    """
+    known = [{"sha256": sha, "refs": count} for sha, (_, extracted, count) in references.items() if extracted is None]
+    new = [
+        {
+            "sha256": sha,
+            "byte_size": byte_size,
+            "extracted_text": extracted.text,
+            "page_offsets": encode_page_offsets(extracted.page_offsets),
+            "refs": count,
+        }
+        for sha, (byte_size, extracted, count) in references.items() if extracted is not None
+    ]
+    if known:
+        await cursor.executemany(
+            "UPDATE documents SET ref_count = ref_count + :refs WHERE sha256 = :sha256", known
+        )
+    if new:
+        await cursor.executemany("""
+            MERGE INTO documents d
+            USING (SELECT :sha256 AS sha256, :byte_size AS byte_size,
+                          :extracted_text AS extracted_text, :page_offsets AS page_offsets,
+                          :refs AS refs FROM dual) s
+            ON (d.sha256 = s.sha256)
+            WHEN MATCHED THEN UPDATE SET d.ref_count = d.ref_count + s.refs
+            WHEN NOT MATCHED THEN INSERT (sha256, byte_size, extracted_text, page_offsets, ref_count)
+                VALUES (s.sha256, s.byte_size, s.extracted_text, s.page_offsets, s.refs)
+        """, new)
+    ids = await find_documents(cursor, references)
+    if len(ids) < len(references):
+        # Found by find_documents, then released by a delete in between
+        raise Exception("Uploaded document was deleted during the upload, please retry")
+    return ids
+
+
+def release_documents(cursor, document_ids: List[int]) -> List[str]:
+    """
+    Drop one reference per entry of ``document_ids`` (repeat an id to drop
+    several) and delete the documents nothing references any more, with
+    their embedded chunks. Returns
+    the hashes of the deleted documents so the caller can remove their blobs
+    once the transaction is committed.
+    """
+    if not document_ids:
+        return []
+    cursor.executemany(
+        "UPDATE documents SET ref_count = ref_count - 1 WHERE id = :id",
+        [{"id": document_id} for document_id in document_ids]
+    )
+    released = []
+    for chunk in chunked(list(set(document_ids))):
+        placeholders, binds = in_list_binds(chunk)
+        cursor.execute(f"""
+            DELETE FROM document_chunks WHERE document_id IN (
+                SELECT id FROM documents WHERE id IN ({placeholders}) AND ref_count <= 0
+            )
+        """, binds)
+        sha256 = cursor.var(str)
+        cursor.execute(f"""
+            DELETE FROM documents WHERE id IN ({placeholders}) AND ref_count <= 0
+            RETURNING sha256 INTO :sha256
+        """, dict(binds, sha256=sha256))
+        released.extend(sha256.getvalue())
+    return released
@@ -0,0 +1,462 @@
+import hashlib
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..config import config
+from ..database import chunked, get_connection, in_list_binds
+from .documents import decode_page_offsets
+from .jobs import JobQueue, JobQueueFull
+from .prompt_builder import CHARS_PER_TOKEN
+
+if TYPE_CHECKING:
+    from .vector_index import VectorIndex
+
+# One background sweep at a time embeds whatever documents are pending
+embedding_jobs = JobQueue(max_workers=1, max_pending=1)
+_sweep_requested = threading.Event()
+
+# Texts -> vectors, one request's worth at a time; oracle_ai.embed_texts unless replaced
+Embedder = Callable[[List[str]], List[List[float]]]
+
+
+def chunk_spans(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[Tuple[int, int]]:
+    """
+    (start, end) character spans of ``text`` of at most ``max_tokens``,
+    cut at paragraph, line, sentence or word boundaries where possible.
+    Consecutive spans share about ``overlap_tokens`` so a passage cut in
+    two is still whole in one of them. Whitespace-only spans are dropped.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    overlap = min(overlap_tokens * CHARS_PER_TOKEN, limit // 2)
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + limit, len(text))
+        if end < len(text):
+            # Never cut in the first half of a chunk, so chunks stay near full size
+            floor = start + limit // 2
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, floor, end)
+                if cut > 0:
+                    end = cut + len(separator)
+                    break
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= len(text):
+            break
+        # Step back by the overlap, to the start of a word
+        next_start = end - overlap
+        if overlap:
+            space = text.find(" ", next_start, end)
+            next_start = space + 1 if space >= 0 else end
+        start = max(next_start, start + 1)
+    return spans
+
+
+def content_hash(model_id: str, text: str) -> str:
+    """Identity of a chunk's vector: the same text under the same model embeds the same."""
+    return hashlib.sha256(f"{model_id}\n{text}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(values: Iterable[float]) -> bytes:
+    """Little-endian float32 bytes, as stored in document_chunks.embedding."""
+    return array("f", values).tobytes()
+
+
+def unpack_vector(data: bytes) -> array:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector
+
+
+class Chunk:
+    __slots__ = ("document_id", "ordinal", "start", "end", "page", "text", "content_hash")
+
+    def __init__(self, document_id, ordinal, start, end, page, text, content_hash):
+        self.document_id = document_id
+        self.ordinal = ordinal
+        self.start = start
+        self.end = end
+        self.page = page
+        self.text = text
+        self.content_hash = content_hash
+
+
+def chunk_document(document_id: int, text: str, page_offsets: List[int], model_id: str) -> List[Chunk]:
+    """
+    Chunks of a document, page by page: no chunk spans two pages, so an
+    edited page changes only its own chunks and the rest keep their hashes.
+    """
+    chunks = []
+    bounds = page_offsets + [len(text)]
+    for page, (page_start, page_end) in enumerate(zip(bounds, bounds[1:]), start=1):
+        page_text = text[page_start:page_end]
+        for start, end in chunk_spans(page_text, config.EMBED_CHUNK_TOKENS, config.EMBED_CHUNK_OVERLAP_TOKENS):
+            piece = page_text[start:end]
+            chunks.append(Chunk(
+                document_id, len(chunks), page_start + start, page_start + end, page, piece,
+                content_hash(model_id, piece),
+            ))
+    return chunks
+
+
+def embed_missing(texts: Dict[str, str], embed: Embedder, batch_size: int, concurrency: int) -> Dict[str, bytes]:
+    """
+    Embed ``texts`` (content hash -> text) in requests of ``batch_size``
+    inputs, ``concurrency`` requests at a time. Returns hash -> packed vector.
+    """
+    hashes = list(texts)
+    batches = [hashes[start:start + batch_size] for start in range(0, len(hashes), batch_size)]
+
+    def run(batch):
+        vectors = embed([texts[key] for key in batch])
+        if len(vectors) != len(batch):
+            raise Exception(f"Embed request returned {len(vectors)} vectors for {len(batch)} inputs")
+        return batch, vectors
+
+    packed = {}
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        for batch, vectors in executor.map(run, batches):
+            for key, vector in zip(batch, vectors):
+                packed[key] = pack_vector(vector)
+    return packed
+
+
+def _stored_vectors(cursor, hashes: Iterable[str]) -> Dict[str, bytes]:
+    """Vectors already stored for any of ``hashes``, by any document."""
+    found = {}
+    for chunk in chunked(list(hashes)):
+        placeholders, binds = in_list_binds(chunk, prefix="hash")
+        cursor.execute(
+            f"SELECT content_hash, embedding FROM document_chunks WHERE content_hash IN ({placeholders})", binds
+        )
+        found.update(cursor.fetchall())
+    return found
+
+
+def embed_documents(document_ids: List[int], embed: Optional[Embedder] = None, model_id: Optional[str] = None) -> dict:
+    """
+    Chunk the documents, embed the chunks no document has a vector for yet,
+    and replace the documents' document_chunks rows, in one transaction.
+    Chunks whose text did not change (or that another document shares)
+    keep their stored vector. Returns counts of what was done.
+    """
+    if embed is None or model_id is None:
+        # Deferred: oracle_ai builds the OCI client on import
+        from .oracle_ai import EMBED_MODEL_ID, embed_texts
+        embed = embed or embed_texts
+        model_id = model_id or EMBED_MODEL_ID
+
+    chunks: List[Chunk] = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for ids in chunked(document_ids):
+            placeholders, binds = in_list_binds(ids)
+            cursor.execute(
+                f"SELECT id, extracted_text, page_offsets FROM documents WHERE id IN ({placeholders})", binds
+            )
+            for document_id, text, offsets in cursor.fetchall():
+                if text:
+                    chunks.extend(chunk_document(document_id, text, decode_page_offsets(offsets), model_id))
+        stored = _stored_vectors(cursor, {chunk.content_hash for chunk in chunks})
+
+    # Embedding happens without holding a pooled connection
+    missing = {chunk.content_hash: chunk.text for chunk in chunks if chunk.content_hash not in stored}
+    vectors = dict(stored)
+    vectors.update(embed_missing(missing, embed, config.EMBED_BATCH_SIZE, config.EMBED_CONCURRENCY))
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for ids in chunked(document_ids):
+            placeholders, binds = in_list_binds(ids)
+            cursor.execute(f"DELETE FROM document_chunks WHERE document_id IN ({placeholders})", binds)
+        if chunks:
+            # Documents deleted meanwhile select no row, so their chunks are not stored
+            cursor.executemany("""
+                INSERT INTO document_chunks
+                    (document_id, ordinal, char_start, char_end, page, content_hash, model_id, embedding)
+                SELECT id, :ordinal, :char_start, :char_end, :page, :content_hash, :model_id, :embedding
+                FROM documents WHERE id = :document_id
+            """, [
+                {
+                    "document_id": chunk.document_id,
+                    "ordinal": chunk.ordinal,
+                    "char_start": chunk.start,
+                    "char_end": chunk.end,
+                    "page": chunk.page,
+                    "content_hash": chunk.content_hash,
+                    "model_id": model_id,
+                    "embedding": vectors[chunk.content_hash],
+                }
+                for chunk in chunks
+            ])
+        conn.commit()
+    _update_vector_index(model_id, document_ids, chunks, vectors)
+    return {
+        "documents": len(document_ids),
+        "chunks": len(chunks),
+        "embedded": len(missing),
+        "requests": -(-len(missing) // config.EMBED_BATCH_SIZE),
+    }
+
+
+def pending_documents(model_id: str, after: int = 0, limit: int = 100) -> List[int]:
+    """Ids above ``after`` of documents with text but no chunks embedded by ``model_id``."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT d.id FROM documents d
+            WHERE d.id > :after AND d.extracted_text IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM document_chunks c WHERE c.document_id = d.id AND c.model_id = :model_id
+              )
+            ORDER BY d.id
+            FETCH FIRST :limit ROWS ONLY
+        """, {"after": after, "model_id": model_id, "limit": limit})
+        return [row[0] for row in cursor.fetchall()]
+
+
+def embed_pending_documents(embed: Optional[Embedder] = None, model_id: Optional[str] = None) -> dict:
+    """
+    Embed every document that has no chunks for the current model yet,
+    EMBED_DOCUMENTS_PER_RUN documents per transaction. This also covers
+    documents stored before embeddings existed, and everything after a
+    model change.
+    """
+    if model_id is None:
+        from .oracle_ai import EMBED_MODEL_ID
+        model_id = EMBED_MODEL_ID
+    totals = {"documents": 0, "chunks": 0, "embedded": 0, "requests": 0}
+    after = 0
+    while True:
+        ids = pending_documents(model_id, after, config.EMBED_DOCUMENTS_PER_RUN)
+        if not ids:
+            return totals
+        # Documents whose text yields no chunk stay pending; moving past them ends the sweep
+        after = ids[-1]
+        for name, count in embed_documents(ids, embed, model_id).items():
+            totals[name] += count
+
+
+def _sweep() -> dict:
+    totals = {"documents": 0, "chunks": 0, "embedded": 0, "requests": 0}
+    while _sweep_requested.is_set():
+        _sweep_requested.clear()
+        for name, count in embed_pending_documents().items():
+            totals[name] += count
+    return totals
+
+
+def queue_embeddings() -> bool:
+    """
+    Queue a sweep that embeds all pending documents. Call after committing
+    new documents. Calls made while a sweep runs make it go round once more
+    rather than queueing a second one. Returns False if the sweep could not
+    be queued.
+    """
+    _sweep_requested.set()
+    try:
+        embedding_jobs.submit("embed_pending_documents", _sweep)
+    except JobQueueFull:
+        return False
+    return True
+
+
+# Local vector index, one per embedding model; numpy and the index module
+# are imported on first use, so importing this module stays cheap
+_indexes: Dict[str, "VectorIndex"] = {}
+_indexes_lock = threading.Lock()
+_build_lock = threading.Lock()
+_query_vectors: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+_query_vectors_lock = threading.Lock()
+
+
+def vector_index(model_id: str) -> "VectorIndex":
+    """The (possibly not yet built) local vector index of ``model_id``'s chunks."""
+    from .vector_index import VectorIndex
+    with _indexes_lock:
+        index = _indexes.get(model_id)
+        if index is None:
+            directory = re.sub(r"[^A-Za-z0-9._-]", "_", model_id)
+            index = _indexes[model_id] = VectorIndex(os.path.join(config.VECTOR_INDEX_DIR, directory))
+        return index
+
+
+def _stored_chunk_batches(model_id: str, batch_size: int = 5000):
+    """(rows, vectors) batches of every chunk embedded by ``model_id``, for VectorIndex.rebuild."""
+    import numpy as np
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.arraysize = batch_size
+        cursor.execute("""
+            SELECT document_id, ordinal, page, char_start, char_end, embedding
+            FROM document_chunks WHERE model_id = :model_id
+            ORDER BY document_id, ordinal
+        """, {"model_id": model_id})
+        while True:
+            fetched = cursor.fetchmany(batch_size)
+            if not fetched:
+                return
+            yield [row[:5] for row in fetched], np.stack([np.frombuffer(row[5], dtype="<f4") for row in fetched])
+
+
+def rebuild_vector_index(model_id: str) -> dict:
+    """Rebuild ``model_id``'s index from document_chunks, dropping rows of deleted documents."""
+    index = vector_index(model_id)
+    index.rebuild(_stored_chunk_batches(model_id), train_above=config.VECTOR_IVF_MIN_ROWS)
+    return index.stats()
+
+
+def open_vector_index(model_id: str) -> "VectorIndex":
+    """``model_id``'s index, built from document_chunks the first time it is needed on this host."""
+    index = vector_index(model_id)
+    if not index.exists:
+        with _build_lock:
+            # One build per process; another process building at the same time only costs time
+            if not index.exists:
+                rebuild_vector_index(model_id)
+    return index
+
+
+def _update_vector_index(model_id: str, document_ids: List[int], chunks: List[Chunk], vectors: Dict[str, bytes]):
+    """
+    Swap the documents' rows in the local index for their new chunks. An
+    index not built yet is left alone: it is built from document_chunks,
+    which already has them. Once the rows appended since the last training
+    outgrow a quarter of the trained ones, the partitions are retrained.
+    """
+    index = vector_index(model_id)
+    if not index.exists:
+        return
+    import numpy as np
+    rows = [(chunk.document_id, chunk.ordinal, chunk.page, chunk.start, chunk.end) for chunk in chunks]
+    index.replace_documents(
+        document_ids, rows, [np.frombuffer(vectors[chunk.content_hash], dtype="<f4") for chunk in chunks],
+    )
+    if index.count >= config.VECTOR_IVF_MIN_ROWS and index.count - index.trained > index.trained // 4:
+        index.train()
+
+
+def embed_queries(texts: List[str], embed: Optional[Embedder] = None, model_id: Optional[str] = None) -> List[list]:
+    """
+    Query vectors for ``texts``, embedded as SEARCH_QUERY in one request for
+    those not seen recently. The same weak concepts come up for every
+    student of a class, so repeats cost no request.
+    """
+    if model_id is None:
+        from .oracle_ai import EMBED_MODEL_ID
+        model_id = EMBED_MODEL_ID
+    found = {}
+    with _query_vectors_lock:
+        for text in texts:
+            vector = _query_vectors.get((model_id, text))
+            if vector is not None:
+                _query_vectors.move_to_end((model_id, text))
+                found[text] = vector
+    missing = [text for text in dict.fromkeys(texts) if text not in found]
+    if missing and embed is None:
+        from .oracle_ai import embed_texts
+        embed = partial(embed_texts, input_type="SEARCH_QUERY")
+    for start in range(0, len(missing), config.EMBED_BATCH_SIZE):
+        batch = missing[start:start + config.EMBED_BATCH_SIZE]
+        for text, vector in zip(batch, embed(batch)):
+            found[text] = vector
+            with _query_vectors_lock:
+                _query_vectors[(model_id, text)] = vector
+                while len(_query_vectors) > config.VECTOR_QUERY_CACHE_SIZE:
+                    _query_vectors.popitem(last=False)
+    return [found[text] for text in texts]
+
+
+def find_passages(class_id: int, concepts: List[str], k: int = 5, embed: Optional[Embedder] = None,
+                  model_id: Optional[str] = None) -> List[List[dict]]:
+    """
+    The ``k`` lecture passages of the class closest to each concept, best
+    first. Only the class's lecture documents are scored, so rows left in
+    the index by deleted documents never match. Two database round trips:
+    the class's documents, then the passages' text.
+    """
+    if model_id is None:
+        from .oracle_ai import EMBED_MODEL_ID
+        model_id = EMBED_MODEL_ID
+    query_vectors = embed_queries(concepts, embed, model_id)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT lf.document_id, l.id, l.lecture_title, lf.file_type
+            FROM lecture_files lf
+            JOIN lectures l ON l.id = lf.lecture_id
+            WHERE l.class_id = :class_id AND lf.document_id IS NOT NULL
+            ORDER BY l.id, lf.id
+        """, {"class_id": class_id})
+        lectures = {}
+        for document_id, lecture_id, lecture_title, file_type in cursor.fetchall():
+            # A document shared by several lectures is credited to the first
+            lectures.setdefault(document_id, (lecture_id, lecture_title, file_type))
+    if not lectures:
+        return [[] for _ in concepts]
+
+    # Outside the connection: building the index takes a pooled connection of its own, and
+    # threads holding one while they wait on the build could leave none for it
+    # Row ids are looked up in the mapping they were found in, whatever rebuilds happen meanwhile
+    index = open_vector_index(model_id).snapshot()
+    hits = index.search(query_vectors, k, document_ids=lectures, nprobe=config.VECTOR_NPROBE)
+    rows = {row_id: index.row(row_id) for found in hits for row_id, _ in found}
+    if not rows:
+        return [[] for _ in concepts]
+
+    # Passage text straight from the stored extraction, one UNION ALL branch per passage
+    texts = {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for ids in chunked(list(rows)):
+            selects, binds = [], {}
+            for n, row_id in enumerate(ids):
+                row = rows[row_id]
+                selects.append(
+                    f"SELECT {row_id} AS row_id, SUBSTR(extracted_text, :start_{n}, :length_{n}) "
+                    f"FROM documents WHERE id = :document_{n}"
+                )
+                binds.update({
+                    f"start_{n}": row["char_start"] + 1,
+                    f"length_{n}": row["char_end"] - row["char_start"],
+                    f"document_{n}": row["document_id"],
+                })
+            cursor.execute(" UNION ALL ".join(selects), binds)
+            texts.update(cursor.fetchall())
+
+    results = []
+    for found in hits:
+        passages = []
+        for row_id, score in found:
+            row = rows[row_id]
+            if row_id not in texts:
+                continue  # document deleted since
+            lecture_id, lecture_title, file_type = lectures[row["document_id"]]
+            passages.append({
+                "lecture_id": lecture_id,
+                "lecture_title": lecture_title,
+                "file_type": file_type,
+                "document_id": row["document_id"],
+                "page": row["page"],
+                "score": round(score, 4),
+                "text": texts[row_id],
+            })
+        results.append(passages)
+    return results
+
+
+def vector_index_stats(model_id: Optional[str] = None) -> dict:
+    if model_id is None:
+        from .oracle_ai import EMBED_MODEL_ID
+        model_id = EMBED_MODEL_ID
+    stats = vector_index(model_id).stats()
+    stats["model_id"] = model_id
+    stats["cached_queries"] = len(_query_vectors)
+    return stats
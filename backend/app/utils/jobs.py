@@ -0,0 +1,121 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a submit would exceed the queue's pending-job limit."""
+
+
+class Job:
+    __slots__ = ("id", "key", "status", "result", "error", "created_at", "started_at", "finished_at")
+
+    def __init__(self, key: Hashable):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    In-process background job runner on a bounded thread pool.
+
+    Jobs are deduplicated by key: submitting a key that already has a queued or
+    running job returns that job instead of starting another one. Finished jobs
+    are kept for ``retention`` seconds so clients can poll for the result.
+    Job state lives in this process only, so with several uvicorn workers a poll
+    may land on a worker that does not know the job.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, retention: float = 3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._max_pending = max_pending
+        self._retention = retention
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[Hashable, Job] = {}
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> Job:
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            if len(self._active) >= self._max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({self._max_pending})")
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def completed(self, key: Hashable, result) -> Job:
+        """Record a job that finished without running, e.g. answered from a cache."""
+        job = Job(key)
+        job.result = result
+        job.status = SUCCEEDED
+        job.started_at = job.finished_at = job.created_at
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def active(self, key: Hashable) -> Optional[Job]:
+        """The queued or running job for ``key``, if any."""
+        return self._active.get(key)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = SUCCEEDED
+        except Exception as e:
+            print(f"[jobs] job {job.id} ({job.key}) failed:")
+            print(traceback.format_exc())
+            job.error = getattr(e, "detail", None) or str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _prune(self):
+        cutoff = time.time() - self._retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
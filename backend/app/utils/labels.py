@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import oracledb
+
+from ..config import config
+from ..database import chunked, in_list_binds, is_unique_violation
+
+
+class LabelCache:
+    """
+    Bounded name -> labels.id map, least recently used evicted first.
+    Labels are never renamed or deleted, so entries do not go stale.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> Optional[int]:
+        with self._lock:
+            label_id = self._entries.get(name)
+            if label_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return label_id
+
+    def put(self, name: str, label_id: int):
+        with self._lock:
+            self._entries[name] = label_id
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put_many(self, ids: Dict[str, int]):
+        for name, label_id in ids.items():
+            self.put(name, label_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+label_cache = LabelCache(config.LABEL_CACHE_SIZE)
+
+
+def unique_labels(names: Iterable[str]) -> List[str]:
+    """Stripped, non-empty names in first-seen order, without duplicates."""
+    return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+
+
+async def upsert_labels(cursor, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Make sure every label in ``names`` exists and return name -> id.
+
+    Names found in label_cache cost nothing. The rest are created with one
+    array MERGE (existing names are left alone) and read back with one
+    SELECT per 1000 names. The new pairs are not cached here: the caller
+    passes them to ``label_cache.put_many`` once its transaction commits, so
+    a rollback cannot leave ids of labels that were never created.
+    """
+    names = unique_labels(names)
+    ids = {}
+    missing = []
+    for name in names:
+        label_id = label_cache.get(name)
+        if label_id is None:
+            missing.append(name)
+        else:
+            ids[name] = label_id
+    if not missing:
+        return ids
+
+    merge_sql = """
+        MERGE INTO labels l
+        USING (SELECT :label_name AS label_name FROM dual) s
+        ON (l.label_name = s.label_name)
+        WHEN NOT MATCHED THEN INSERT (label_name) VALUES (s.label_name)
+    """
+    rows = [{"label_name": name} for name in missing]
+    try:
+        await cursor.executemany(merge_sql, rows)
+    except oracledb.IntegrityError as e:
+        if not is_unique_violation(e):
+            raise
+        # A concurrent upload inserted one of the names first (unique
+        # violation); now that its row is visible the MERGE matches it.
+        await cursor.executemany(merge_sql, rows)
+
+    for chunk in chunked(missing):
+        placeholders, binds = in_list_binds(chunk, prefix="name")
+        await cursor.execute(f"SELECT id, label_name FROM labels WHERE label_name IN ({placeholders})", binds)
+        for label_id, name in await cursor.fetchall():
+            ids[name] = label_id
+    return ids
+
+
+async def link_lecture_labels(cursor, lecture_id: int, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Attach the labels to the lecture, creating missing ones: one executemany
+    for the links. Returns name -> id for ``label_cache.put_many`` after commit.
+    """
+    ids = await upsert_labels(cursor, names)
+    if ids:
+        await cursor.executemany(
+            "INSERT INTO lecture_labels (lecture_id, label_id) VALUES (:lecture_id, :label_id)",
+            [{"lecture_id": lecture_id, "label_id": label_id} for label_id in ids.values()]
+        )
+    return ids
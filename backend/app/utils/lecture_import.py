@@ -0,0 +1,306 @@
+import asyncio
+import json
+import zipfile
+from datetime import date
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import config
+from ..database import get_async_connection
+from .blob_reaper import blob_reaper
+from .blob_store import blob_store
+from .documents import add_document_references, find_documents
+from .embeddings import queue_embeddings
+from .labels import label_cache, unique_labels, upsert_labels
+from .search import search_service
+from .text_extraction import ExtractedText, extract_document, is_pdf, is_plain_text
+
+# Manifest file looked up at the root of an imported zip
+MANIFEST_NAME = "manifest.json"
+
+# Manifest keys naming each lecture's files: (file_type, content type, type check)
+FILE_SLOTS = (
+    ("pdf", "application/pdf", is_pdf),
+    ("transcript", "text/plain", is_plain_text),
+)
+
+
+class ManifestError(ValueError):
+    """The import as a whole cannot be processed (bad manifest, archive or size)."""
+
+
+class ImportSources:
+    """
+    The files of one import by name, from a zip archive or a multipart batch.
+    Each opener returns a new file object for the caller to close; ``close``
+    releases the archive once the import is done.
+    """
+
+    def __init__(self, openers: Dict[str, Callable[[], BinaryIO]], sizes: Dict[str, int],
+                 manifest: Optional[bytes] = None, archive: Optional[zipfile.ZipFile] = None):
+        self.openers = openers
+        self.sizes = sizes
+        self.manifest = manifest
+        self.archive = archive
+
+    @classmethod
+    def from_zip(cls, archive: BinaryIO) -> "ImportSources":
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile as e:
+            raise ManifestError(f"Invalid zip archive: {e}")
+        try:
+            members = {info.filename: info for info in zf.infolist() if not info.is_dir()}
+            manifest = None
+            if MANIFEST_NAME in members:
+                manifest = zf.read(members.pop(MANIFEST_NAME))
+        except Exception:
+            zf.close()
+            raise
+        return cls(
+            {name: (lambda info=info: zf.open(info)) for name, info in members.items()},
+            {name: info.file_size for name, info in members.items()},
+            manifest,
+            zf,
+        )
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+    @classmethod
+    def from_uploads(cls, uploads: List[UploadFile]) -> "ImportSources":
+        openers, sizes = {}, {}
+        for upload in uploads:
+            upload.file.seek(0, 2)
+            sizes[upload.filename] = upload.file.tell()
+            openers[upload.filename] = lambda upload=upload: upload.file
+        return cls(openers, sizes)
+
+
+class ImportItem:
+    """One manifest entry and what became of it."""
+
+    __slots__ = ("index", "lecture_title", "lecture_date", "labels", "files", "stored", "lecture_id", "error")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.lecture_title = None
+        self.lecture_date = None
+        self.labels: List[str] = []
+        # (file_type, name, content type) from the manifest
+        self.files: List[Tuple[str, str, str]] = []
+        # (file_type, sha256, byte_size) once stored
+        self.stored: List[Tuple[str, str, int]] = []
+        self.lecture_id: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        if self.lecture_id is not None:
+            return "created"
+        return "failed" if self.error else "pending"
+
+    def load(self, entry):
+        if not isinstance(entry, dict):
+            raise ValueError("Manifest entry must be an object")
+        self.lecture_title = str(entry.get("title") or "").strip()
+        if not self.lecture_title:
+            raise ValueError("Missing title")
+        try:
+            self.lecture_date = date.fromisoformat(str(entry.get("date")))
+        except ValueError:
+            raise ValueError(f"Invalid date {entry.get('date')!r}, expected YYYY-MM-DD")
+        labels = entry.get("labels") or []
+        self.labels = unique_labels(labels.split(",") if isinstance(labels, str) else map(str, labels))
+        for file_type, content_type, accepts in FILE_SLOTS:
+            name = entry.get(file_type)
+            if not name:
+                continue
+            if not accepts(name, None):
+                raise ValueError(f"Invalid {file_type} file type: {name}")
+            self.files.append((file_type, name, content_type))
+
+
+def parse_manifest(data) -> List[ImportItem]:
+    """
+    Items of a manifest: a JSON list (or ``{"lectures": [...]}``) of
+    ``{"title", "date", "labels", "pdf", "transcript"}`` objects, the last
+    two naming files of the import. A bad entry fails only its own item.
+    """
+    try:
+        entries = json.loads(data)
+    except ValueError as e:
+        raise ManifestError(f"Manifest is not valid JSON: {e}")
+    if isinstance(entries, dict):
+        entries = entries.get("lectures")
+    if not isinstance(entries, list) or not entries:
+        raise ManifestError('Manifest must be a non-empty list of lectures or {"lectures": [...]}')
+    if len(entries) > config.IMPORT_MAX_LECTURES:
+        raise ManifestError(f"Manifest lists {len(entries)} lectures, the limit is {config.IMPORT_MAX_LECTURES}")
+
+    items = []
+    for index, entry in enumerate(entries):
+        item = ImportItem(index)
+        try:
+            item.load(entry)
+        except ValueError as e:
+            item.error = str(e)
+        items.append(item)
+    return items
+
+
+def _store_sources(names: List[str], sources: ImportSources) -> Tuple[Dict[str, tuple], Dict[str, str]]:
+    """Put each named file in the blob store: (name -> (sha256, size, created), name -> error)."""
+    stored, errors = {}, {}
+    for name in names:
+        try:
+            with sources.openers[name]() as f:
+                stored[name] = blob_store.put(f)
+        except Exception as e:
+            # e.g. a corrupt zip member; only the lectures using it fail
+            errors[name] = f"Failed to read {name}: {str(e)}"
+    return stored, errors
+
+
+async def _extract_new(
+    items: List[ImportItem], known: Dict[str, int]
+) -> Tuple[Dict[str, ExtractedText], Dict[str, str]]:
+    """Extract every document not stored before, IMPORT_EXTRACT_CONCURRENCY at a time."""
+    content_types = {}
+    for item in items:
+        for (file_type, sha256, _), (_, _, content_type) in zip(item.stored, item.files):
+            if sha256 not in known:
+                content_types[sha256] = content_type
+    limit = asyncio.Semaphore(config.IMPORT_EXTRACT_CONCURRENCY)
+    texts, errors = {}, {}
+
+    async def extract(sha256, content_type):
+        async with limit:
+            try:
+                texts[sha256] = await extract_document(blob_store.path(sha256), content_type=content_type)
+            except Exception as e:
+                errors[sha256] = f"Failed to extract text: {str(e)}"
+
+    await asyncio.gather(*(extract(sha, content_type) for sha, content_type in content_types.items()))
+    return texts, errors
+
+
+async def _insert_batch(class_id: int, batch: List[ImportItem], texts: Dict[str, ExtractedText]):
+    """Insert the lectures, files and labels of ``batch`` in one transaction, with array DML."""
+    references = {}
+    for item in batch:
+        for _, sha256, byte_size in item.stored:
+            _, extracted, count = references.get(sha256, (byte_size, texts.get(sha256), 0))
+            references[sha256] = (byte_size, extracted, count + 1)
+
+    async with get_async_connection() as conn:
+        cursor = conn.cursor()
+
+        lecture_ids = cursor.var(int, arraysize=len(batch))
+        cursor.setinputsizes(lecture_id=lecture_ids)
+        await cursor.executemany("""
+            INSERT INTO lectures (class_id, lecture_title, lecture_date)
+            VALUES (:class_id, :lecture_title, :lecture_date)
+            RETURNING id INTO :lecture_id
+        """, [
+            {"class_id": class_id, "lecture_title": item.lecture_title, "lecture_date": item.lecture_date}
+            for item in batch
+        ])
+        ids = [lecture_ids.getvalue(pos)[0] for pos in range(len(batch))]
+
+        document_ids = await add_document_references(cursor, references) if references else {}
+        files = [
+            {"lecture_id": lecture_id, "file_type": file_type, "document_id": document_ids[sha256]}
+            for item, lecture_id in zip(batch, ids)
+            for file_type, sha256, _ in item.stored
+        ]
+        if files:
+            await cursor.executemany("""
+                INSERT INTO lecture_files (lecture_id, file_type, document_id)
+                VALUES (:lecture_id, :file_type, :document_id)
+            """, files)
+
+        label_ids = await upsert_labels(cursor, [name for item in batch for name in item.labels])
+        links = [
+            {"lecture_id": lecture_id, "label_id": label_ids[name]}
+            for item, lecture_id in zip(batch, ids)
+            for name in item.labels
+        ]
+        if links:
+            await cursor.executemany(
+                "INSERT INTO lecture_labels (lecture_id, label_id) VALUES (:lecture_id, :label_id)", links
+            )
+
+        await conn.commit()
+
+    label_cache.put_many(label_ids)
+    for item, lecture_id in zip(batch, ids):
+        item.lecture_id = lecture_id
+
+
+async def import_lectures(class_id: int, items: List[ImportItem], sources: ImportSources) -> List[ImportItem]:
+    """
+    Create the manifest's lectures in ``class_id``. Files are stored and new
+    ones extracted in parallel up front; lectures are then inserted
+    IMPORT_BATCH_SIZE per transaction. Each item ends up "created" or
+    "failed" with its error; a failed batch fails only its own items.
+    """
+    for item in items:
+        missing = [name for _, name, _ in item.files if name not in sources.openers]
+        if not item.error and missing:
+            item.error = f"File not found in the import: {', '.join(missing)}"
+    ready = [item for item in items if not item.error]
+
+    names = list(dict.fromkeys(name for item in ready for _, name, _ in item.files))
+    total = sum(sources.sizes[name] for name in names)
+    if total > config.IMPORT_MAX_BYTES:
+        raise ManifestError(f"Import holds {total} bytes of files, the limit is {config.IMPORT_MAX_BYTES}")
+
+    stored, store_errors = await run_in_threadpool(_store_sources, names, sources)
+    created_blobs = {sha for sha, _, created in stored.values() if created}
+    for item in ready:
+        errors = [store_errors[name] for _, name, _ in item.files if name in store_errors]
+        if errors:
+            item.error = "; ".join(errors)
+            continue
+        item.stored = [(file_type, *stored[name][:2]) for file_type, name, _ in item.files]
+    ready = [item for item in ready if not item.error]
+
+    try:
+        known = {}
+        hashes = {sha for item in ready for _, sha, _ in item.stored}
+        if hashes:
+            async with get_async_connection() as conn:
+                known = await find_documents(conn.cursor(), hashes)
+        texts, extract_errors = await _extract_new(ready, known)
+        for item in ready:
+            errors = [extract_errors[sha] for _, sha, _ in item.stored if sha in extract_errors]
+            if errors:
+                item.error = "; ".join(errors)
+        ready = [item for item in ready if not item.error]
+
+        for start in range(0, len(ready), config.IMPORT_BATCH_SIZE):
+            batch = ready[start:start + config.IMPORT_BATCH_SIZE]
+            try:
+                await _insert_batch(class_id, batch, texts)
+            except Exception as e:
+                for item in batch:
+                    item.error = f"Failed to import lecture: {str(e)}"
+    finally:
+        # Blobs this import added that no committed lecture ended up using. The
+        # reaper re-checks documents first, so a blob a concurrent upload of
+        # the same content committed meanwhile stays.
+        referenced = {sha for item in items if item.lecture_id is not None for _, sha, _ in item.stored}
+        blob_reaper.reap(created_blobs - referenced)
+
+    created = [item.lecture_id for item in items if item.lecture_id is not None]
+    if created:
+        search_service.lectures_changed(created)
+        # Deferred: the digest module pulls in the OCI client
+        from .digests import queue_lecture_digests
+        queue_lecture_digests(created)
+        queue_embeddings()
+    return items
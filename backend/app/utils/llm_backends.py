@@ -0,0 +1,457 @@
+import hashlib
+import random
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from ..config import config
+
+
+# Statuses worth retrying: timeouts, throttling and server-side failures
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMServiceError(Exception):
+    """A failed model call, with the HTTP status the service answered (or would have)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class CircuitOpenError(LLMServiceError):
+    """Raised without calling the service while the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(503, f"LLM service unavailable, not retrying for another {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+class LLMBackend:
+    """
+    What oracle_ai needs from a model provider: chat completions and
+    embeddings. Caching, prompt building and job handling stay in the
+    callers, so every backend is exercised through the same paths.
+    """
+
+    name = "base"
+
+    def chat(self, prompt: str, params: dict, model_id: str) -> dict:
+        """Response of one chat request, with at least a "text" field."""
+        raise NotImplementedError
+
+    def chat_stream(self, prompt: str, params: dict, model_id: str) -> Iterator[str]:
+        """
+        The response text of one chat request, piece by piece as it is
+        generated. Backends that cannot stream yield it whole.
+        """
+        yield self.chat(prompt, params, model_id).get("text", "")
+
+    def embed(self, texts: List[str], input_type: str, model_id: str) -> List[List[float]]:
+        """One vector per text, in order."""
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether ``error`` says the service is struggling, rather than that the request is bad."""
+        return isinstance(error, LLMServiceError) and error.status in RETRYABLE_STATUSES
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in for load tests and development. Every call sleeps
+    ``latency`` seconds give or take up to ``jitter``, then fails with
+    probability ``error_rate`` (a 429 or a 503, like a throttled or
+    overloaded service) or answers with text derived from the prompt, so
+    equal prompts get equal responses. The text is generated at
+    ``tokens_per_second`` words a second after that wait; streamed
+    responses yield the words as they are generated.
+    Embeddings are deterministic bag-of-words vectors: texts sharing words
+    come out close.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 dimensions: int = 384, tokens_per_second: float = 100.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dimensions = dimensions
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0)
+            failed = self._random.random() < self.error_rate
+            status = self._random.choice((429, 503))
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if failed:
+            with self._lock:
+                self.errors += 1
+            raise LLMServiceError(status, "Fake backend error")
+
+    def _text(self, prompt: str, params: dict) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [word for word in prompt.split() if word.isalpha()] or ["nothing"]
+        picker = random.Random(digest)
+        length = min(int(params.get("max_tokens", 600) * 0.75), 400)
+        body = " ".join(picker.choice(words) for _ in range(max(length - 12, 1)))
+        return f"Fake analysis of a {len(prompt)}-character prompt ({digest[:12]}): {body}"
+
+    def chat(self, prompt: str, params: dict, model_id: str) -> dict:
+        self._call()
+        text = self._text(prompt, params)
+        # As long as streaming the same text would take
+        time.sleep(text.count(" ") / self.tokens_per_second)
+        return {"text": text}
+
+    def chat_stream(self, prompt: str, params: dict, model_id: str) -> Iterator[str]:
+        self._call()
+        for n, word in enumerate(self._text(prompt, params).split(" ")):
+            if n:
+                time.sleep(1 / self.tokens_per_second)
+            yield word if n == 0 else " " + word
+
+    def embed(self, texts: List[str], input_type: str, model_id: str) -> List[List[float]]:
+        self._call()
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for word in text.lower().split():
+                slot = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                vector[slot % self.dimensions] += 1.0
+            vectors.append(vector)
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "latency": self.latency,
+                "jitter": self.jitter,
+                "error_rate": self.error_rate,
+                "tokens_per_second": self.tokens_per_second,
+                "calls": self.calls,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service. After ``failure_threshold`` failures in
+    a row the circuit opens and every call fails fast with CircuitOpenError.
+    ``reset_timeout`` seconds later one trial call is let through (half
+    open): success closes the circuit, failure opens it again. Only the
+    trial's outcome moves a half-open circuit; calls let through while it
+    was closed that finish after it opened are not counted.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_running = False
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be refused now. Cheap; claims nothing."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if (self.state == self.OPEN and retry_in > 0) or (self.state == self.HALF_OPEN and self._trial_running):
+                self.rejected += 1
+            else:
+                return
+        raise CircuitOpenError(max(retry_in, 0))
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless this call may go through now. Returns
+        True if it goes through as the half-open trial; pass that on to
+        record() or abandon().
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+        raise CircuitOpenError(max(retry_in, 0))
+
+    def record(self, healthy: bool, trial: bool):
+        """Outcome of a call let through: ``healthy`` unless the service failed it."""
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            elif self.state != self.CLOSED:
+                # Started before the circuit opened; the trial decides from here
+                return
+            if healthy:
+                self.state = self.CLOSED
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if trial or self.consecutive_failures >= self.failure_threshold:
+                self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def abandon(self, trial: bool):
+        """A call given up without an outcome (e.g. closed by its consumer); the next one may be the trial."""
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class ResilientBackend(LLMBackend):
+    """
+    Wraps a backend with the process-wide limits every LLM call goes
+    through:
+
+    - at most ``max_in_flight`` calls at once; callers queue for a slot for
+      up to ``queue_timeout`` seconds, and the queue depth is reported;
+    - retryable failures are retried up to ``max_retries`` times after a
+      jittered exponential backoff (a random wait of up to
+      ``backoff_base * 2**attempt`` seconds, capped at ``backoff_max``),
+      without holding a slot while waiting;
+    - a circuit breaker fails calls fast while the service keeps failing.
+    """
+
+    def __init__(self, backend: LLMBackend, max_in_flight: int, max_retries: int, backoff_base: float,
+                 backoff_max: float, queue_timeout: float, breaker: CircuitBreaker):
+        self.backend = backend
+        self.name = backend.name
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.queue_timeouts = 0
+
+    def _acquire(self):
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.queue_timeouts += 1
+            raise LLMServiceError(503, f"No LLM call slot free within {self.queue_timeout:.0f} s")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _call(self, fn, *args):
+        attempt = 0
+        while True:
+            # Fail fast rather than queue while the circuit is open; check again
+            # with a slot, since it may have opened while this call waited
+            self.breaker.check()
+            self._acquire()
+            try:
+                trial = self.breaker.before_call()
+            except CircuitOpenError:
+                self._release()
+                raise
+            try:
+                with self._lock:
+                    self.calls += 1
+                result = fn(*args)
+            except Exception as e:
+                retryable = self.backend.is_retryable(e)
+                self.breaker.record(not retryable, trial)
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            else:
+                self.breaker.record(True, trial)
+                return result
+            finally:
+                self._release()
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            attempt += 1
+
+    def chat(self, prompt: str, params: dict, model_id: str) -> dict:
+        return self._call(self.backend.chat, prompt, params, model_id)
+
+    def chat_stream(self, prompt: str, params: dict, model_id: str) -> Iterator[str]:
+        """
+        Like chat(), but the slot is held until the stream ends or is closed.
+        Only failures before the first piece are retried; later ones reach
+        the caller, who has already passed earlier pieces on.
+        """
+        attempt = 0
+        while True:
+            self.breaker.check()
+            self._acquire()
+            try:
+                trial = self.breaker.before_call()
+            except CircuitOpenError:
+                self._release()
+                raise
+            started = False
+            try:
+                with self._lock:
+                    self.calls += 1
+                for piece in self.backend.chat_stream(prompt, params, model_id):
+                    started = True
+                    yield piece
+            except GeneratorExit:
+                # Closed by the consumer (e.g. the browser went away). Pieces
+                # arrived, so the service was fine; before the first one
+                # nothing is known about it.
+                if started:
+                    self.breaker.record(True, trial)
+                else:
+                    self.breaker.abandon(trial)
+                raise
+            except Exception as e:
+                retryable = self.backend.is_retryable(e)
+                self.breaker.record(not retryable, trial)
+                if started or not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            else:
+                self.breaker.record(True, trial)
+                return
+            finally:
+                self._release()
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            attempt += 1
+
+    def embed(self, texts: List[str], input_type: str, model_id: str) -> List[List[float]]:
+        return self._call(self.backend.embed, texts, input_type, model_id)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return self.backend.is_retryable(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "backend": self.name,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "queue_timeouts": self.queue_timeouts,
+            }
+        stats["breaker"] = self.breaker.stats()
+        stats["inner"] = self.backend.stats()
+        return stats
+
+
+def resilient(backend: LLMBackend) -> ResilientBackend:
+    """``backend`` behind the LLM_* concurrency, retry and circuit breaker settings."""
+    return ResilientBackend(
+        backend,
+        max_in_flight=config.LLM_MAX_IN_FLIGHT,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=config.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=config.LLM_BACKOFF_MAX_SECONDS,
+        queue_timeout=config.LLM_QUEUE_TIMEOUT_SECONDS,
+        breaker=CircuitBreaker(config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_SECONDS),
+    )
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str) -> LLMBackend:
+    if name == "oci":
+        # Deferred: the OCI SDK is only needed when it is the backend
+        from .oracle_ai import OCIBackend
+        return OCIBackend()
+    if name == "fake":
+        return FakeBackend(
+            latency=config.LLM_FAKE_LATENCY_SECONDS,
+            jitter=config.LLM_FAKE_JITTER_SECONDS,
+            error_rate=config.LLM_FAKE_ERROR_RATE,
+            dimensions=config.LLM_FAKE_DIMENSIONS,
+            tokens_per_second=config.LLM_FAKE_TOKENS_PER_SECOND,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {name!r}, expected 'oci' or 'fake'")
+
+
+def get_llm_backend() -> LLMBackend:
+    """The process's backend, created on first use from LLM_BACKEND, behind the shared limits."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = resilient(create_backend(config.LLM_BACKEND))
+    return _backend
+
+
+def set_llm_backend(backend: Optional[LLMBackend], wrap: bool = True):
+    """
+    Swap the backend (benchmarks, tests), behind fresh shared limits unless
+    ``wrap`` is False. None goes back to LLM_BACKEND on next use.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = resilient(backend) if backend is not None and wrap else backend
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Optional
+
+from ..config import config
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form of a prompt for hashing: NFC, LF line endings, no trailing whitespace."""
+    prompt = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in prompt.split("\n")).strip()
+
+
+def cache_key(prompt: str, model_id: str, params: dict) -> str:
+    """SHA-256 over the normalized prompt plus everything else that shapes the response."""
+    material = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model_id": model_id, "params": params},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent LLM response cache in a local SQLite file.
+
+    Entries expire after ``ttl`` seconds; once more than ``max_entries`` are
+    stored the least recently used ones are evicted. SQLite handles locking, so
+    every thread and uvicorn worker on the host shares the same file.
+    Hit/miss counters are per process.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._initialized = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _connect(self):
+        if not self._initialized and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+                conn.commit()
+                self._initialized = True
+        return conn
+
+    def get(self, key: str, count: bool = True) -> Optional[Any]:
+        """Cached response for ``key``, or None. ``count=False`` leaves the hit/miss counters alone."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now - self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                if count:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+            if count:
+                self.hits += 1
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Like get(), but does not count towards the hit/miss metrics."""
+        return self.get(key, count=False)
+
+    def put(self, key: str, response: Any):
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now),
+            )
+            # Drop expired entries, then the least recently used beyond the size bound
+            evicted = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+            evicted += conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            conn.commit()
+            self.stores += 1
+            self.evictions += evicted
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        entries = 0
+        if self.enabled:
+            conn = self._connect()
+            try:
+                entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            finally:
+                conn.close()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+llm_cache = LLMCache(
+    config.LLM_CACHE_PATH,
+    ttl=config.LLM_CACHE_TTL_SECONDS,
+    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+    enabled=config.LLM_CACHE_ENABLED,
+)
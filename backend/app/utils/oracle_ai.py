@@ -1,67 +1,255 @@
-import oci
+import json
 import os
+import threading
+from typing import Iterator, List, Optional
+
+from ..config import config as app_config
+from .llm_backends import RETRYABLE_STATUSES, LLMBackend, get_llm_backend
+from .llm_cache import cache_key, llm_cache
+from .prompt_builder import split_chunks, truncate_to_tokens
 
 CONFIG_PROFILE = os.environ.get("OCI_CONFIG_PROFILE", "DEFAULT")
 CONFIG_PATH = os.environ.get("OCI_CONFIG_PATH", os.path.expanduser("~/.oci/config"))
 ENDPOINT = os.environ.get("OCI_AI_ENDPOINT", "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com")
 COMPARTMENT_ID = os.environ.get("OCI_COMPARTMENT_ID", "ocid1.tenancy.oc1..aaaaaaaawu6hkvowbuskgisv3ohg4d4qzr56zditstxhadzf7rexeeuaolba")
 MODEL_ID = os.environ.get("OCI_MODEL_ID", "cohere.embed-english-light-v3.0")
+EMBED_MODEL_ID = os.environ.get("OCI_EMBED_MODEL_ID", MODEL_ID)
+
+# Most inputs the Cohere embed models accept in one request
+EMBED_MAX_INPUTS = 96
+
+# A stand-in backend's responses and vectors are cached and stored apart from the real model's
+if app_config.LLM_BACKEND != "oci":
+    MODEL_ID = f"{app_config.LLM_BACKEND}:{MODEL_ID}"
+    EMBED_MODEL_ID = f"{app_config.LLM_BACKEND}:{EMBED_MODEL_ID}"
+
+# Sampling parameters for analysis chat requests; part of the response cache key
+CHAT_PARAMS = {
+    "max_tokens": 600,
+    "temperature": 1,
+    "frequency_penalty": 0,
+    "top_p": 0.75,
+    "top_k": 0,
+    "seed": 0,
+    "safety_mode": "CONTEXTUAL",
+}
+
+# Chunk summaries for map-reduce prompt building: short and deterministic
+SUMMARY_PARAMS = {**CHAT_PARAMS, "max_tokens": 400, "temperature": 0}
+
+SUMMARY_PROMPT = (
+    "Summarize the following lecture material for a teaching assistant. Keep every "
+    "section title, key concept, definition and worked example it covers, in order. "
+    "Use short bullet points.\n\n{text}"
+)
 
-config = oci.config.from_file(CONFIG_PATH, CONFIG_PROFILE)
-generative_ai_inference_client = oci.generative_ai_inference.GenerativeAiInferenceClient(
-    config=config,
-    service_endpoint=ENDPOINT,
-    retry_strategy=oci.retry.NoneRetryStrategy(),
-    timeout=(10, 240)
+# Per-lecture digests, computed once after upload and reused by every analysis
+DIGEST_PARAMS = {**CHAT_PARAMS, "max_tokens": 500, "temperature": 0}
+
+DIGEST_PROMPT = (
+    "Write a compact digest of the lecture \"{title}\" for a teaching assistant "
+    "who will later compare it against quiz results. List, in order:\n"
+    "- Section titles, exactly as they appear\n"
+    "- Key concepts and definitions\n"
+    "- Worked examples and exercises covered\n"
+    "Use short bullet points and nothing else.\n\n{text}"
 )
 
-def run_class_analysis(prompt: str) -> str:
-    # Use CohereChatRequest and ChatDetails for LLM chat, matching model.py
-    chat_detail = oci.generative_ai_inference.models.ChatDetails()
-    chat_request = oci.generative_ai_inference.models.CohereChatRequest()
-    chat_request.message = prompt
-    chat_request.max_tokens = 600
-    chat_request.temperature = 1
-    chat_request.frequency_penalty = 0
-    chat_request.top_p = 0.75
-    chat_request.top_k = 0
-    chat_request.seed = 0
-    chat_request.safety_mode = "CONTEXTUAL"
-    chat_detail.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=MODEL_ID)
-    chat_detail.chat_request = chat_request
-    chat_detail.compartment_id = COMPARTMENT_ID
+def analysis_cache_key(prompt: str) -> str:
+    return cache_key(prompt, MODEL_ID, CHAT_PARAMS)
+
+def get_cached_class_analysis(prompt: str):
+    """Return the cached response for this prompt and model settings, or None."""
+    return llm_cache.get(analysis_cache_key(prompt))
+
+def run_chat(prompt: str, params: dict, check_cache: bool = True):
+    """
+    Run a chat request, answering from the response cache when the same prompt
+    and model settings were seen before. The response is cached either way.
+    Pass ``check_cache=False`` when the caller already looked the prompt up.
+    """
+    key = cache_key(prompt, MODEL_ID, params)
+    if check_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+    response = _chat(prompt, params)
+    llm_cache.put(key, response)
+    return response
+
+def run_class_analysis(prompt: str, check_cache: bool = True):
+    return run_chat(prompt, CHAT_PARAMS, check_cache=check_cache)
+
+def stream_chat(prompt: str, params: dict, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    """
+    The response text of a chat request, piece by piece as the model
+    generates it. Does not consult the response cache; once the stream is
+    complete the whole response is cached, as run_chat would. Once ``cancel``
+    is set the stream stops at the next piece, closing the backend stream
+    (which frees its LLM call slot) in the thread that is iterating, and
+    nothing is cached.
+    """
+    pieces = []
+    stream = get_llm_backend().chat_stream(prompt, params, MODEL_ID)
     try:
-        chat_response = generative_ai_inference_client.chat(chat_detail)
-        print("[DEBUG] Oracle AI chat_response type:", type(chat_response))
-        print("[DEBUG] Oracle AI chat_response:", chat_response)
-        if hasattr(chat_response, "data"):
-            data = chat_response.data
-            print("[DEBUG] Oracle AI chat_response.data type:", type(data))
-            print("[DEBUG] Oracle AI chat_response.data:", data)
-            # If the data object has a 'chat_response' attribute (dict), extract it
-            if hasattr(data, "chat_response") and data.chat_response:
-                # If it's a dict-like object, convert to dict
-                chat_response_obj = data.chat_response
-                # If it's not a dict, try to convert
-                if not isinstance(chat_response_obj, dict):
-                    try:
-                        import json
-                        chat_response_obj = json.loads(str(chat_response_obj))
-                    except Exception:
-                        pass
-                # Add the 'text' field if present at the top level
+        for piece in stream:
+            pieces.append(piece)
+            yield piece
+            if cancel is not None and cancel.is_set():
+                return
+    finally:
+        stream.close()
+    llm_cache.put(cache_key(prompt, MODEL_ID, params), {"text": "".join(pieces)})
+
+def stream_class_analysis(prompt: str, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    return stream_chat(prompt, CHAT_PARAMS, cancel)
+
+def response_text(response) -> str:
+    """Plain text of a chat response as returned by _chat."""
+    if isinstance(response, dict):
+        return response.get("text") or response.get("raw") or str(response)
+    return str(response)
+
+def summarize_chunk(text: str) -> str:
+    """Condense one chunk of lecture material (map step of prompt building)."""
+    return response_text(run_chat(SUMMARY_PROMPT.format(text=text), SUMMARY_PARAMS))
+
+def cached_chunk_summary(text: str):
+    """The cached summary of a chunk, or None. Never calls the LLM."""
+    response = llm_cache.peek(cache_key(SUMMARY_PROMPT.format(text=text), MODEL_ID, SUMMARY_PARAMS))
+    return None if response is None else response_text(response)
+
+def digest_lecture(title: str, text: str) -> str:
+    """
+    Digest of one lecture's material. Text longer than the analysis budget is
+    condensed chunk by chunk first, so the digest prompt stays bounded.
+    """
+    chunks = split_chunks(text, app_config.ANALYSIS_CHUNK_TOKENS)
+    if len(chunks) > 1:
+        text = truncate_to_tokens(
+            "\n\n".join(summarize_chunk(chunk) for chunk in chunks), app_config.ANALYSIS_TOKEN_BUDGET
+        )
+    return response_text(run_chat(DIGEST_PROMPT.format(title=title, text=text), DIGEST_PARAMS))
+
+def embed_texts(texts: List[str], input_type: str = "SEARCH_DOCUMENT") -> List[List[float]]:
+    """
+    Embed up to EMBED_MAX_INPUTS texts in one request. ``input_type`` is
+    SEARCH_DOCUMENT for stored material and SEARCH_QUERY for lookups.
+    """
+    if len(texts) > EMBED_MAX_INPUTS:
+        raise ValueError(f"At most {EMBED_MAX_INPUTS} texts per embed request, got {len(texts)}")
+    return get_llm_backend().embed(texts, input_type, EMBED_MODEL_ID)
+
+def _chat(prompt: str, params: dict = CHAT_PARAMS):
+    return get_llm_backend().chat(prompt, params, MODEL_ID)
+
+class OCIBackend(LLMBackend):
+    """
+    OCI Generative AI. The SDK is imported and the client created on the
+    first call, from the config at CONFIG_PATH, so importing the app stays cheap.
+    """
+
+    name = "oci"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import oci
+                    self._client = oci.generative_ai_inference.GenerativeAiInferenceClient(
+                        config=oci.config.from_file(CONFIG_PATH, CONFIG_PROFILE),
+                        service_endpoint=ENDPOINT,
+                        # Retries happen in ResilientBackend, which also limits and breaks calls
+                        retry_strategy=oci.retry.NoneRetryStrategy(),
+                        timeout=(app_config.LLM_CONNECT_TIMEOUT_SECONDS, app_config.LLM_READ_TIMEOUT_SECONDS)
+                    )
+        return self._client
+
+    def is_retryable(self, error: Exception) -> bool:
+        import oci
+        if isinstance(error, oci.exceptions.ServiceError):
+            return error.status in RETRYABLE_STATUSES
+        # The client raises these for connection failures and timeouts
+        return isinstance(error, (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout))
+
+    def embed(self, texts: List[str], input_type: str, model_id: str) -> List[List[float]]:
+        import oci
+        embed_detail = oci.generative_ai_inference.models.EmbedTextDetails(
+            inputs=texts,
+            serving_mode=oci.generative_ai_inference.models.OnDemandServingMode(model_id=model_id),
+            compartment_id=COMPARTMENT_ID,
+            input_type=input_type,
+            truncate="END",
+        )
+        return self.client.embed_text(embed_detail).data.embeddings
+
+    def _chat_details(self, prompt: str, params: dict, model_id: str, stream: bool = False):
+        import oci
+        # Use CohereChatRequest and ChatDetails for LLM chat, matching model.py
+        chat_detail = oci.generative_ai_inference.models.ChatDetails()
+        chat_request = oci.generative_ai_inference.models.CohereChatRequest()
+        chat_request.message = prompt
+        for name, value in params.items():
+            setattr(chat_request, name, value)
+        chat_request.is_stream = stream
+        chat_detail.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=model_id)
+        chat_detail.chat_request = chat_request
+        chat_detail.compartment_id = COMPARTMENT_ID
+        return chat_detail
+
+    def chat_stream(self, prompt: str, params: dict, model_id: str) -> Iterator[str]:
+        # With is_stream the response data is a server-sent event stream: one
+        # event per generated piece of text, then a final event carrying the
+        # finish reason (and the whole text again, which is not yielded)
+        events = self.client.chat(self._chat_details(prompt, params, model_id, stream=True)).data
+        try:
+            for event in events.events():
+                payload = json.loads(event.data)
+                if "finishReason" in payload:
+                    return
+                if payload.get("text"):
+                    yield payload["text"]
+        finally:
+            events.close()
+
+    def chat(self, prompt: str, params: dict, model_id: str) -> dict:
+        chat_detail = self._chat_details(prompt, params, model_id)
+        try:
+            chat_response = self.client.chat(chat_detail)
+            print("[DEBUG] Oracle AI chat_response type:", type(chat_response))
+            print("[DEBUG] Oracle AI chat_response:", chat_response)
+            if hasattr(chat_response, "data"):
+                data = chat_response.data
+                print("[DEBUG] Oracle AI chat_response.data type:", type(data))
+                print("[DEBUG] Oracle AI chat_response.data:", data)
+                # If the data object has a 'chat_response' attribute (dict), extract it
+                if hasattr(data, "chat_response") and data.chat_response:
+                    # If it's a dict-like object, convert to dict
+                    chat_response_obj = data.chat_response
+                    # If it's not a dict, try to convert
+                    if not isinstance(chat_response_obj, dict):
+                        try:
+                            chat_response_obj = json.loads(str(chat_response_obj))
+                        except Exception:
+                            pass
+                    # Add the 'text' field if present at the top level
+                    if hasattr(data, "text") and data.text:
+                        chat_response_obj["text"] = data.text
+                    return chat_response_obj
+                # Fallback: just return the text field if present
                 if hasattr(data, "text") and data.text:
-                    chat_response_obj["text"] = data.text
-                return chat_response_obj
-            # Fallback: just return the text field if present
-            if hasattr(data, "text") and data.text:
-                return {"text": data.text}
-            # Fallback: return the whole data object as string
-            return {"raw": str(data)}
-        else:
-            raise RuntimeError("Oracle AI chat response is None or missing 'data' attribute.")
-    except Exception as e:
-        import traceback
-        print("[DEBUG] Exception in run_class_analysis:")
-        print(traceback.format_exc())
-        raise
+                    return {"text": data.text}
+                # Fallback: return the whole data object as string
+                return {"raw": str(data)}
+            else:
+                raise RuntimeError("Oracle AI chat response is None or missing 'data' attribute.")
+        except Exception as e:
+            import traceback
+            print("[DEBUG] Exception in run_class_analysis:")
+            print(traceback.format_exc())
+            raise
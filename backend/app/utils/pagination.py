@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+# Upper bound for the ``limit`` query parameter on list endpoints
+MAX_PAGE_SIZE = 200
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode the (created_at, id) keyset position of the last row on a page."""
+    raw = json.dumps({"c": created_at.isoformat(), "i": row_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_sql(after: Optional[str], alias: str = "") -> Tuple[str, dict]:
+    """
+    Return an ``AND ...`` predicate and its binds selecting the rows that come
+    after ``after`` in ``ORDER BY created_at DESC, id DESC`` order.
+    """
+    if not after:
+        return "", {}
+    created_at, row_id = decode_cursor(after)
+    prefix = f"{alias}." if alias else ""
+    sql = (
+        f" AND ({prefix}created_at < :cursor_created_at"
+        f" OR ({prefix}created_at = :cursor_created_at AND {prefix}id < :cursor_id))"
+    )
+    return sql, {"cursor_created_at": created_at, "cursor_id": row_id}
+
+
+def limit_sql(limit: Optional[int]) -> Tuple[str, dict]:
+    """
+    Return a row-limiting clause that fetches one extra row, so the caller can
+    tell whether another page exists without a COUNT query.
+    """
+    if limit is None:
+        return "", {}
+    return " FETCH FIRST :page_limit ROWS ONLY", {"page_limit": limit + 1}
+
+
+def split_page(rows: list, limit: Optional[int], response: Response, key) -> list:
+    """
+    Trim the look-ahead row from ``rows`` and, if there is a next page, set the
+    ``X-Next-Cursor`` header from ``key(last_row)`` -> (created_at, id).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from ..config import config
+
+# Rough size of a token in English prose; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Give up summarizing after this many map rounds and truncate instead
+MAX_MAP_ROUNDS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    return text[:max(tokens, 0) * CHARS_PER_TOKEN]
+
+
+def split_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Split ``text`` into pieces of at most ``max_tokens``, preferring paragraph
+    and line boundaries over cutting mid-sentence.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text.strip():
+        chunks.append(text)
+    return chunks
+
+
+def render_analysis_prompt(lecture_text: str, quiz_content: str, quiz_results_text: str) -> str:
+    return (
+        "You are an AI teaching assistant analyzing a university course.\n\n"
+
+        "Below are lecture transcripts and slide content:\n"
+        f"{lecture_text}\n\n"
+
+        "Below are quiz questions:\n"
+        f"{quiz_content}\n\n"
+
+        "Below are quiz performance results:\n"
+        f"{quiz_results_text}\n\n"
+
+        "Your task:\n"
+        "1. Identify the concepts students are struggling with most based on quiz performance.\n"
+        "2. Cross-reference those weak concepts with the lecture transcripts and slides.\n"
+        "3. Determine where (which lecture topic, section, or example) each concept was originally covered.\n"
+        "4. Infer why students may have misunderstood it (e.g., insufficient examples, rushed explanation, abstract treatment, lack of practice alignment).\n"
+        "5. Suggest specific ways the professor could revisit or improve coverage of each concept.\n\n"
+
+        "Output Requirements:\n"
+        "- Only provide the TOP 3 weakest concepts.\n"
+        "- For each concept, provide:\n"
+        "   - Concept Name\n"
+        "   - Estimated Mastery Score (0-100)\n"
+        "   - Where It Was Covered (cite lecture title or topic if possible)\n"
+        "   - Why Students Struggled\n"
+        "   - How to Revisit / Improve It\n\n"
+
+        "Be concise but specific. Ground your reasoning in the lecture and quiz content provided. List sections titles exaclty as provided."
+    )
+
+
+def build_analysis_prompt(
+    lecture_texts: List[str],
+    quiz_contents: List[str],
+    quiz_results: List[str],
+    summarize: Callable[[str], Optional[str]],
+    budget: int = None,
+    chunk_tokens: int = None,
+    concurrency: int = None,
+) -> Optional[str]:
+    """
+    Build the class analysis prompt within ``budget`` estimated tokens.
+
+    If everything fits, the lecture material goes in verbatim. Otherwise the
+    material is split into chunks that are summarized concurrently with
+    ``summarize`` (map), and the condensed material feeds the final analysis
+    prompt (reduce). Rounds repeat until the material fits, then it is
+    truncated as a last resort. Returns None if ``summarize`` returns None for
+    any chunk, so a cache-only summarizer can probe without calling the LLM.
+    """
+    budget = budget or config.ANALYSIS_TOKEN_BUDGET
+    chunk_tokens = chunk_tokens or config.ANALYSIS_CHUNK_TOKENS
+    concurrency = concurrency or config.ANALYSIS_MAP_CONCURRENCY
+
+    quiz_content = "\n".join(quiz_contents)
+    quiz_results_text = "\n".join(quiz_results)
+    lecture_text = "\n".join(lecture_texts)
+
+    prompt = render_analysis_prompt(lecture_text, quiz_content, quiz_results_text)
+    if estimate_tokens(prompt) <= budget:
+        return prompt
+
+    # Quiz sections are what the analysis is about, so they keep up to half the
+    # budget verbatim; lecture material gets the rest.
+    quiz_budget = budget // 2
+    if estimate_tokens(quiz_content) + estimate_tokens(quiz_results_text) > quiz_budget:
+        quiz_content = truncate_to_tokens(quiz_content, quiz_budget // 2)
+        quiz_results_text = truncate_to_tokens(quiz_results_text, quiz_budget // 2)
+    lecture_budget = budget - estimate_tokens(render_analysis_prompt("", quiz_content, quiz_results_text))
+
+    # First round chunks each lecture on its own so a summary never mixes two
+    # lectures; later rounds condense groups of summaries together.
+    lecture_text = "\n".join(text for text in lecture_texts if text)
+    chunks = [chunk for text in lecture_texts if text for chunk in split_chunks(text, chunk_tokens)]
+    for _ in range(MAX_MAP_ROUNDS):
+        if estimate_tokens(lecture_text) <= lecture_budget:
+            break
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            summaries = list(executor.map(summarize, chunks))
+        if any(summary is None for summary in summaries):
+            return None
+        lecture_text = "\n\n".join(summaries)
+        chunks = split_chunks(lecture_text, chunk_tokens)
+
+    lecture_text = truncate_to_tokens(lecture_text, lecture_budget)
+    return render_analysis_prompt(lecture_text, quiz_content, quiz_results_text)
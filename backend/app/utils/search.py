@@ -0,0 +1,519 @@
+import asyncio
+import heapq
+import math
+import re
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config import config
+from ..database import chunked, get_async_connection, get_connection, in_list_binds
+from .documents import decode_page_offsets, page_at
+from .streaming import iter_batches, tune_cursor
+
+LECTURE = "lecture"
+QUIZ = "quiz"
+
+# Characters of text shown around the first match, and how many of them come before it
+SNIPPET_CHARS = 240
+SNIPPET_LEAD = 80
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+
+# Too common to be worth a posting list
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or so such that the their then
+there these they this to was were will with
+""".split())
+
+# Lecture files and quizzes with their text, for building the local index
+_LECTURE_FILES_SQL = """
+    SELECT lf.id, l.id, l.class_id, l.lecture_title, lf.file_type,
+           COALESCE(lf.pdf_text, d.extracted_text), d.page_offsets
+    FROM lecture_files lf
+    JOIN lectures l ON l.id = lf.lecture_id
+    LEFT JOIN documents d ON d.id = lf.document_id
+"""
+_QUIZZES_SQL = """
+    SELECT q.id, NULL, q.class_id, q.quiz_title, NULL,
+           COALESCE(q.quiz_content, d.extracted_text), d.page_offsets
+    FROM quizzes q
+    LEFT JOIN documents d ON d.id = q.document_id
+"""
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct indexable terms of a query, in order."""
+    return list(dict.fromkeys(
+        token for token in (match.group().lower() for match in _TOKEN.finditer(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ))
+
+
+def tokenize(text: str) -> Tuple[Dict[str, int], Dict[str, int], int]:
+    """Term frequencies, each term's first character offset, and the number of terms of ``text``."""
+    frequencies: Dict[str, int] = {}
+    first: Dict[str, int] = {}
+    length = 0
+    # Matched on the original text so offsets stay valid where lower() changes lengths
+    for match in _TOKEN.finditer(text):
+        token = match.group().lower()
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        length += 1
+        if token in frequencies:
+            frequencies[token] += 1
+        else:
+            frequencies[token] = 1
+            first[token] = match.start()
+    return frequencies, first, length
+
+
+def make_snippet(text: str, position: int, text_start: int = 0) -> str:
+    """
+    About SNIPPET_CHARS characters of ``text`` around ``position``, cut at
+    word boundaries. ``text`` may itself be an excerpt starting at
+    ``text_start`` of the document; ellipses mark cut-off ends.
+    """
+    start = max(position - SNIPPET_LEAD, 0)
+    stop = min(start + SNIPPET_CHARS, len(text))
+    if start > 0:
+        space = text.find(" ", start, position)
+        start = space + 1 if space >= 0 else start
+    if stop < len(text):
+        space = text.rfind(" ", max(position, start), stop)
+        stop = space if space > 0 else stop
+    snippet = " ".join(text[start:stop].split())
+    if start + text_start > 0:
+        snippet = "…" + snippet
+    if stop < len(text):
+        snippet += "…"
+    return snippet
+
+
+class SearchUnavailable(Exception):
+    """Raised when SEARCH_BACKEND is "auto" and the Oracle Text lookup failed, so no backend is chosen yet."""
+
+
+class SearchHit:
+    __slots__ = ("kind", "item_id", "lecture_id", "class_id", "title", "file_type", "page", "score", "snippet")
+
+    def __init__(self, kind, item_id, lecture_id, class_id, title, file_type, page, score, snippet):
+        self.kind = kind
+        self.item_id = item_id
+        self.lecture_id = lecture_id
+        self.class_id = class_id
+        self.title = title
+        self.file_type = file_type
+        self.page = page
+        self.score = score
+        self.snippet = snippet
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "lecture_id": self.lecture_id,
+            "file_id": self.item_id if self.kind == LECTURE else None,
+            "quiz_id": self.item_id if self.kind == QUIZ else None,
+            "class_id": self.class_id,
+            "title": self.title,
+            "file_type": self.file_type,
+            "page": self.page,
+            "score": round(self.score, 4),
+            "snippet": self.snippet,
+        }
+
+
+class _IndexedDocument:
+    __slots__ = ("lecture_id", "class_id", "title", "file_type", "text", "page_offsets", "first", "length")
+
+    def __init__(self, lecture_id, class_id, title, file_type, text, page_offsets, first, length):
+        self.lecture_id = lecture_id
+        self.class_id = class_id
+        self.title = title
+        self.file_type = file_type
+        self.text = text
+        self.page_offsets = page_offsets
+        self.first = first
+        self.length = length
+
+
+class LocalSearchIndex:
+    """
+    In-process inverted index over lecture files and quizzes, ranked with
+    BM25. Documents are keyed by (kind, id) of their lecture_files or
+    quizzes row and can be added, replaced and removed one at a time.
+    Tokenizing happens outside the lock, so queries are not held up by a
+    large document being indexed.
+    """
+
+    def __init__(self):
+        self._documents: Dict[Tuple[str, int], _IndexedDocument] = {}
+        self._postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self._by_class: Dict[int, Set[Tuple[str, int]]] = {}
+        self._total_length = 0
+        # BM25 length normalization per document, recomputed on the first
+        # query after a change since it depends on the average length
+        self._norms: Optional[Dict[Tuple[str, int], float]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def add(self, kind: str, item_id: int, lecture_id: Optional[int], class_id: int, title: str,
+            file_type: Optional[str], text: Optional[str], page_offsets: Optional[List[int]] = None):
+        """Index a document, replacing the one stored under the same key."""
+        text = text or ""
+        frequencies, first, length = tokenize(text)
+        document = _IndexedDocument(
+            lecture_id, class_id, title, file_type, text, page_offsets or [0], first, length
+        )
+        key = (kind, item_id)
+        with self._lock:
+            self._remove(key)
+            self._documents[key] = document
+            self._by_class.setdefault(class_id, set()).add(key)
+            self._total_length += length
+            self._norms = None
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    self._postings[term] = {key: frequency}
+                else:
+                    postings[key] = frequency
+
+    def remove(self, kind: str, item_ids: Iterable[int]):
+        with self._lock:
+            for item_id in item_ids:
+                self._remove((kind, item_id))
+
+    def remove_where(self, lecture_ids: Iterable[int] = (), class_id: Optional[int] = None):
+        """Remove the files of ``lecture_ids``, or everything of ``class_id``."""
+        lecture_ids = set(lecture_ids)
+        with self._lock:
+            doomed = list(self._by_class.get(class_id, ()))
+            if lecture_ids:
+                doomed += [key for key, document in self._documents.items() if document.lecture_id in lecture_ids]
+            for key in doomed:
+                self._remove(key)
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        self._total_length -= document.length
+        self._norms = None
+        members = self._by_class[document.class_id]
+        members.discard(key)
+        if not members:
+            del self._by_class[document.class_id]
+        for term in document.first:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._postings.clear()
+            self._by_class.clear()
+            self._total_length = 0
+            self._norms = None
+
+    def _length_norms(self) -> Dict[Tuple[str, int], float]:
+        if self._norms is None:
+            average_length = self._total_length / len(self._documents) or 1
+            self._norms = {
+                key: K1 * (1 - B + B * document.length / average_length)
+                for key, document in self._documents.items()
+            }
+        return self._norms
+
+    def search(self, query: str, class_id: Optional[int] = None, limit: int = 10) -> List[SearchHit]:
+        terms = query_terms(query)
+        with self._lock:
+            count = len(self._documents)
+            if not terms or not count:
+                return []
+            norms = self._length_norms()
+            allowed = None if class_id is None else self._by_class.get(class_id, set())
+            scores: Dict[Tuple[str, int], float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                weight = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (K1 + 1)
+                if allowed is not None:
+                    if len(allowed) < len(postings):
+                        postings = {key: postings[key] for key in allowed if key in postings}
+                    else:
+                        postings = {key: frequency for key, frequency in postings.items() if key in allowed}
+                for key, frequency in postings.items():
+                    scores[key] = scores.get(key, 0.0) + weight * frequency / (frequency + norms[key])
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            hits = []
+            for (kind, item_id), score in best:
+                document = self._documents[(kind, item_id)]
+                position = min(document.first[term] for term in terms if term in document.first)
+                hits.append(SearchHit(
+                    kind, item_id, document.lecture_id, document.class_id, document.title, document.file_type,
+                    page_at(document.page_offsets, position), score, make_snippet(document.text, position),
+                ))
+            return hits
+
+
+class OracleTextSearch:
+    """
+    Queries CONTEXT indexes (Oracle Text) on documents.extracted_text and the
+    legacy lecture_files.pdf_text / quizzes.quiz_content columns. The indexes
+    sync on commit, so there is nothing to update from the application.
+    Snippets are cut around the first regex match of a query term, fetched
+    only for the top ``limit`` hits.
+    """
+
+    @staticmethod
+    def contains_query(terms: List[str]) -> str:
+        # Braces escape Oracle Text operators and reserved words; ACCUM ranks
+        # documents matching more of the terms higher
+        return " ACCUM ".join("{" + term + "}" for term in terms)
+
+    @staticmethod
+    def search_sql(class_filter: bool) -> str:
+        lecture_filter = "AND l.class_id = :class_id" if class_filter else ""
+        quiz_filter = "AND q.class_id = :class_id" if class_filter else ""
+        return f"""
+            WITH hits AS (
+                SELECT 'lecture' AS kind, lf.id AS item_id, SCORE(1) AS score
+                FROM lecture_files lf
+                JOIN lectures l ON l.id = lf.lecture_id
+                JOIN documents d ON d.id = lf.document_id
+                WHERE CONTAINS(d.extracted_text, :query, 1) > 0 AND lf.pdf_text IS NULL {lecture_filter}
+                UNION ALL
+                SELECT 'lecture', lf.id, SCORE(2)
+                FROM lecture_files lf
+                JOIN lectures l ON l.id = lf.lecture_id
+                WHERE CONTAINS(lf.pdf_text, :query, 2) > 0 {lecture_filter}
+                UNION ALL
+                SELECT 'quiz', q.id, SCORE(3)
+                FROM quizzes q
+                JOIN documents d ON d.id = q.document_id
+                WHERE CONTAINS(d.extracted_text, :query, 3) > 0 AND q.quiz_content IS NULL {quiz_filter}
+                UNION ALL
+                SELECT 'quiz', q.id, SCORE(4)
+                FROM quizzes q
+                WHERE CONTAINS(q.quiz_content, :query, 4) > 0 {quiz_filter}
+                ORDER BY score DESC
+                FETCH FIRST :limit ROWS ONLY
+            )
+            SELECT kind, item_id, score, lecture_id, class_id, title, file_type, page_offsets, match_pos,
+                   DBMS_LOB.SUBSTR(body, :window, GREATEST(match_pos - :lead, 1))
+            FROM (
+                SELECT h.kind, h.item_id, h.score, lf.lecture_id,
+                       COALESCE(l.class_id, q.class_id) AS class_id,
+                       COALESCE(l.lecture_title, q.quiz_title) AS title,
+                       lf.file_type, d.page_offsets,
+                       COALESCE(lf.pdf_text, q.quiz_content, d.extracted_text) AS body,
+                       REGEXP_INSTR(COALESCE(lf.pdf_text, q.quiz_content, d.extracted_text), :pattern, 1, 1, 0, 'i')
+                           AS match_pos
+                FROM hits h
+                LEFT JOIN lecture_files lf ON h.kind = 'lecture' AND lf.id = h.item_id
+                LEFT JOIN lectures l ON l.id = lf.lecture_id
+                LEFT JOIN quizzes q ON h.kind = 'quiz' AND q.id = h.item_id
+                LEFT JOIN documents d ON d.id = COALESCE(lf.document_id, q.document_id)
+            )
+            ORDER BY score DESC
+        """
+
+    async def available(self) -> bool:
+        """True if the CONTEXT index on documents.extracted_text exists."""
+        async with get_async_connection() as conn:
+            cursor = conn.cursor()
+            await cursor.execute("""
+                SELECT COUNT(*) FROM user_indexes
+                WHERE table_name = 'DOCUMENTS' AND index_type = 'DOMAIN' AND ityp_name = 'CONTEXT'
+            """)
+            return (await cursor.fetchone())[0] > 0
+
+    async def search(self, query: str, class_id: Optional[int] = None, limit: int = 10) -> List[SearchHit]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        binds = {
+            "query": self.contains_query(terms),
+            "pattern": "|".join(terms),
+            "limit": limit,
+            "window": SNIPPET_CHARS + SNIPPET_LEAD,
+            "lead": SNIPPET_LEAD,
+        }
+        if class_id is not None:
+            binds["class_id"] = class_id
+        async with get_async_connection() as conn:
+            cursor = conn.cursor()
+            await cursor.execute(self.search_sql(class_id is not None), binds)
+            rows = await cursor.fetchall()
+        hits = []
+        for kind, item_id, score, lecture_id, row_class_id, title, file_type, offsets, match_pos, excerpt in rows:
+            # REGEXP_INSTR is 1-based, and 0 when Oracle Text matched a form the regex does not
+            position = max((match_pos or 0) - 1, 0)
+            excerpt_start = max(position - SNIPPET_LEAD, 0)
+            hits.append(SearchHit(
+                kind, item_id, lecture_id, row_class_id, title, file_type,
+                page_at(decode_page_offsets(offsets), position), float(score),
+                make_snippet(excerpt or "", position - excerpt_start, excerpt_start),
+            ))
+        return hits
+
+
+class SearchService:
+    """
+    Picks the search backend from SEARCH_BACKEND ("oracle", "local" or
+    "auto": Oracle Text if its index exists, otherwise the local index) on
+    the first query whose dictionary lookup succeeds (until then queries
+    raise SearchUnavailable), and keeps the local index in step with
+    uploads and deletes. The local index is built from
+    the database on first use and then updated one lecture or quiz at a
+    time; builds and updates run in order on one background thread.
+    """
+
+    def __init__(self, backend: str):
+        self.configured = backend
+        self.backend: Optional[str] = None if backend == "auto" else backend
+        self.oracle = OracleTextSearch()
+        self.local = LocalSearchIndex()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._built = None
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+            return self._executor.submit(fn, *args)
+
+    async def _resolve(self) -> str:
+        if self.backend is not None:
+            return self.backend
+        try:
+            available = await self.oracle.available()
+        except Exception as e:
+            # e.g. a dropped connection: choose on a later query rather than
+            # settle for (and build) the local index because of it
+            raise SearchUnavailable(f"Could not check for the Oracle Text index: {e}") from e
+        self.backend = "oracle" if available else "local"
+        return self.backend
+
+    async def search(self, query: str, class_id: Optional[int] = None, limit: int = 10) -> Tuple[str, List[SearchHit]]:
+        """(backend used, hits). Raises SearchUnavailable while the backend cannot be chosen."""
+        backend = await self._resolve()
+        if backend == "oracle":
+            return backend, await self.oracle.search(query, class_id, limit)
+        with self._lock:
+            if self._built is None:
+                self._built = self._submit_build()
+            built = self._built
+        await asyncio.wrap_future(built)
+        return backend, self.local.search(query, class_id, limit)
+
+    def _submit_build(self):
+        # Called with self._lock held
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        return self._executor.submit(self._build)
+
+    def _build(self):
+        try:
+            self.local.clear()
+            with get_connection() as conn:
+                cursor = tune_cursor(conn.cursor(), 100)
+                for sql, kind in ((_LECTURE_FILES_SQL, LECTURE), (_QUIZZES_SQL, QUIZ)):
+                    cursor.execute(sql)
+                    for rows in iter_batches(cursor):
+                        self._add_rows(kind, rows)
+        except Exception:
+            # Retried by the next query
+            with self._lock:
+                self._built = None
+            raise
+
+    def _add_rows(self, kind: str, rows):
+        for item_id, lecture_id, class_id, title, file_type, text, offsets in rows:
+            self.local.add(kind, item_id, lecture_id, class_id, title, file_type, text, decode_page_offsets(offsets))
+
+    def _load(self, kind: str, column: str, ids: List[int]):
+        sql = _LECTURE_FILES_SQL if kind == LECTURE else _QUIZZES_SQL
+        with get_connection() as conn:
+            cursor = tune_cursor(conn.cursor(), 100)
+            for chunk in chunked(ids):
+                placeholders, binds = in_list_binds(chunk)
+                cursor.execute(f"{sql} WHERE {column} IN ({placeholders})", binds)
+                for rows in iter_batches(cursor):
+                    self._add_rows(kind, rows)
+
+    def _update(self, fn, *args):
+        """Queue an index update behind the build, if the local index is in use."""
+        with self._lock:
+            if self._built is None:
+                # Not built yet: the build will read the committed rows
+                return
+        future = self._submit(fn, *args)
+        future.add_done_callback(_log_failure)
+
+    def lectures_changed(self, lecture_ids: Iterable[int]):
+        """Index the files of new or changed lectures. Call after commit."""
+        lecture_ids = list(lecture_ids)
+        if lecture_ids:
+            self._update(self._replace_lectures, lecture_ids)
+
+    def _replace_lectures(self, lecture_ids: List[int]):
+        self.local.remove_where(lecture_ids=lecture_ids)
+        self._load(LECTURE, "l.id", lecture_ids)
+
+    def lectures_removed(self, lecture_ids: Iterable[int]):
+        lecture_ids = list(lecture_ids)
+        if lecture_ids:
+            self._update(self.local.remove_where, lecture_ids)
+
+    def class_removed(self, class_id: int):
+        self._update(self.local.remove_where, (), class_id)
+
+    def quizzes_changed(self, quiz_ids: Iterable[int]):
+        quiz_ids = list(quiz_ids)
+        if quiz_ids:
+            self._update(self._load, QUIZ, "q.id", quiz_ids)
+
+    def drain(self):
+        """Wait for queued index updates; for tests and benchmarks."""
+        if self._executor is not None:
+            self._submit(lambda: None).result()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend or self.configured,
+            "local_documents": len(self.local),
+            "local_terms": self.local.term_count,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        print("[search] index update failed:")
+        print("".join(traceback.format_exception(future.exception())))
+
+
+search_service = SearchService(config.SEARCH_BACKEND)
@@ -1,9 +1,46 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from ..config import config
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with other rounds still verify, and are flagged for rehashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+class HashingBusy(Exception):
+    """Raised when HASH_MAX_PENDING hash operations are already queued or running."""
+
+# bcrypt releases the GIL, so these threads hash in parallel while the event
+# loop and the request threadpool keep serving other endpoints
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(config.HASH_MAX_PENDING)
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(max_workers=config.HASH_WORKERS, thread_name_prefix="hash")
+        return _hash_executor
+
+def shutdown_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=False, cancel_futures=True)
+            _hash_executor = None
+
+async def _run_hashing(fn, *args):
+    # Admission control: refuse at once rather than queue behind a storm
+    if not _hash_slots.acquire(blocking=False):
+        raise HashingBusy(f"Too many password hashes in progress ({config.HASH_MAX_PENDING})")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_hash_executor(), fn, *args)
+    finally:
+        _hash_slots.release()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -11,6 +48,18 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    """get_password_hash on the hashing executor. Raises HashingBusy when saturated."""
+    return await _run_hashing(get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password on the hashing executor. Returns (valid, new_hash):
+    new_hash is set when the stored hash used other settings than
+    BCRYPT_ROUNDS and should be saved in its place.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -19,4 +68,4 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
@@ -0,0 +1,99 @@
+import asyncio
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Rows fetched per round trip while streaming. Rows carrying pdf_text /
+# quiz_content can be large, so fetch fewer of them at a time.
+STREAM_ARRAYSIZE_FULL = 100
+STREAM_ARRAYSIZE_SUMMARY = 1000
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True when the client opted into streaming with ``Accept: application/x-ndjson``."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def stream_arraysize(include_text: bool) -> int:
+    return STREAM_ARRAYSIZE_FULL if include_text else STREAM_ARRAYSIZE_SUMMARY
+
+
+def tune_cursor(cursor, arraysize: int):
+    """Size the cursor's fetch buffer so rows arrive in fixed-size batches."""
+    cursor.arraysize = arraysize
+    cursor.prefetchrows = arraysize + 1
+    return cursor
+
+
+def iter_batches(cursor):
+    """Yield lists of rows from an executed cursor, one fetch buffer at a time."""
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield rows
+
+
+async def iterate_in_thread(iterator: Iterator) -> AsyncIterator:
+    """
+    The items of a blocking iterator, like iterate_in_threadpool, except that
+    one worker thread runs the iterator to its end whether or not anyone is
+    still consuming. A generator told to stop early (by a flag it checks
+    between items) therefore returns and cleans up in that thread, never
+    while another thread is inside it.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+
+    def pump():
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(items.put_nowait, ("item", item))
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, ("error", e))
+        else:
+            loop.call_soon_threadsafe(items.put_nowait, ("end", None))
+
+    loop.run_in_executor(None, pump)
+    while True:
+        kind, value = await items.get()
+        if kind == "end":
+            return
+        if kind == "error":
+            raise value
+        yield value
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def ndjson_line(record) -> str:
+    """Serialize a dict or pydantic model as one NDJSON line."""
+    if hasattr(record, "json"):
+        return record.json() + "\n"
+    return json.dumps(record, default=_default) + "\n"
+
+
+def ndjson_response(lines) -> StreamingResponse:
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
+
+
+def sse_event(event: str, data) -> str:
+    """One server-sent event, its data as a single line of JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, default=_default)}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    # Not cached, and not buffered by proxies, so every event reaches the browser as it is sent
+    return StreamingResponse(
+        events, media_type=SSE_MEDIA_TYPE, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
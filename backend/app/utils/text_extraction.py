@@ -0,0 +1,265 @@
+import codecs
+import io
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import List, Optional, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import config
+
+# A saved file's path, or the raw bytes of an in-memory upload
+Source = Union[str, bytes]
+
+# Plain text is decoded in blocks of this many bytes
+READ_BLOCK = 1 << 20
+
+
+class PdfExtractionTimeout(Exception):
+    """Raised when a document's text is not extracted within PDF_EXTRACT_TIMEOUT."""
+
+
+class UnsupportedDocument(Exception):
+    """Raised for uploads that are neither PDF nor plain text."""
+
+
+class ExtractedText:
+    """
+    A document's text plus where each page starts in it. Plain text files
+    count as a single page. ``truncated`` is set when the document was cut off
+    at EXTRACT_MAX_CHARS.
+    """
+
+    __slots__ = ("text", "page_offsets", "truncated")
+
+    def __init__(self, text: str, page_offsets: List[int], truncated: bool = False):
+        self.text = text
+        self.page_offsets = page_offsets
+        self.truncated = truncated
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets)
+
+    def page(self, number: int) -> str:
+        """Text of page ``number`` (0-based)."""
+        start = self.page_offsets[number]
+        stop = self.page_offsets[number + 1] if number + 1 < len(self.page_offsets) else len(self.text)
+        return self.text[start:stop]
+
+
+class _PageCollector:
+    """Accumulates page texts in order, up to ``max_chars``, and joins them once at the end."""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.pieces: List[str] = []
+        self.offsets: List[int] = []
+        self.size = 0
+        self.truncated = False
+
+    def add(self, texts) -> bool:
+        """Append pages; False once the cap is reached and later pages would be dropped."""
+        for text in texts:
+            room = self.max_chars - self.size
+            if len(text) > room:
+                text = text[:room]
+                self.truncated = True
+            self.offsets.append(self.size)
+            self.pieces.append(text)
+            self.size += len(text)
+            if self.truncated:
+                return False
+        return True
+
+    def result(self) -> ExtractedText:
+        return ExtractedText("".join(self.pieces), self.offsets, self.truncated)
+
+
+# --- Runs in the worker processes (and in-process for short PDFs) ----------
+
+# "pypdf" is the default. "PyPDF2", its predecessor, does less layout work and
+# extracts about 3-4x faster; the quiz handlers, whose text only feeds prompts,
+# keep using it.
+PDF_PARSERS = ("pypdf", "PyPDF2")
+
+
+def _open_pdf(source: Source, parser: str = "pypdf"):
+    if parser == "PyPDF2":
+        from PyPDF2 import PdfReader
+    else:
+        from pypdf import PdfReader
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _read_pages(reader, start: int, stop: int, deadline: float, max_chars: int) -> List[str]:
+    """
+    Text of pages [start, stop). Stops early once more than ``max_chars`` were
+    read, and gives up at the next page boundary once ``deadline`` (wall
+    clock) has passed, so a timed-out document does not keep the worker busy.
+    """
+    page_count = len(reader.pages)
+    texts = []
+    size = 0
+    for number in range(start, min(stop, page_count)):
+        if time.time() > deadline:
+            raise PdfExtractionTimeout(f"Stopped at page {number} of {page_count}")
+        text = reader.pages[number].extract_text() or ""
+        texts.append(text)
+        size += len(text)
+        if size > max_chars:
+            break
+    return texts
+
+
+def _extract_pages(source: Source, start: int, stop: int, deadline: float, max_chars: int,
+                   parser: str = "pypdf") -> List[str]:
+    """_read_pages on a fresh reader; the task each pool worker runs."""
+    return _read_pages(_open_pdf(source, parser), start, stop, deadline, max_chars)
+
+
+# --- Runs in the API process ------------------------------------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """The shared extraction process pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs DB and job threads is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=config.PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died (e.g. killed for memory) so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_ranges(page_count: int):
+    step = config.PDF_PAGES_PER_TASK
+    return ((start, min(start + step, page_count)) for start in range(0, page_count, step))
+
+
+def extract_pdf_sync(source: Source, parser: str = "pypdf") -> ExtractedText:
+    """
+    Extract a PDF's text; blocks the calling thread only.
+
+    The page count is read here. A PDF of fewer than PDF_POOL_MIN_PAGES pages
+    is extracted right here, where it takes less time than the round trips to
+    the process pool. Longer ones are split into PDF_PAGES_PER_TASK page
+    ranges, submitted to the pool a few at a time (one per worker) and
+    collected in order, so a document past EXTRACT_MAX_CHARS stops being
+    parsed instead of being read to the end. Raises PdfExtractionTimeout after
+    PDF_EXTRACT_TIMEOUT seconds.
+    """
+    if parser not in PDF_PARSERS:
+        raise ValueError(f"Unknown PDF parser {parser!r}, expected one of {PDF_PARSERS}")
+    timeout = config.PDF_EXTRACT_TIMEOUT
+    deadline = time.time() + timeout
+    collector = _PageCollector(config.EXTRACT_MAX_CHARS)
+    reader = _open_pdf(source, parser)
+    page_count = len(reader.pages)
+    if page_count < config.PDF_POOL_MIN_PAGES:
+        collector.add(_read_pages(reader, 0, page_count, deadline, collector.max_chars))
+        return collector.result()
+    del reader
+
+    pool = get_pdf_pool()
+    in_flight = deque()
+
+    def submit(start, stop):
+        return pool.submit(_extract_pages, source, start, stop, deadline, collector.max_chars, parser)
+
+    def remaining():
+        return max(deadline - time.time(), 0)
+
+    try:
+        ranges = _page_ranges(page_count)
+        in_flight.extend(submit(*page_range) for page_range in islice(ranges, config.PDF_WORKERS))
+        more = True
+        while more and in_flight:
+            more = collector.add(in_flight.popleft().result(remaining()))
+            next_range = next(ranges, None)
+            if more and next_range is not None:
+                in_flight.append(submit(*next_range))
+    except FutureTimeoutError:
+        raise PdfExtractionTimeout(f"PDF text extraction took longer than {timeout}s")
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
+    return collector.result()
+
+
+async def extract_pdf(source: Source, parser: str = "pypdf") -> ExtractedText:
+    """extract_pdf_sync for async handlers; the event loop only waits on the thread or workers."""
+    return await run_in_threadpool(extract_pdf_sync, source, parser)
+
+
+def extract_plain_text(source: Source) -> ExtractedText:
+    """
+    Decode a text file or upload as UTF-8, falling back to Latin-1, in blocks
+    of READ_BLOCK bytes and up to EXTRACT_MAX_CHARS characters.
+    """
+    for encoding, errors in (("utf-8", "strict"), ("latin-1", "replace")):
+        decoder = codecs.getincrementaldecoder(encoding)(errors)
+        collector = _PageCollector(config.EXTRACT_MAX_CHARS)
+        stream = io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+        try:
+            with stream:
+                while True:
+                    block = stream.read(READ_BLOCK)
+                    if not collector.add([decoder.decode(block, final=not block)]) or not block:
+                        break
+        except UnicodeDecodeError:
+            continue
+        # A text file is one page: fold the blocks into it
+        return ExtractedText("".join(collector.pieces), [0], collector.truncated)
+
+
+def is_pdf(filename: Optional[str], content_type: Optional[str]) -> bool:
+    return (filename or "").lower().endswith(".pdf") or content_type == "application/pdf"
+
+
+def is_plain_text(filename: Optional[str], content_type: Optional[str]) -> bool:
+    return (filename or "").lower().endswith(".txt") or content_type == "text/plain"
+
+
+def extract_document_sync(source: Source, filename: Optional[str] = None, content_type: Optional[str] = None,
+                          parser: str = "pypdf") -> ExtractedText:
+    """Text of a PDF or plain text document, chosen by file name or content type."""
+    if is_plain_text(filename, content_type):
+        return extract_plain_text(source)
+    if is_pdf(filename, content_type):
+        return extract_pdf_sync(source, parser)
+    raise UnsupportedDocument("Unsupported file type. Only .txt and .pdf are allowed.")
+
+
+async def extract_document(source: Source, filename: Optional[str] = None, content_type: Optional[str] = None,
+                           parser: str = "pypdf") -> ExtractedText:
+    return await run_in_threadpool(extract_document_sync, source, filename, content_type, parser)
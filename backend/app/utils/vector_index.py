@@ -0,0 +1,376 @@
+import fcntl
+import json
+import math
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Metadata stored per vector, in the same row order as vectors.f32
+ROW_DTYPE = np.dtype([
+    ("document_id", "<i8"),
+    ("ordinal", "<i4"),
+    ("page", "<i4"),
+    ("char_start", "<i8"),
+    ("char_end", "<i8"),
+])
+
+# Rows scored per block when assigning rows to partitions
+_BLOCK = 65536
+
+
+def normalize(vectors) -> np.ndarray:
+    """Unit-length float32 rows, so a dot product is the cosine similarity."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class IndexSnapshot:
+    """
+    One mapping of a VectorIndex: arrays that belong together, which later
+    remaps of the index do not touch. Row ids found in a snapshot are looked
+    up with its row(), since a rebuild renumbers rows.
+    """
+
+    def __init__(self, count, trained, nlist, vectors, rows, deleted, centroids, lists, offsets):
+        self.count = count
+        self.trained = trained
+        self.nlist = nlist
+        self.vectors = vectors
+        self.rows = rows
+        self.deleted = deleted
+        self.centroids = centroids
+        self.lists = lists
+        self.offsets = offsets
+        self._by_document: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def rows_of(self, document_ids) -> np.ndarray:
+        """Row ids (live or not) of the given documents."""
+        if self._by_document is None:
+            order = np.argsort(self.rows["document_id"], kind="stable")
+            self._by_document = order, np.asarray(self.rows["document_id"])[order]
+        order, sorted_ids = self._by_document
+        document_ids = np.unique(np.asarray(list(document_ids), dtype=np.int64))
+        starts = np.searchsorted(sorted_ids, document_ids, side="left")
+        stops = np.searchsorted(sorted_ids, document_ids, side="right")
+        ranges = [order[start:stop] for start, stop in zip(starts, stops) if stop > start]
+        return np.sort(np.concatenate(ranges)) if ranges else np.zeros(0, np.int64)
+
+    def _probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Candidate rows for one query: the nearest partitions plus the untrained tail."""
+        nprobe = min(nprobe, self.nlist)
+        nearest = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        parts = [self.lists[self.offsets[part]:self.offsets[part + 1]] for part in nearest]
+        parts.append(np.arange(self.trained, self.count))
+        return np.concatenate(parts)
+
+    def search(self, queries, k: int = 10, document_ids: Iterable[int] = None, nprobe: int = 8,
+               exact_below: int = 20000) -> List[List[Tuple[int, float]]]:
+        """See VectorIndex.search."""
+        queries = normalize(queries)
+        if not self.count:
+            return [[] for _ in queries]
+        if document_ids is not None:
+            return self._top_k(self.rows_of(document_ids), queries, k)
+        if self.nlist and self.count >= exact_below:
+            return [self._top_k(self._probe(query, nprobe), query[None, :], k)[0] for query in queries]
+        return self._top_k(None, queries, k)
+
+    def _top_k(self, candidates: Optional[np.ndarray], queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        if candidates is None:
+            # Every row: the matrix product reads the mapping directly, no gather copy
+            scores = self.vectors @ queries.T
+            deleted = self.deleted.astype(bool)
+            candidates = np.arange(self.count)
+        else:
+            scores = self.vectors[candidates] @ queries.T
+            deleted = self.deleted[candidates].astype(bool)
+        scores[deleted] = -np.inf
+        k = min(k, len(candidates))
+        if not k:
+            return [[] for _ in queries]
+        best = np.argpartition(scores, -k, axis=0)[-k:]
+        results = []
+        for column in range(len(queries)):
+            picked = best[:, column]
+            picked = picked[np.argsort(-scores[picked, column])]
+            results.append([
+                (int(candidates[row]), float(scores[row, column]))
+                for row in picked if scores[row, column] > -np.inf
+            ])
+        return results
+
+    def row(self, row_id: int) -> dict:
+        return {name: int(self.rows[row_id][name]) for name in ROW_DTYPE.names}
+
+
+class VectorIndex:
+    """
+    Nearest-neighbour index over chunk embeddings, kept in flat files under
+    ``path`` and memory-mapped, so every worker process on the host shares
+    one copy in the page cache and opening it reads no vectors.
+
+    - ``vectors.f32`` holds unit-length float32 rows, ``rows.bin`` their
+      ROW_DTYPE metadata and ``deleted.u8`` one tombstone flag per row.
+      Appends only ever add rows at the end.
+    - ``train`` clusters the live rows into ``nlist`` partitions (IVF):
+      ``centroids.f32``, and ``lists.i64`` / ``offsets.i64`` holding the
+      row ids of each partition. Rows appended after training form a tail
+      that is always scanned in full, until the next ``train``.
+    - ``meta.json`` is replaced last on every write. Readers remap when it
+      changes; tombstones show up in their mappings immediately.
+
+    Writers serialize on an flock of ``path + ".lock"``, so appends from
+    several processes do not interleave.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.dim = 0
+        self.count = 0
+        self.trained = 0
+        self.nlist = 0
+        self.vectors = np.zeros((0, 0), np.float32)
+        self.rows = np.zeros(0, ROW_DTYPE)
+        self.deleted = np.zeros(0, np.uint8)
+        self.centroids = np.zeros((0, 0), np.float32)
+        self.lists = np.zeros(0, np.int64)
+        self.offsets = np.zeros(1, np.int64)
+        self._stamp = None
+        self._snapshot: Optional[IndexSnapshot] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _meta_stamp(self):
+        try:
+            stat = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @property
+    def exists(self) -> bool:
+        return self.refresh()
+
+    def refresh(self) -> bool:
+        """Remap if the index changed on disk. Returns False while there is no index."""
+        stamp = self._meta_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                # Retry if a writer replaced the files while they were being mapped
+                while stamp != self._stamp:
+                    self._map(stamp)
+                    self._stamp, stamp = stamp, self._meta_stamp()
+        return self._stamp is not None
+
+    def _map(self, stamp):
+        self._snapshot = None
+        if stamp is None:
+            self._reset()
+            return
+        with open(self._file("meta.json")) as handle:
+            meta = json.load(handle)
+        self.dim, self.count = meta["dim"], meta["count"]
+        self.trained, self.nlist = meta["trained"], meta["nlist"]
+        self.vectors = self._open("vectors.f32", np.float32, (self.count, self.dim))
+        self.rows = self._open("rows.bin", ROW_DTYPE, (self.count,))
+        self.deleted = self._open("deleted.u8", np.uint8, (self.count,))
+        if self.nlist:
+            self.centroids = self._open("centroids.f32", np.float32, (self.nlist, self.dim))
+            self.offsets = self._open("offsets.i64", np.int64, (self.nlist + 1,))
+            self.lists = self._open("lists.i64", np.int64, (int(self.offsets[-1]),))
+        else:
+            self.centroids = np.zeros((0, self.dim), np.float32)
+            self.lists = np.zeros(0, np.int64)
+            self.offsets = np.zeros(1, np.int64)
+
+    def _open(self, name: str, dtype, shape) -> np.ndarray:
+        if not all(shape):
+            return np.zeros(shape, dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+
+    @contextmanager
+    def _writing(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_meta(self, **changes):
+        meta = {"dim": self.dim, "count": self.count, "trained": self.trained, "nlist": self.nlist}
+        meta.update(changes)
+        temp = self._file("meta.json.tmp")
+        with open(temp, "w") as handle:
+            json.dump(meta, handle)
+        os.replace(temp, self._file("meta.json"))
+        self.refresh()
+
+    def _replace_file(self, name: str, data: np.ndarray):
+        temp = self._file(name + ".tmp")
+        data.tofile(temp)
+        os.replace(temp, self._file(name))
+
+    def append(self, rows: Iterable[tuple], vectors) -> int:
+        """Add vectors with their (document_id, ordinal, page, char_start, char_end) rows."""
+        with self._writing():
+            return self._append(rows, vectors)
+
+    def _append(self, rows, vectors) -> int:
+        rows = np.array(list(rows), dtype=ROW_DTYPE)
+        if not len(rows):
+            return 0
+        vectors = normalize(vectors)
+        if len(vectors) != len(rows):
+            raise ValueError(f"{len(vectors)} vectors for {len(rows)} rows")
+        if self._stamp is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the index has {self.dim}")
+        for name, data in (
+            ("vectors.f32", vectors),
+            ("rows.bin", rows),
+            ("deleted.u8", np.zeros(len(rows), np.uint8)),
+        ):
+            with open(self._file(name), "ab") as handle:
+                # Drop whatever an append that died before its meta update left behind
+                handle.truncate(self.count * (data.nbytes // len(data)))
+                data.tofile(handle)
+        self._write_meta(count=self.count + len(rows))
+        return len(rows)
+
+    def delete_documents(self, document_ids: Iterable[int]) -> int:
+        """Tombstone every row of these documents. Returns the number of rows deleted."""
+        with self._writing():
+            return self._delete_documents(document_ids)
+
+    def _delete_documents(self, document_ids) -> int:
+        if not self.count:
+            return 0
+        doomed = self.snapshot().rows_of(document_ids)
+        doomed = doomed[self.deleted[doomed] == 0]
+        if len(doomed):
+            flags = np.memmap(self._file("deleted.u8"), dtype=np.uint8, mode="r+", shape=(self.count,))
+            flags[doomed] = 1
+            flags.flush()
+            del flags
+        return len(doomed)
+
+    def replace_documents(self, document_ids: Iterable[int], rows: Iterable[tuple], vectors) -> int:
+        """Tombstone the documents' current rows and append their new ones, as one write."""
+        with self._writing():
+            self._delete_documents(document_ids)
+            return self._append(rows, vectors)
+
+    def train(self, nlist: int = None, iterations: int = 10, sample_per_list: int = 64, seed: int = 0):
+        """
+        Partition the live rows with spherical k-means (about sqrt(rows)
+        partitions by default), clustering a sample and then assigning every
+        live row to its nearest centroid.
+        """
+        with self._writing():
+            self._train(nlist, iterations, sample_per_list, seed)
+
+    def _train(self, nlist, iterations=10, sample_per_list=64, seed=0):
+        live = np.flatnonzero(self.deleted == 0)
+        if not len(live):
+            return
+        nlist = min(nlist or max(int(math.sqrt(len(live))), 1), len(live))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, min(len(live), nlist * sample_per_list), replace=False))
+        points = np.asarray(self.vectors[sample])
+        centroids = points[rng.choice(len(points), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = (points @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, points)
+            filled = np.bincount(assignment, minlength=nlist) > 0
+            # Empty partitions keep their previous centroid
+            centroids[filled] = normalize(sums[filled])
+
+        assignment = np.concatenate([
+            (self.vectors[live[start:start + _BLOCK]] @ centroids.T).argmax(axis=1)
+            for start in range(0, len(live), _BLOCK)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1)).astype(np.int64)
+        self._replace_file("centroids.f32", centroids.astype(np.float32))
+        self._replace_file("lists.i64", live[order].astype(np.int64))
+        self._replace_file("offsets.i64", offsets)
+        self._write_meta(trained=self.count, nlist=nlist)
+
+    def snapshot(self) -> IndexSnapshot:
+        """The current mapping, refreshed first. Readers use one snapshot throughout."""
+        self.refresh()
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = IndexSnapshot(
+                    self.count, self.trained, self.nlist, self.vectors, self.rows, self.deleted,
+                    self.centroids, self.lists, self.offsets,
+                )
+            return self._snapshot
+
+    def search(self, queries, k: int = 10, document_ids: Iterable[int] = None, nprobe: int = 8,
+               exact_below: int = 20000) -> List[List[Tuple[int, float]]]:
+        """
+        The ``k`` best (row id, cosine) pairs for each query vector, best
+        first. With ``document_ids``, only those documents' rows are scored,
+        exhaustively. Otherwise an index with at least ``exact_below`` rows
+        and trained partitions scores only the ``nprobe`` nearest partitions
+        (plus the tail); smaller ones are scanned in full. Row ids are those
+        of the current snapshot; callers that look rows up afterwards should
+        search a snapshot() instead.
+        """
+        return self.snapshot().search(queries, k, document_ids, nprobe, exact_below)
+
+    def row(self, row_id: int) -> dict:
+        return self.snapshot().row(row_id)
+
+    def rebuild(self, batches: Iterable[Tuple[List[tuple], list]], train_above: int = 20000):
+        """
+        Write a fresh, compacted index from ``batches`` of (rows, vectors) next
+        to this one and swap it in, training partitions once it has at least
+        ``train_above`` rows. Readers keep their old mapping until they refresh.
+        """
+        with self._writing():
+            building = VectorIndex(self.path + ".build")
+            shutil.rmtree(building.path, ignore_errors=True)
+            for rows, vectors in batches:
+                building._append(rows, vectors)
+            if building.count >= train_above:
+                building._train(None)
+            retired = self.path + ".old"
+            shutil.rmtree(retired, ignore_errors=True)
+            if os.path.exists(self.path):
+                os.rename(self.path, retired)
+            if building.count:
+                os.rename(building.path, self.path)
+            shutil.rmtree(retired, ignore_errors=True)
+            self.refresh()
+
+    def stats(self) -> dict:
+        self.refresh()
+        deleted = int(self.deleted.sum()) if self.count else 0
+        return {
+            "rows": self.count,
+            "deleted": deleted,
+            "dimensions": self.dim,
+            "partitions": self.nlist,
+            "untrained_tail": self.count - self.trained,
+            "bytes": self.count * (self.dim * 4 + ROW_DTYPE.itemsize + 1),
+        }
+
@@ -0,0 +1,17 @@
+"""
+Offline benchmarks for the backend.
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_lecture_hydration``.
+They use an in-memory SQLite stand-in for Oracle (see ``fakedb``), so no
+database or OCI credentials are needed.
+"""
+import os
+
+# app.config requires these to be present even though the benchmarks never connect
+for _key, _value in {
+    "DB_USER": "bench",
+    "DB_PASSWORD": "bench",
+    "DB_DSN": "bench",
+    "SECRET_KEY": "bench-secret",
+}.items():
+    os.environ.setdefault(_key, _value)
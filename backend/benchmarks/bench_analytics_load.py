@@ -0,0 +1,112 @@
+"""
+Load test of the class analytics path against the fake LLM backend: every
+class asks for an analysis at once, then asks again. The first wave runs
+through the analytics job queue (ANALYTICS_WORKERS jobs at a time) and the
+backend's simulated latency, jitter and errors; the second is answered from
+the response cache without a job. No OCI credentials are used.
+
+    python -m benchmarks.bench_analytics_load
+"""
+import os
+import tempfile
+
+# Selected before app.utils.oracle_ai is imported, so cache keys carry the fake model id
+os.environ["LLM_BACKEND"] = "fake"
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+
+import asyncio
+import contextlib
+import io
+import time
+
+from fastapi import HTTPException, Response
+
+from app import database
+from app.config import config
+from app.routers import quizzes
+from app.utils.llm_backends import FakeBackend, set_llm_backend
+from app.utils.llm_cache import llm_cache
+from .fakedb import FakeDatabase
+
+CLASSES = 24
+LECTURES = 6
+LATENCY = 0.5
+JITTER = 0.25
+ERROR_RATE = 0.05
+POLL_INTERVAL = 0.05
+
+
+def seed(db):
+    class_ids = []
+    for n in range(CLASSES):
+        class_id = db.seed_class(f"Class {n}", LECTURES)
+        for (lecture_id,) in db.raw.execute("SELECT id FROM lectures WHERE class_id = ?", (class_id,)).fetchall():
+            db.raw.execute(
+                "INSERT INTO lecture_digests (lecture_id, digest_text) VALUES (?, ?)",
+                (lecture_id, f"- Section {lecture_id}: derivatives\n- Worked example {n}\n"),
+            )
+        db.raw.execute(
+            "INSERT INTO quizzes (class_id, quiz_title, quiz_content, quiz_results) VALUES (?, 'Quiz', ?, ?)",
+            (class_id, f"Q1. Differentiate x^{n}.\n" * 20, f"Q1: {40 + n}% correct\n" * 10),
+        )
+        class_ids.append(class_id)
+    db.raw.commit()
+    return class_ids
+
+
+async def wave(class_ids):
+    """Ask for every class's analysis at once; wait for each job. Returns per-class seconds and outcomes."""
+    async def one(class_id):
+        start = time.perf_counter()
+        try:
+            job = await quizzes.run_class_analytics(class_id, Response())
+        except HTTPException as e:
+            return time.perf_counter() - start, f"http {e.status_code}"
+        if job["cached"]:
+            return time.perf_counter() - start, "cached"
+        while True:
+            state = quizzes.analytics_jobs.get(job["job_id"])
+            if state.done:
+                return time.perf_counter() - start, state.status
+            await asyncio.sleep(POLL_INTERVAL)
+
+    return await asyncio.gather(*(one(class_id) for class_id in class_ids))
+
+
+def summarize(name, results, elapsed):
+    seconds = sorted(result[0] for result in results)
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    p50 = seconds[len(seconds) // 2] * 1000
+    p99 = seconds[min(int(len(seconds) * 0.99), len(seconds) - 1)] * 1000
+    print(f"{name:>14} {elapsed:>8.2f} {p50:>9.1f} {p99:>9.1f}  {outcomes}")
+
+
+async def main():
+    db = FakeDatabase()
+    db.install(database)
+    class_ids = seed(db)
+    # Answers take the latency alone, however long the text
+    backend = FakeBackend(latency=LATENCY, jitter=JITTER, error_rate=ERROR_RATE, tokens_per_second=float("inf"), seed=1)
+    set_llm_backend(backend)
+
+    print(f"{CLASSES} classes, fake backend {LATENCY}s +/- {JITTER}s, {ERROR_RATE:.0%} errors, "
+          f"ANALYTICS_WORKERS={config.ANALYTICS_WORKERS}")
+    print(f"{'wave':>14} {'total s':>8} {'p50 ms':>9} {'p99 ms':>9}  outcomes")
+    try:
+        for name in ("cold", "warm (cached)"):
+            start = time.perf_counter()
+            # Failed jobs print their tracebacks; keep them out of the table
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = await wave(class_ids)
+            summarize(name, results, time.perf_counter() - start)
+        stats = backend.stats()
+        print(f"backend calls {stats['calls']}, errors {stats['errors']}, most in flight {stats['max_in_flight']}; "
+              f"cache hits {llm_cache.hits}, misses {llm_cache.misses}")
+    finally:
+        quizzes.analytics_jobs.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Time until the dashboard has something to show for a class analysis: the
+job path (POST, then poll until the job is done) vs the server-sent events
+stream, against the fake LLM backend with a model-like wait before the
+first token and a steady token rate after it. The last row streams again
+for a class whose analysis is cached.
+
+    python -m benchmarks.bench_analytics_stream
+"""
+import os
+import tempfile
+
+# Selected before app.utils.oracle_ai is imported, so cache keys carry the fake model id
+os.environ["LLM_BACKEND"] = "fake"
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+
+import asyncio
+import contextlib
+import io
+import time
+
+from fastapi import Response
+
+from app import database
+from app.routers import quizzes
+from app.utils.llm_backends import FakeBackend, set_llm_backend
+from .fakedb import FakeDatabase
+
+FIRST_TOKEN_SECONDS = 2.0
+TOKENS_PER_SECOND = 100
+POLL_INTERVAL = 0.5  # how often a dashboard would poll the job
+
+
+def seed_class(db, n):
+    class_id = db.seed_class(f"Class {n}", 4)
+    db.raw.execute(
+        "INSERT INTO lecture_digests (lecture_id, digest_text) SELECT id, 'Derivatives and limits' FROM lectures "
+        "WHERE class_id = ?", (class_id,),
+    )
+    db.raw.execute(
+        "INSERT INTO quizzes (class_id, quiz_title, quiz_content, quiz_results) VALUES (?, 'Quiz', ?, ?)",
+        (class_id, f"Q1. Differentiate x^{n}.\n" * 20, f"Q1: {40 + n}% correct\n" * 10),
+    )
+    db.raw.commit()
+    return class_id
+
+
+async def job_path(class_id):
+    start = time.perf_counter()
+    job = await quizzes.run_class_analytics(class_id, Response())
+    while not quizzes.analytics_jobs.get(job["job_id"]).done:
+        await asyncio.sleep(POLL_INTERVAL)
+    elapsed = time.perf_counter() - start
+    # Nothing is shown before the whole analysis is in
+    return elapsed, elapsed, elapsed
+
+
+async def stream_path(class_id):
+    start = time.perf_counter()
+    response = await quizzes.stream_class_analytics(class_id)
+    first_byte = first_token = None
+    async for chunk in response.body_iterator:
+        now = time.perf_counter() - start
+        first_byte = first_byte if first_byte is not None else now
+        if first_token is None and chunk.startswith("event: token"):
+            first_token = now
+        if chunk.startswith("event: error"):
+            raise RuntimeError(chunk)
+    return first_byte, first_token, time.perf_counter() - start
+
+
+async def main():
+    db = FakeDatabase()
+    db.install(database)
+    set_llm_backend(FakeBackend(latency=FIRST_TOKEN_SECONDS, jitter=0, tokens_per_second=TOKENS_PER_SECOND))
+
+    print(f"fake model: first token after {FIRST_TOKEN_SECONDS}s, then {TOKENS_PER_SECOND} tokens/s")
+    print(f"{'path':>16} {'first byte s':>13} {'first token s':>14} {'complete s':>11}")
+    try:
+        streamed = seed_class(db, 1)
+        for name, path, class_id in (
+            ("job + polling", job_path, seed_class(db, 0)),
+            ("SSE stream", stream_path, streamed),
+            ("SSE, cached", stream_path, streamed),
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                first_byte, first_token, complete = await path(class_id)
+            print(f"{name:>16} {first_byte:>13.3f} {first_token:>14.3f} {complete:>11.2f}")
+        stored = db.raw.execute("SELECT COUNT(*) FROM class_analysis WHERE class_id = ?", (streamed,)).fetchone()[0]
+        print(f"streamed analysis stored in class_analysis: {bool(stored)}")
+    finally:
+        quizzes.analytics_jobs.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Concurrent request capacity of one worker: sync handlers on Starlette's
+threadpool vs async handlers on the async pool.
+
+Both variants serve GET /classes/ against the same fake database with a
+simulated 20 ms round trip and a 100-connection pool. The sync variant is the
+previous handler (``def`` + get_connection), so it can only have as many
+requests in flight as the threadpool has workers (40 by default).
+
+    python -m benchmarks.bench_async_load
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI, HTTPException
+
+from app import database
+from app.database import get_connection
+from app.routers import classes_router
+from app.schemas import ClassSchema
+from .fakedb import FakeDatabase
+
+LATENCY = 0.02
+POOL_SIZE = 100
+REQUESTS = 2000
+
+
+def build_threadpool_app():
+    app = FastAPI()
+
+    @app.get("/classes/")
+    def get_classes():
+        try:
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, class_name, created_at FROM classes ORDER BY created_at DESC")
+                return [ClassSchema(id=r[0], class_name=r[1], created_at=r[2]) for r in cursor.fetchall()]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return app
+
+
+def build_async_app():
+    app = FastAPI()
+    app.include_router(classes_router, prefix="/classes")
+    return app
+
+
+async def call(app, path):
+    """Issue one GET straight through the ASGI interface and return its status."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("bench", 1), "server": ("bench", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_load(app, concurrency):
+    latencies = []
+    remaining = REQUESTS
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            assert await call(app, "/classes/") == 200
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return REQUESTS / elapsed, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main():
+    print(f"{'clients':>7} {'threadpool rps':>15} {'p95 ms':>7} {'async rps':>10} {'p95 ms':>7}")
+    for concurrency in (10, 40, 100, 200):
+        row = []
+        for build in (build_threadpool_app, build_async_app):
+            db = FakeDatabase(latency=LATENCY, max_connections=POOL_SIZE)
+            db.seed_class("Bench", 0)
+            db.install(database)
+            row.extend(asyncio.run(run_load(build(), concurrency)))
+        print(f"{concurrency:>7} {row[0]:>15.0f} {row[1]:>7.1f} {row[2]:>10.0f} {row[3]:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Cost of resolving the current user on an authenticated request: the users
+query on every call vs the principal cache. Both decode the JWT each time.
+
+    python -m benchmarks.bench_auth_cache
+"""
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app import database
+from app.middleware import auth
+from app.utils.principal_cache import PrincipalCache
+from app.utils.security import create_access_token
+from .fakedb import FakeDatabase
+
+LATENCY = 0.002  # simulated network round trip to the database
+USERS = 50
+REQUESTS = 2000
+
+
+def main():
+    db = FakeDatabase(latency=LATENCY)
+    db.install(database)
+    tokens = []
+    for n in range(USERS):
+        email = f"user{n}@example.com"
+        db.raw.execute("INSERT INTO users (email, password_hash) VALUES (?, 'x')", (email,))
+        tokens.append(HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": email})))
+    db.raw.commit()
+
+    print(f"{REQUESTS} requests over {USERS} users, {LATENCY * 1000:.0f} ms per round trip")
+    print(f"{'path':>14} {'us/request':>11} {'round trips':>12} {'hit ratio':>10}")
+    for name, cache in (("no cache", PrincipalCache(0, 0)), ("ttl cache", PrincipalCache(10000, 60))):
+        auth.principal_cache = cache
+        db.reset_counters()
+        start = time.perf_counter()
+        for n in range(REQUESTS):
+            auth.get_current_user(tokens[n % USERS])
+        elapsed = time.perf_counter() - start
+        ratio = cache.stats()["hit_ratio"]
+        print(f"{name:>14} {elapsed / REQUESTS * 1e6:>11.0f} {db.round_trips:>12} {ratio:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
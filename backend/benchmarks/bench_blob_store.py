@@ -0,0 +1,111 @@
+"""
+Upload storage: the old flat ``{user}_{filename}`` directory vs the sharded,
+content-addressed BlobStore.
+
+1. Creating FILES files and then stat-ing random ones, all in one directory
+   vs spread over the ab/cd/ shard tree.
+2. Storing a large upload that was spooled to disk: shutil.copyfileobj
+   (the old path, no hash), hashing while copying through user space, and
+   BlobStore.put (hash, then copy_file_range/sendfile plus fsync for the
+   atomic rename), including a put of content that is already stored.
+
+On filesystems with hashed directory indexes (ext4, xfs) a flat directory
+still stats quickly; what the shard tree bounds is directory size, which is
+what listing, backup and non-indexed filesystems pay for.
+
+    python -m benchmarks.bench_blob_store
+"""
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app.utils.blob_store import BlobStore
+
+FILES = 200_000
+LOOKUPS = 20_000
+UPLOAD_MB = 256
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_lookups(root):
+    names = [hashlib.sha256(str(n).encode()).hexdigest() for n in range(FILES)]
+    sample = random.sample(names, LOOKUPS)
+    flat = os.path.join(root, "flat")
+    os.makedirs(flat)
+    store = BlobStore(os.path.join(root, "blobs"))
+
+    def create_flat():
+        for name in names:
+            open(os.path.join(flat, f"1_{name}.pdf"), "wb").close()
+
+    def create_sharded():
+        for name in names:
+            path = store.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+    print(f"{FILES:,} files, {LOOKUPS:,} random stats")
+    print(f"{'layout':>8} {'create s':>9} {'stat us':>8} {'largest dir':>12}")
+    for name, create, lookup, largest in (
+        ("flat", create_flat, lambda n: os.stat(os.path.join(flat, f"1_{n}.pdf")), lambda: len(os.listdir(flat))),
+        ("sharded", create_sharded, lambda n: os.stat(store.path(n)),
+         lambda: max(len(os.listdir(os.path.join(store.root, a, b)))
+                     for a in os.listdir(store.root) for b in os.listdir(os.path.join(store.root, a)))),
+    ):
+        create_s = timed(create)
+        stat_s = timed(lambda: [lookup(n) for n in sample])
+        print(f"{name:>8} {create_s:>9.1f} {stat_s / LOOKUPS * 1e6:>8.1f} {largest():>12,}")
+
+
+def bench_upload(root):
+    upload = tempfile.SpooledTemporaryFile(max_size=1 << 20, dir=root)
+    block = os.urandom(1 << 20)
+    for _ in range(UPLOAD_MB):
+        upload.write(block)
+    store = BlobStore(os.path.join(root, "upload-blobs"))
+
+    def copy_old():
+        upload.seek(0)
+        with open(os.path.join(root, "1_deck.pdf"), "wb") as buffer:
+            shutil.copyfileobj(upload, buffer)
+
+    def copy_and_hash():
+        upload.seek(0)
+        digest = hashlib.sha256()
+        with open(os.path.join(root, "hashed.pdf"), "wb") as buffer:
+            while True:
+                data = upload.read(1 << 20)
+                if not data:
+                    break
+                digest.update(data)
+                buffer.write(data)
+
+    print(f"\n{UPLOAD_MB} MiB upload spooled to disk")
+    print(f"{'path':>28} {'s':>6} {'MiB/s':>7}")
+    for name, fn in (
+        ("copyfileobj (old)", copy_old),
+        ("copy + sha256 in user space", copy_and_hash),
+        ("BlobStore.put, new content", lambda: store.put(upload)),
+        ("BlobStore.put, already stored", lambda: store.put(upload)),
+    ):
+        elapsed = timed(fn)
+        print(f"{name:>28} {elapsed:>6.2f} {UPLOAD_MB / elapsed:>7.0f}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        bench_lookups(root)
+    with tempfile.TemporaryDirectory() as root:
+        bench_upload(root)
+
+
+if __name__ == "__main__":
+    main()
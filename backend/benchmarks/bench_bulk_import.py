@@ -0,0 +1,102 @@
+"""
+Onboarding a course: one upload_lecture call per lecture (what the form does)
+vs one POST /lectures/import of a zip with a manifest.
+
+Both run in process against FakeDatabase, so the per-request HTTP overhead the
+form also pays is not counted. Digest and embedding queueing are replaced
+with no-ops: they need OCI credentials and are the same background work
+either way.
+
+    python -m benchmarks.bench_bulk_import
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+import zipfile
+
+from starlette.datastructures import Headers, UploadFile
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp())
+sys.modules["app.utils.digests"] = types.SimpleNamespace(queue_lecture_digests=lambda ids: 0)
+
+from app import database
+from app.routers import lectures
+from app.utils import lecture_import, text_extraction
+from app.utils.labels import label_cache
+from app.utils.lecture_import import ImportSources, import_lectures, parse_manifest
+from .bench_pdf_ingest import make_pdf
+from .fakedb import FakeDatabase
+
+lectures.queue_embeddings = lecture_import.queue_embeddings = lambda: True
+
+LATENCY = 0.002  # simulated network round trip to the database
+LECTURES = 40
+PAGES = 20
+LABELS = 5
+
+
+def course():
+    """(manifest entry, pdf bytes, transcript bytes) per lecture."""
+    for n in range(LECTURES):
+        entry = {
+            "title": f"Week {n}", "date": f"2024-{n // 28 + 1:02d}-{n % 28 + 1:02d}",
+            "labels": ["course"] + [f"topic-{n}-{k}" for k in range(LABELS - 1)],
+            "pdf": f"week{n}.pdf", "transcript": f"week{n}.txt",
+        }
+        yield entry, make_pdf(PAGES, 30) + f"% {n}".encode(), f"week {n}: so the gradient...\n".encode() * 2000
+
+
+def upload(name, content, content_type):
+    return UploadFile(io.BytesIO(content), filename=name, headers=Headers({"content-type": content_type}))
+
+
+async def one_request_per_lecture(class_id, lectures_data):
+    for entry, pdf, transcript in lectures_data:
+        await lectures.upload_lecture(
+            pdf_file=upload(entry["pdf"], pdf, "application/pdf"),
+            transcript_file=upload(entry["transcript"], transcript, "text/plain"),
+            class_id=class_id, lecture_title=entry["title"], lecture_date=entry["date"],
+            labels=",".join(entry["labels"]),
+        )
+
+
+async def bulk_import(class_id, lectures_data):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("manifest.json", json.dumps([entry for entry, _, _ in lectures_data]))
+        for entry, pdf, transcript in lectures_data:
+            zf.writestr(entry["pdf"], pdf)
+            zf.writestr(entry["transcript"], transcript)
+    sources = ImportSources.from_zip(archive)
+    items = await import_lectures(class_id, parse_manifest(sources.manifest), sources)
+    assert all(item.status == "created" for item in items), [item.error for item in items]
+
+
+async def main():
+    lectures_data = list(course())
+    print(f"{LECTURES} lectures, {PAGES}-page PDF + transcript + {LABELS} labels each, "
+          f"{LATENCY * 1000:.0f} ms per round trip")
+    print(f"{'path':>22} {'s':>6} {'round trips':>12}")
+    text_extraction.get_pdf_pool().submit(int).result()
+    try:
+        for name, run in (("upload per lecture", one_request_per_lecture), ("bulk import", bulk_import)):
+            db = FakeDatabase(latency=LATENCY)
+            db.install(database)
+            label_cache.clear()
+            class_id = db.seed_class("Bench", 0)
+            db.reset_counters()
+            start = time.perf_counter()
+            await run(class_id, lectures_data)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>22} {elapsed:>6.2f} {db.round_trips:>12}")
+    finally:
+        text_extraction.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
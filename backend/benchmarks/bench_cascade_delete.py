@@ -0,0 +1,92 @@
+"""
+Deleting a class: the old per-lecture loop (four DELETEs per lecture, blobs
+unlinked before the response) vs the set-based delete_class_rows with blob
+removal handed to the background reaper.
+
+Each lecture has two files backed by their own document and blob.
+
+    python -m benchmarks.bench_cascade_delete
+"""
+import io
+import os
+import tempfile
+import time
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp())
+
+from app import database
+from app.utils.blob_reaper import blob_reaper
+from app.utils.blob_store import blob_store
+from app.utils.deletion import delete_class_rows
+from app.utils.documents import release_documents
+from .fakedb import FakeDatabase
+
+LATENCY = 0.002  # simulated network round trip to the database
+BLOB_KB = 64
+
+
+def seed(db, lectures):
+    class_id = db.seed_class("Bench", lectures)
+    cur = db.raw.cursor()
+    files = cur.execute(
+        "SELECT lf.id FROM lecture_files lf JOIN lectures l ON l.id = lf.lecture_id WHERE l.class_id = ?", (class_id,)
+    ).fetchall()
+    for (file_id,) in files:
+        sha256, size, _ = blob_store.put(io.BytesIO(os.urandom(BLOB_KB * 1024)))
+        cur.execute("INSERT INTO documents (sha256, byte_size, ref_count) VALUES (?, ?, 1)", (sha256, size))
+        cur.execute("UPDATE lecture_files SET document_id = ? WHERE id = ?", (cur.lastrowid, file_id))
+    db.raw.commit()
+    return class_id
+
+
+def per_lecture_loop(class_id):
+    """The previous delete_class."""
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM lectures WHERE class_id = :class_id", {"class_id": class_id})
+        lecture_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT lf.document_id FROM lecture_files lf JOIN lectures l ON l.id = lf.lecture_id
+            WHERE l.class_id = :class_id AND lf.document_id IS NOT NULL
+        """, {"class_id": class_id})
+        released = release_documents(cursor, [row[0] for row in cursor.fetchall()])
+        for lecture_id in lecture_ids:
+            for table in ("lecture_labels", "lecture_files", "lecture_digests"):
+                cursor.execute(f"DELETE FROM {table} WHERE lecture_id = :lecture_id", {"lecture_id": lecture_id})
+            cursor.execute("DELETE FROM lectures WHERE id = :lecture_id", {"lecture_id": lecture_id})
+        cursor.execute("DELETE FROM classes WHERE id = :class_id", {"class_id": class_id})
+        conn.commit()
+    for sha256 in released:
+        blob_store.remove(sha256)
+
+
+def set_based(class_id):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        released = delete_class_rows(cursor, class_id)
+        conn.commit()
+    blob_reaper.reap(released)
+
+
+def main():
+    print(f"{LATENCY * 1000:.0f} ms per round trip, two {BLOB_KB} KiB blobs per lecture")
+    print(f"{'lectures':>8} {'path':>16} {'trips':>6} {'request ms':>11} {'reaper ms':>10}")
+    for count in (50, 500):
+        for name, delete in (("per-lecture loop", per_lecture_loop), ("set-based", set_based)):
+            db = FakeDatabase(latency=LATENCY)
+            db.install(database)
+            class_id = seed(db, count)
+            db.reset_counters()
+            start = time.perf_counter()
+            delete(class_id)
+            request_ms = (time.perf_counter() - start) * 1000
+            trips = db.round_trips
+            blob_reaper.drain()
+            reaper_ms = (time.perf_counter() - start) * 1000 - request_ms
+            assert db.raw.execute("SELECT COUNT(*) FROM lectures").fetchone()[0] == 0
+            print(f"{count:>8} {name:>16} {trips:>6} {request_ms:>11.0f} {reaper_ms:>10.0f}")
+    blob_reaper.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Embedding a course's documents: one embed request per chunk, sent one
+after another, vs requests of EMBED_BATCH_SIZE inputs with EMBED_CONCURRENCY
+in flight. Then re-embedding after one slide of one deck was edited: only
+the changed chunks go to the model.
+
+The embed call is simulated (a fixed cost per request plus a small cost per
+input), since what matters here is how many requests are made and how they
+overlap.
+
+    python -m benchmarks.bench_embeddings
+"""
+import random
+import threading
+import time
+
+from app import database
+from app.config import config
+from app.utils.documents import encode_page_offsets
+from app.utils.embeddings import embed_documents, embed_pending_documents
+from .fakedb import FakeDatabase
+
+DOCUMENTS = 10
+PAGES = 40
+WORDS_PER_PAGE = 150
+DIMENSIONS = 384
+REQUEST_SECONDS = 0.1  # per embed request
+INPUT_SECONDS = 0.002  # per input in a request
+MODEL = "cohere.embed-english-light-v3.0"
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.requests = 0
+        self.inputs = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.requests += 1
+            self.inputs += len(texts)
+        time.sleep(REQUEST_SECONDS + INPUT_SECONDS * len(texts))
+        return [[float(len(text) % 7)] * DIMENSIONS for text in texts]
+
+
+def deck(rng, n):
+    pages = [
+        " ".join(rng.choice(("gradient", "matrix", "eigen", "loss", "norm", "vector", "basis")) + str(rng.randint(0, 99))
+                 for _ in range(WORDS_PER_PAGE)) + "\n"
+        for _ in range(PAGES)
+    ]
+    offsets, size = [], 0
+    for page in pages:
+        offsets.append(size)
+        size += len(page)
+    return "".join(pages), offsets
+
+
+def store(db, sha, text, offsets):
+    cur = db.raw.execute(
+        "INSERT INTO documents (sha256, byte_size, extracted_text, page_offsets, ref_count) VALUES (?, ?, ?, ?, 1)",
+        (sha, len(text), text, encode_page_offsets(offsets)),
+    )
+    db.raw.commit()
+    return cur.lastrowid
+
+
+def run(db, embed, batch_size, concurrency, ids=None):
+    config.EMBED_BATCH_SIZE, config.EMBED_CONCURRENCY = batch_size, concurrency
+    start = time.perf_counter()
+    if ids is None:
+        totals = embed_pending_documents(embed, MODEL)
+    else:
+        totals = embed_documents(ids, embed, MODEL)
+    return time.perf_counter() - start, totals
+
+
+def main():
+    rng = random.Random(3)
+    decks = [deck(rng, n) for n in range(DOCUMENTS)]
+    print(f"{DOCUMENTS} decks x {PAGES} pages, {REQUEST_SECONDS * 1000:.0f} ms per request "
+          f"+ {INPUT_SECONDS * 1000:.0f} ms per input")
+    print(f"{'path':>28} {'chunks':>7} {'embedded':>9} {'requests':>9} {'seconds':>8}")
+    for name, batch_size, concurrency in (
+        ("one request per chunk", 1, 1),
+        ("batched", config.EMBED_BATCH_SIZE, 1),
+        ("batched, concurrent", config.EMBED_BATCH_SIZE, config.EMBED_CONCURRENCY),
+    ):
+        db = FakeDatabase()
+        db.install(database)
+        for n, (text, offsets) in enumerate(decks):
+            store(db, f"{n:064x}", text, offsets)
+        embed = FakeEmbedder()
+        seconds, totals = run(db, embed, batch_size, concurrency)
+        print(f"{name:>28} {totals['chunks']:>7} {embed.inputs:>9} {embed.requests:>9} {seconds:>8.2f}")
+
+    # A new version of deck 0 with one slide rewritten is a new document
+    text, offsets = decks[0]
+    page = text[offsets[5]:offsets[6]]
+    edited = text.replace(page, "revised: " + page, 1)
+    document_id = store(db, "e" * 64, edited, offsets[:6] + [offset + 9 for offset in offsets[6:]])
+    embed = FakeEmbedder()
+    seconds, totals = run(db, embed, config.EMBED_BATCH_SIZE, config.EMBED_CONCURRENCY, [document_id])
+    print(f"{'edited deck, re-embedded':>28} {totals['chunks']:>7} {embed.inputs:>9} {embed.requests:>9} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
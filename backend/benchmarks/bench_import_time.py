@@ -0,0 +1,72 @@
+"""
+Cold import of the API process (``import app.main``), which is what a worker
+pays on every start or respawn. Each run is a fresh interpreter with
+``-X importtime``; the table lists the slowest top-level packages of the
+median run. Fails (exit status 1) when the median is over IMPORT_BUDGET or
+any of the HEAVY modules, which are only needed on first use, got imported.
+
+    python -m benchmarks.bench_import_time
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+RUNS = 5
+IMPORT_BUDGET = 0.9  # seconds; measured ~0.6 s locally, ~1.2 s before deferring
+# Loaded on first use: the OCI SDK by the first LLM call, pypdf by the first
+# PDF, numpy by the first passage search, SQLAlchemy only by app.models
+HEAVY = ("oci", "pypdf", "PyPDF2", "numpy", "sqlalchemy")
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile():
+    """One cold import; returns ({module: cumulative µs}, total µs)."""
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules[name] = int(cumulative)
+        if len(indent) == 1:  # top level; each nesting level adds two spaces
+            total += int(cumulative)
+    return modules, total
+
+
+def main():
+    runs = sorted((profile() for _ in range(RUNS)), key=lambda run: run[1])
+    modules, total = runs[len(runs) // 2]
+    median = statistics.median(run[1] for run in runs) / 1e6
+
+    packages = defaultdict(int)
+    for name, cumulative in modules.items():
+        if "." not in name:
+            packages[name] = max(packages[name], cumulative)
+    print(f"import app.main, median of {RUNS} cold runs: {median:.3f} s (budget {IMPORT_BUDGET:.1f} s)")
+    print(f"{'package':>16} {'ms':>8}")
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+        print(f"{name:>16} {cumulative / 1000:>8.1f}")
+
+    heavy = [name for name in HEAVY if name in modules]
+    failures = []
+    if median > IMPORT_BUDGET:
+        failures.append(f"import took {median:.3f} s, over the {IMPORT_BUDGET:.1f} s budget")
+    if heavy:
+        failures.append(f"imported at startup: {', '.join(heavy)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Round trips to attach TAGS labels to a new lecture: the old per-label loop
+(INSERT, SELECT id, INSERT link for every label) vs app.utils.labels with a
+cold and a warm name -> id cache.
+
+    python -m benchmarks.bench_label_upsert
+"""
+import asyncio
+import time
+
+from app.utils import labels
+from .fakedb import FakeDatabase
+
+LATENCY = 0.002  # simulated network round trip to the database
+TAGS = 20
+LECTURES = 50
+
+
+async def per_label_loop(cursor, lecture_id, names):
+    """The previous behaviour: three statements per label."""
+    for label in names:
+        try:
+            await cursor.execute("INSERT INTO labels (label_name) VALUES (:label_name)", {"label_name": label})
+        except Exception:
+            pass
+        await cursor.execute("SELECT id FROM labels WHERE label_name = :label_name", {"label_name": label})
+        label_id = (await cursor.fetchone())[0]
+        await cursor.execute(
+            "INSERT INTO lecture_labels (lecture_id, label_id) VALUES (:lecture_id, :label_id)",
+            {"lecture_id": lecture_id, "label_id": label_id}
+        )
+
+
+async def run(db, link, names_for):
+    conn = await db.async_pool().acquire()
+    cursor = conn.cursor()
+    db.reset_counters()
+    start = time.perf_counter()
+    for lecture_id in range(LECTURES):
+        ids = await link(cursor, lecture_id, names_for(lecture_id))
+        if ids:
+            # What upload_lecture does after its commit
+            labels.label_cache.put_many(ids)
+    elapsed = (time.perf_counter() - start) * 1000
+    return db.round_trips / LECTURES, elapsed / LECTURES
+
+
+async def main():
+    # Half of each lecture's tags are shared course-wide, half are new
+    def names_for(lecture_id):
+        return [f"course-{k}" for k in range(TAGS // 2)] + [f"topic-{lecture_id}-{k}" for k in range(TAGS - TAGS // 2)]
+
+    print(f"{LECTURES} lectures x {TAGS} tags, {LATENCY * 1000:.0f} ms per round trip")
+    print(f"{'path':>22} {'trips/lecture':>14} {'ms/lecture':>11}")
+    rows = [("per-label loop (old)", per_label_loop, None)]
+    rows.append(("MERGE, cold cache", labels.link_lecture_labels, labels.label_cache.clear))
+    rows.append(("MERGE, warm cache", labels.link_lecture_labels, None))
+    db = FakeDatabase(latency=LATENCY)
+    for name, link, before in rows:
+        if before is not None:
+            before()
+            # Fresh tables so the cold run really creates every label
+            db = FakeDatabase(latency=LATENCY)
+        trips, ms = await run(db, link, names_for)
+        print(f"{name:>22} {trips:>14.1f} {ms:>11.1f}")
+    print(f"cache: {labels.label_cache.hits} hits, {labels.label_cache.misses} misses")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""
+Round trips per lecture listing: the old per-lecture loop vs the batched loader.
+
+    python -m benchmarks.bench_lecture_hydration
+"""
+import time
+
+from app.routers import lectures
+from .fakedb import FakeDatabase
+
+LATENCY = 0.002  # simulated network round trip to the database
+
+
+def per_lecture_loop(cursor, lecture_ids):
+    """The previous behaviour: three queries for every lecture."""
+    return [lectures.get_lectures_data(cursor, [lecture_id])[0] for lecture_id in lecture_ids]
+
+
+def main():
+    print(f"{'lectures':>8} {'loop trips':>11} {'loop ms':>9} {'batch trips':>12} {'batch ms':>9}")
+    for count in (10, 50, 200, 1000):
+        db = FakeDatabase(latency=LATENCY)
+        class_id = db.seed_class("Bench", count)
+        cursor = db.acquire().cursor()
+        cursor.execute("SELECT id FROM lectures WHERE class_id = :class_id", {"class_id": class_id})
+        lecture_ids = [row[0] for row in cursor.fetchall()]
+
+        results = []
+        for loader in (per_lecture_loop, lectures.get_lectures_data):
+            db.reset_counters()
+            start = time.perf_counter()
+            loaded = loader(cursor, lecture_ids)
+            elapsed = (time.perf_counter() - start) * 1000
+            assert len(loaded) == count
+            results.append((db.round_trips, elapsed))
+
+        (loop_trips, loop_ms), (batch_trips, batch_ms) = results
+        print(f"{count:>8} {loop_trips:>11} {loop_ms:>9.1f} {batch_trips:>12} {batch_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+LLM calls under a struggling service, straight to the backend (as before)
+vs through ResilientBackend. Every caller is its own thread, like analytics
+jobs, digest jobs and embedding sweeps calling at once.
+
+- throttled: a share of calls fail with 429/503. Retries with jittered
+  backoff turn most failures into successes, and the slot limit keeps the
+  service from seeing every caller at once.
+- outage: every call fails after the full latency. Once the breaker opens,
+  the remaining callers fail in microseconds instead of each waiting on
+  the service, and the service stops receiving calls.
+- recovery: after the reset timeout one trial call closes the breaker.
+
+    python -m benchmarks.bench_llm_resilience
+"""
+import threading
+import time
+
+from app.utils.llm_backends import CircuitBreaker, FakeBackend, ResilientBackend
+
+CALLERS = 40
+LATENCY = 0.2
+JITTER = 0.05
+MAX_IN_FLIGHT = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 1.0
+BREAKER_FAILURES = 5
+BREAKER_RESET = 1.0
+
+
+def wrap(backend):
+    return ResilientBackend(
+        backend, max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX, queue_timeout=60, breaker=CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET),
+    )
+
+
+def storm(backend, callers=CALLERS):
+    """Every caller makes one chat call at the same moment. Returns (ok, seconds per caller, wall seconds)."""
+    ok, seconds = [], []
+    lock = threading.Lock()
+    gate = threading.Event()
+
+    def caller(n):
+        gate.wait()
+        start = time.perf_counter()
+        try:
+            backend.chat(f"prompt {n}", {"max_tokens": 20}, "fake")
+            succeeded = True
+        except Exception:
+            succeeded = False
+        with lock:
+            ok.append(succeeded)
+            seconds.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(callers)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    return ok, sorted(seconds), time.perf_counter() - start
+
+
+def row(name, path, fake, result):
+    ok, seconds, wall = result
+    p50 = seconds[len(seconds) // 2] * 1000
+    print(f"{name:>10} {path:>10} {sum(ok):>4}/{len(ok):<4} {p50:>9.1f} {wall:>7.2f} {fake.calls:>13} {fake.max_in_flight:>10}")
+
+
+def main():
+    print(f"{CALLERS} concurrent callers, {LATENCY}s +/- {JITTER}s per call; resilient: {MAX_IN_FLIGHT} in flight, "
+          f"{MAX_RETRIES} retries, breaker after {BREAKER_FAILURES} failures")
+    print(f"{'scenario':>10} {'path':>10} {'ok':>9} {'p50 ms':>9} {'wall s':>7} {'service calls':>13} {'peak calls':>10}")
+    for scenario, error_rate in (("throttled", 0.3), ("outage", 1.0)):
+        for path in ("direct", "resilient"):
+            fake = FakeBackend(latency=LATENCY, jitter=JITTER, error_rate=error_rate, tokens_per_second=float("inf"), seed=5)
+            backend = fake if path == "direct" else wrap(fake)
+            row(scenario, path, fake, storm(backend))
+            if scenario == "outage" and path == "resilient":
+                breaker = backend.breaker
+                print(f"{'':>10} breaker {breaker.state} after {fake.calls} service calls, "
+                      f"{breaker.rejected} calls or retries refused without calling it")
+                fake.error_rate = 0.0
+                time.sleep(BREAKER_RESET)
+                calls = fake.calls
+                result = storm(backend, callers=1)
+                print(f"{'recovery':>10} trial call {'succeeded' if result[0][0] else 'failed'} after "
+                      f"{BREAKER_RESET}s, breaker {breaker.state}, {fake.calls - calls} service call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+A login storm (class start): many concurrent logins against the old sync
+handler, which hashed on the request threadpool, vs the current async
+handler with the bounded hashing executor. Meanwhile one client pings an
+async endpoint and one a sync (threadpool) endpoint every 10 ms. The table
+shows login throughput, logins turned away with 503 (retried after the
+Retry-After second) and both pings' latency.
+
+    python -m benchmarks.bench_login_storm
+"""
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, HTTPException
+
+from app import database
+from app.config import config
+from app.routers import auth
+from app.schemas.user import UserCreate
+from app.utils import security
+from .bench_async_load import call
+from .fakedb import FakeDatabase
+
+CLIENTS = 64
+LOGINS = 192
+PING_INTERVAL = 0.01
+ROUNDS = 10
+RETRY_AFTER = 1.0  # what the 503's Retry-After header asks for
+
+
+def old_login(user: UserCreate):
+    """The previous /auth/login: sync handler, bcrypt inline."""
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, email, password_hash FROM users WHERE email = :email", {"email": user.email})
+        db_user = cursor.fetchone()
+        if not db_user or not security.verify_password(user.password, db_user[2]):
+            raise HTTPException(status_code=400, detail="Incorrect email or password")
+        return {"access_token": security.create_access_token({"sub": db_user[1]}), "token_type": "bearer"}
+
+
+def build_app():
+    app = FastAPI()
+    app.post("/old/login")(old_login)
+    app.include_router(auth.router, prefix="/auth")
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/ping_sync")
+    def ping_sync():
+        return {"ok": True}
+
+    return app
+
+
+async def post(app, path, body):
+    data = json.dumps(body).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())],
+        "client": ("bench", 1), "server": ("bench", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(app, login_path):
+    body = {"email": "student@example.com", "password": "correct horse"}
+    remaining = LOGINS
+    rejected = 0
+    storming = True
+    latencies = {"/ping": [], "/ping_sync": []}
+
+    async def client():
+        nonlocal remaining, rejected
+        while remaining > 0:
+            remaining -= 1
+            while True:
+                status = await post(app, login_path, body)
+                if status != 503:
+                    break
+                rejected += 1
+                await asyncio.sleep(RETRY_AFTER)
+            assert status == 200, status
+
+    async def pinger(path):
+        due = time.perf_counter()
+        while storming:
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            assert await call(app, path) == 200
+            latencies[path].append(time.perf_counter() - due)
+            due += PING_INTERVAL
+
+    pingers = [asyncio.create_task(pinger(path)) for path in latencies]
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(CLIENTS)))
+    elapsed = time.perf_counter() - start
+    storming = False
+    await asyncio.gather(*pingers)
+
+    def p99(values):
+        values = sorted(values)
+        return values[min(int(len(values) * 0.99), len(values) - 1)] * 1000
+
+    return LOGINS / elapsed, rejected, p99(latencies["/ping"]), p99(latencies["/ping_sync"])
+
+
+def main():
+    security.pwd_context.update(bcrypt__rounds=ROUNDS)
+    db = FakeDatabase()
+    db.install(database)
+    db.raw.execute(
+        "INSERT INTO users (email, password_hash) VALUES (?, ?)",
+        ("student@example.com", security.get_password_hash("correct horse")),
+    )
+    db.raw.commit()
+    app = build_app()
+
+    print(f"{LOGINS} logins from {CLIENTS} clients, bcrypt rounds={ROUNDS}, "
+          f"HASH_WORKERS={config.HASH_WORKERS}, HASH_MAX_PENDING={config.HASH_MAX_PENDING}")
+    print(f"{'login handler':>22} {'logins/s':>9} {'503s':>6} {'async ping p99 ms':>18} {'sync ping p99 ms':>17}")
+    try:
+        for name, path in (("sync, inline bcrypt", "/old/login"), ("async, hash executor", "/auth/login")):
+            rate, rejected, ping_p99, sync_p99 = asyncio.run(run(app, path))
+            print(f"{name:>22} {rate:>9.1f} {rejected:>6} {ping_p99:>18.1f} {sync_p99:>17.1f}")
+    finally:
+        security.shutdown_hash_executor()
+
+
+if __name__ == "__main__":
+    main()
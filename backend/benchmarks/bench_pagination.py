@@ -0,0 +1,61 @@
+"""
+Payload size and fetch time of lecture listings: everything vs one summary page.
+
+    python -m benchmarks.bench_pagination
+"""
+import asyncio
+import json
+import time
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app import database
+from app.routers import lectures
+from .fakedb import FakeDatabase
+
+PAGE_SIZE = 20
+JSON_REQUEST = Request({"type": "http", "headers": []})
+
+
+def measure(call):
+    start = time.perf_counter()
+    response = Response()
+    result = asyncio.run(call(response))
+    payload = json.dumps(jsonable_encoder(result))
+    return len(payload), (time.perf_counter() - start) * 1000, response
+
+
+def main():
+    print(f"{'lectures':>8} {'full KB':>9} {'full ms':>8} {'page KB':>8} {'page ms':>8} {'pages':>6}")
+    for count in (50, 500, 2000):
+        db = FakeDatabase()
+        db.install(database)
+        class_id = db.seed_class("Bench", count, text_size=20_000)
+
+        full_bytes, full_ms, _ = measure(
+            lambda r: lectures.get_lectures_by_class(class_id, JSON_REQUEST, r, limit=None, cursor=None, fields="full")
+        )
+        page_bytes, page_ms, response = measure(
+            lambda r: lectures.get_lectures_by_class(class_id, JSON_REQUEST, r, limit=PAGE_SIZE, cursor=None, fields="summary")
+        )
+
+        # Walk every page to check the cursor chain covers the class exactly once
+        seen, pages, next_cursor = set(), 0, None
+        while True:
+            response = Response()
+            page = asyncio.run(lectures.get_lectures_by_class(
+                class_id, JSON_REQUEST, response, limit=PAGE_SIZE, cursor=next_cursor, fields="summary"
+            ))
+            seen.update(lecture.id for lecture in page)
+            pages += 1
+            next_cursor = response.headers.get("x-next-cursor")
+            if not next_cursor:
+                break
+        assert len(seen) == count
+
+        print(f"{count:>8} {full_bytes / 1024:>9.0f} {full_ms:>8.1f} {page_bytes / 1024:>8.1f} {page_ms:>8.1f} {pages:>6}")
+
+
+if __name__ == "__main__":
+    main()
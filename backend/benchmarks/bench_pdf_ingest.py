@@ -0,0 +1,123 @@
+"""
+Latency of unrelated requests while large PDFs are ingested: text extraction
+inline in the async handler vs in the extraction process pool.
+
+A handful of uploads of a 300-page deck run concurrently with a client that
+hits a trivial endpoint on the same app every 10 ms; the table shows upload
+throughput and that client's latency percentiles. Parallel page ranges only
+pay off in throughput with more than one core; the ping latency is the point.
+
+    python -m benchmarks.bench_pdf_ingest
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI
+from pypdf import PdfReader
+
+from app.config import config
+from app.utils.text_extraction import extract_pdf, get_pdf_pool, shutdown_pdf_pool
+from .bench_async_load import call
+
+PAGES = 300
+LINES_PER_PAGE = 40
+UPLOADS = 4
+PING_INTERVAL = 0.01
+
+
+def make_pdf(pages, lines_per_page):
+    """A minimal PDF with ``pages`` pages of plain Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for n in range(pages):
+        lines = b"".join(
+            b"(Slide %d line %d: gradient descent, chain rule, eigenvalues) Tj T* " % (n, k)
+            for k in range(lines_per_page)
+        )
+        stream = b"BT /F1 9 Tf 11 TL 40 780 Td " + lines + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+async def inline_extract(content):
+    """The previous behaviour: pypdf page loop on the event loop."""
+    import io
+    reader = PdfReader(io.BytesIO(content))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def build_app():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run(extract, content):
+    app = build_app()
+    latencies = []
+    ingesting = True
+
+    async def pinger():
+        # Latency counts from when each ping was due, so time spent waiting
+        # for a blocked event loop shows up
+        due = time.perf_counter()
+        while ingesting:
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            assert await call(app, "/ping") == 200
+            latencies.append(time.perf_counter() - due)
+            due += PING_INTERVAL
+
+    ping_task = asyncio.create_task(pinger())
+    start = time.perf_counter()
+    texts = await asyncio.gather(*(extract(content) for _ in range(UPLOADS)))
+    texts = [getattr(text, "text", text) for text in texts]
+    elapsed = time.perf_counter() - start
+    ingesting = False
+    await ping_task
+    assert all("chain rule" in text for text in texts)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+    return UPLOADS / elapsed, len(latencies), pct(0.5), pct(0.99), latencies[-1] * 1000
+
+
+def main():
+    content = make_pdf(PAGES, LINES_PER_PAGE)
+    print(f"{UPLOADS} concurrent uploads of a {PAGES}-page PDF ({len(content) // 1024} KiB), "
+          f"PDF_WORKERS={config.PDF_WORKERS}, PDF_PAGES_PER_TASK={config.PDF_PAGES_PER_TASK}")
+    # Start the workers up front so spawn time is not counted as extraction time
+    get_pdf_pool().submit(int).result()
+    print(f"{'extraction':>10} {'uploads/s':>10} {'pings':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    try:
+        for name, extract in (("inline", inline_extract), ("pool", extract_pdf)):
+            rate, pings, p50, p99, worst = asyncio.run(run(extract, content))
+            print(f"{name:>10} {rate:>10.2f} {pings:>6} {p50:>8.1f} {p99:>8.1f} {worst:>8.1f}")
+    finally:
+        shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Prompt size and build time as a class grows: one f-string of everything vs
+the token-budgeted map-reduce builder over raw lecture text vs the same
+builder over stored per-lecture digests.
+
+Summaries are simulated: each "LLM call" sleeps for SUMMARY_LATENCY and
+returns a fixed-size digest of the chunk.
+
+    python -m benchmarks.bench_prompt_builder
+"""
+import time
+
+from app.utils.prompt_builder import build_analysis_prompt, estimate_tokens, render_analysis_prompt
+
+SUMMARY_LATENCY = 0.2
+LECTURE_CHARS = 40_000  # roughly a 40-slide deck plus transcript
+BUDGET = 12_000
+CHUNK_TOKENS = 3_000
+CONCURRENCY = 8
+DIGEST_CHARS = 2_000  # a 500-token digest per lecture
+
+
+def fake_summarize(chunk):
+    time.sleep(SUMMARY_LATENCY)
+    return "- " + chunk[:1200]
+
+
+def main():
+    quiz_contents = ["Q1. Explain the chain rule.\n" * 50]
+    quiz_results = ["Q1: 42% correct\n" * 20]
+    print(
+        f"{'lectures':>8} {'naive tokens':>13} {'built tokens':>13} {'LLM calls':>10} {'build s':>8}"
+        f" {'digest tokens':>14} {'LLM calls':>10} {'build s':>8}"
+    )
+    for lectures in (2, 10, 40, 120):
+        lecture_texts = [f"Lecture {n}\n\n" + ("word " * (LECTURE_CHARS // 5)) for n in range(lectures)]
+        naive = render_analysis_prompt("\n".join(lecture_texts), "\n".join(quiz_contents), "\n".join(quiz_results))
+
+        digests = [f"Lecture: Lecture {n}\n" + ("- concept " * (DIGEST_CHARS // 10)) for n in range(lectures)]
+        row = []
+        for material in (lecture_texts, digests):
+            calls = 0
+
+            def summarize(chunk):
+                nonlocal calls
+                calls += 1
+                return fake_summarize(chunk)
+
+            start = time.perf_counter()
+            prompt = build_analysis_prompt(
+                material, quiz_contents, quiz_results, summarize,
+                budget=BUDGET, chunk_tokens=CHUNK_TOKENS, concurrency=CONCURRENCY,
+            )
+            row.extend((estimate_tokens(prompt), calls, time.perf_counter() - start))
+        print(
+            f"{lectures:>8} {estimate_tokens(naive):>13} {row[0]:>13} {row[1]:>10} {row[2]:>8.2f}"
+            f" {row[3]:>14} {row[4]:>10} {row[5]:>8.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
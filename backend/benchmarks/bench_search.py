@@ -0,0 +1,90 @@
+"""
+Full-text search over lecture files and quizzes: a scan of every document's
+text per query (what LIKE / INSTR over the CLOBs amounts to) vs the local
+inverted index's BM25 lookup. Also times incremental adds and removes.
+
+The corpus is synthetic: Zipf-distributed words, so a few terms appear in
+nearly every document and most in only a handful.
+
+    python -m benchmarks.bench_search
+"""
+import random
+import statistics
+import time
+
+from app.utils.search import LECTURE, LocalSearchIndex, make_snippet, query_terms
+
+DOCUMENTS = 5000
+WORDS_PER_DOCUMENT = 800
+VOCABULARY = 30000
+QUERIES = 200
+CLASSES = 20
+
+
+def corpus(rng):
+    words = [f"w{n}" for n in range(VOCABULARY)]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY)]
+    for n in range(DOCUMENTS):
+        yield n, " ".join(rng.choices(words, weights, k=WORDS_PER_DOCUMENT))
+
+
+def scan(texts, query, limit=10):
+    """Rank by raw match count, the best a per-query scan can do cheaply."""
+    terms = query_terms(query)
+    scores = []
+    for n, text in texts.items():
+        lowered = text.lower()
+        score = sum(lowered.count(term) for term in terms)
+        if score:
+            scores.append((score, n))
+    scores.sort(reverse=True)
+    return [make_snippet(texts[n], texts[n].lower().find(terms[0])) for _, n in scores[:limit]]
+
+
+def timed(fn, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    rng = random.Random(7)
+    texts = dict(corpus(rng))
+    index = LocalSearchIndex()
+    start = time.perf_counter()
+    for n, text in texts.items():
+        index.add(LECTURE, n, n, n % CLASSES, f"Lecture {n}", "pdf", text)
+    build_s = time.perf_counter() - start
+
+    # Mix of common, mid-frequency and rare terms, one to three per query
+    queries = [
+        " ".join(f"w{int(rng.paretovariate(0.6)) % VOCABULARY}" for _ in range(rng.randint(1, 3)))
+        for _ in range(QUERIES)
+    ]
+    print(f"{DOCUMENTS} documents x {WORDS_PER_DOCUMENT} words, {index.term_count} distinct terms, "
+          f"index built in {build_s:.1f} s")
+    print(f"{'path':>22} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, fn in (
+        ("scan every document", lambda q: scan(texts, q)),
+        ("inverted index", lambda q: index.search(q, limit=10)),
+        ("index, one class", lambda q: index.search(q, class_id=3, limit=10)),
+    ):
+        p50, p99 = timed(fn, queries[:20] if name.startswith("scan") else queries)
+        print(f"{name:>22} {p50:>8.2f} {p99:>8.2f}")
+
+    start = time.perf_counter()
+    for n in range(100):
+        index.add(LECTURE, DOCUMENTS + n, DOCUMENTS + n, 0, "New", "pdf", texts[n])
+    add_ms = (time.perf_counter() - start) * 10
+    start = time.perf_counter()
+    index.remove(LECTURE, range(DOCUMENTS, DOCUMENTS + 100))
+    remove_ms = (time.perf_counter() - start) * 10
+    print(f"incremental update: {add_ms:.2f} ms per added document, {remove_ms:.2f} ms per removed document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Peak Python memory of GET /lectures/: JSON list vs NDJSON streaming.
+
+    python -m benchmarks.bench_streaming
+"""
+import asyncio
+import json
+import tracemalloc
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app import database
+from app.routers import lectures
+from app.utils.streaming import NDJSON_MEDIA_TYPE
+from .fakedb import FakeDatabase
+
+
+def request_with(accept):
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+def peak_kb(call):
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def as_list():
+    result = asyncio.run(lectures.get_lectures(
+        request_with("application/json"), Response(), limit=None, cursor=None, fields="full"
+    ))
+    json.dumps(jsonable_encoder(result))
+
+
+def as_stream():
+    async def drain():
+        response = await lectures.get_lectures(
+            request_with(NDJSON_MEDIA_TYPE), Response(), limit=None, cursor=None, fields="full"
+        )
+        async for _ in response.body_iterator:
+            pass
+
+    asyncio.run(drain())
+
+
+def main():
+    print(f"{'lectures':>8} {'list peak KB':>13} {'stream peak KB':>15}")
+    for count in (100, 500, 2000):
+        db = FakeDatabase()
+        db.install(database)
+        db.seed_class("Bench", count, text_size=5_000)
+        print(f"{count:>8} {peak_kb(as_list):>13.0f} {peak_kb(as_stream):>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
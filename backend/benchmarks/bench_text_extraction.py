@@ -0,0 +1,172 @@
+"""
+The three previous text extractors vs app.utils.text_extraction on the same
+documents: wall time, and peak Python heap of the extracting process.
+
+"in-process" runs the new page loop and collector without the process pool,
+so it compares like for like with the old loops, once per parser (pypdf is
+the default, PyPDF2 what the quiz handlers use); "pool" forces the process
+pool (its heap is spread over the workers, so only time is shown). The
+plain-text rows read a large transcript whole vs in capped blocks. The last
+table shows where the pool starts to pay off, which PDF_POOL_MIN_PAGES is
+set from: shorter PDFs are extracted in the calling thread.
+
+    python -m benchmarks.bench_text_extraction
+"""
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from pypdf import PdfReader
+
+from app.config import config
+from app.utils import text_extraction
+from app.utils.text_extraction import _PageCollector, _extract_pages, extract_pdf_sync, extract_plain_text
+from .bench_pdf_ingest import make_pdf
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+PAGES = 300
+LINES_PER_PAGE = 40
+TRANSCRIPT_MB = 64
+TRANSCRIPT_CAP = 1_000_000
+SWEEP_PAGES = (5, 10, 25, 50, 100)
+
+
+def lectures_pypdf_path(path, content):
+    """upload_lecture before: pypdf from the saved file, text +=."""
+    reader = PdfReader(path)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def quizzes_pypdf2_bytes(path, content):
+    """upload_quiz_plain / create_quiz before: PyPDF2 over BytesIO, text +=."""
+    reader = PyPDF2.PdfReader(io.BytesIO(content))
+    quiz_text = ""
+    for page in reader.pages:
+        quiz_text += page.extract_text() or ""
+    return quiz_text
+
+
+def tempfile_pypdf2(path, content):
+    """extract_text_from_file before: copy to a NamedTemporaryFile, then PyPDF2."""
+    with tempfile.NamedTemporaryFile(delete=True, suffix=".pdf") as tmp:
+        tmp.write(content)
+        tmp.flush()
+        reader = PyPDF2.PdfReader(tmp.name)
+        text = ""
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text
+    return text
+
+
+def new_in_process(path, content, parser="pypdf"):
+    collector = _PageCollector(config.EXTRACT_MAX_CHARS)
+    collector.add(_extract_pages(path, 0, PAGES, float("inf"), config.EXTRACT_MAX_CHARS, parser))
+    return collector.result().text
+
+
+def new_in_process_pypdf2(path, content):
+    return new_in_process(path, content, "PyPDF2")
+
+
+def new_pool(path, content, parser="pypdf"):
+    return extract_pdf_sync(path, parser).text
+
+
+def transcript_read_whole(path):
+    """upload_lecture before: open(...).read() of the whole transcript."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def transcript_capped(path):
+    return extract_plain_text(path).text
+
+
+def measure(fn, *args, heap=True):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = None
+    if heap:
+        tracemalloc.start()
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def row(name, elapsed, peak, chars):
+    peak_text = f"{peak:>9.1f}" if peak is not None else f"{'-':>9}"
+    print(f"{name:<28} {elapsed:>9.0f} {peak_text} {chars:>10}")
+
+
+def main():
+    content = make_pdf(PAGES, LINES_PER_PAGE)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "deck.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(content)
+        transcript_path = os.path.join(tmp, "transcript.txt")
+        with open(transcript_path, "w", encoding="utf-8") as f:
+            line = "and so the gradient points uphill, which is why we step the other way\n"
+            for _ in range(TRANSCRIPT_MB * 2**20 // len(line)):
+                f.write(line)
+
+        print(f"{PAGES}-page PDF ({len(content) // 1024} KiB), {TRANSCRIPT_MB} MiB transcript")
+        print(f"{'extractor':<28} {'ms':>9} {'peak MiB':>9} {'chars':>10}")
+        extractors = [("lectures: pypdf, path", lectures_pypdf_path)]
+        if PyPDF2 is not None:
+            extractors += [("quizzes: PyPDF2, BytesIO", quizzes_pypdf2_bytes), ("tempfile: PyPDF2", tempfile_pypdf2)]
+        else:
+            print("(PyPDF2 not installed: skipping the quiz extractors)")
+        extractors += [("new: in-process, pypdf", new_in_process)]
+        if PyPDF2 is not None:
+            extractors += [("new: in-process, PyPDF2", new_in_process_pypdf2)]
+        for name, fn in extractors:
+            text, elapsed, peak = measure(fn, pdf_path, content)
+            row(name, elapsed, peak, len(text))
+
+        text_extraction.get_pdf_pool().submit(int).result()
+        min_pages = config.PDF_POOL_MIN_PAGES
+        config.PDF_POOL_MIN_PAGES = 0
+        try:
+            for parser in text_extraction.PDF_PARSERS if PyPDF2 is not None else ("pypdf",):
+                text, elapsed, _ = measure(new_pool, pdf_path, content, parser, heap=False)
+                row(f"new: pool, {parser} ({config.PDF_WORKERS} workers)", elapsed, None, len(text))
+
+            print(f"\npypdf by page count (PDF_POOL_MIN_PAGES={min_pages})")
+            print(f"{'pages':>6} {'in-process ms':>14} {'pool ms':>8}")
+            for pages in SWEEP_PAGES:
+                small = os.path.join(tmp, f"deck{pages}.pdf")
+                with open(small, "wb") as f:
+                    f.write(make_pdf(pages, LINES_PER_PAGE))
+                config.PDF_POOL_MIN_PAGES = pages + 1
+                _, inline_ms, _ = measure(extract_pdf_sync, small, heap=False)
+                config.PDF_POOL_MIN_PAGES = 0
+                _, pool_ms, _ = measure(extract_pdf_sync, small, heap=False)
+                print(f"{pages:>6} {inline_ms:>14.0f} {pool_ms:>8.0f}")
+        finally:
+            config.PDF_POOL_MIN_PAGES = min_pages
+            text_extraction.shutdown_pdf_pool()
+        print()
+
+        text, elapsed, peak = measure(transcript_read_whole, transcript_path)
+        row("transcript: read()", elapsed, peak, len(text))
+        config.EXTRACT_MAX_CHARS = TRANSCRIPT_CAP
+        text, elapsed, peak = measure(transcript_capped, transcript_path)
+        row(f"transcript: capped {TRANSCRIPT_CAP:,}", elapsed, peak, len(text))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+The local vector index at course-catalogue scale: ROWS chunk vectors of
+DIMENSIONS (Cohere embed v3 size), in clusters the way lecture topics are.
+
+Shown: building and opening the memory-mapped index, per-query latency of
+a full scan, of the IVF partitions and of one class's documents, recall of
+the partitions against the full scan, the cost of re-embedding one deck
+(tombstones plus append), and find_passages end to end for a weak concept
+of one class, with a simulated database round trip and the query
+embedding already cached.
+
+    python -m benchmarks.bench_vector_index
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app import database
+from app.config import config
+from app.utils import embeddings
+from app.utils.documents import encode_page_offsets
+from app.utils.vector_index import VectorIndex
+from .fakedb import FakeDatabase
+
+ROWS = 100_000
+DIMENSIONS = 1024
+TOPICS = 400
+CHUNKS_PER_DOCUMENT = 40
+CLASS_DOCUMENTS = 50  # decks and transcripts of the class searched
+QUERIES = 200
+K = 10
+LATENCY = 0.001  # simulated network round trip to the database
+MODEL = "cohere.embed-english-v3.0"
+
+
+def clustered(rng, centers, count):
+    topics = rng.integers(0, len(centers), count)
+    return centers[topics] + rng.normal(0, 0.6, (count, DIMENSIONS)).astype(np.float32) / np.sqrt(DIMENSIONS) * 8
+
+
+def percentiles(timings):
+    timings = np.array(timings) * 1000
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def timed(fn, queries):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings), results
+
+
+def seed_class(db, documents):
+    """The class's lectures, their files and the documents' text, for find_passages."""
+    class_id = db.seed_class("Bench", 0)
+    text = ("chunk of lecture text " * 80 + "\n") * CHUNKS_PER_DOCUMENT
+    size = len(text) // CHUNKS_PER_DOCUMENT
+    for n, document_id in enumerate(documents):
+        db.raw.execute(
+            "INSERT INTO documents (id, sha256, byte_size, extracted_text, page_offsets, ref_count) VALUES (?, ?, ?, ?, ?, 1)",
+            (document_id, f"sha-{document_id}", len(text), text,
+             encode_page_offsets([page * size for page in range(CHUNKS_PER_DOCUMENT)])),
+        )
+        lecture_id = db.raw.execute(
+            "INSERT INTO lectures (class_id, lecture_title, lecture_date) VALUES (?, ?, '2024-01-01')",
+            (class_id, f"Lecture {n}"),
+        ).lastrowid
+        db.raw.execute(
+            "INSERT INTO lecture_files (lecture_id, file_type, document_id) VALUES (?, 'pdf', ?)",
+            (lecture_id, document_id),
+        )
+    db.raw.commit()
+    return class_id, size
+
+
+def main():
+    rng = np.random.default_rng(7)
+    centers = rng.normal(0, 1, (TOPICS, DIMENSIONS)).astype(np.float32)
+    directory = tempfile.mkdtemp()
+    config.VECTOR_INDEX_DIR = directory
+    index = embeddings.vector_index(MODEL)
+    documents = ROWS // CHUNKS_PER_DOCUMENT
+    document_size = 0
+    try:
+        start = time.perf_counter()
+        for first in range(0, documents, 250):
+            ids = range(first + 1, min(first + 251, documents + 1))
+            rows = [(document_id, ordinal, ordinal + 1, 0, 0) for document_id in ids for ordinal in range(CHUNKS_PER_DOCUMENT)]
+            index.append(rows, clustered(rng, centers, len(rows)))
+        appended = time.perf_counter() - start
+        start = time.perf_counter()
+        index.train()
+        trained = time.perf_counter() - start
+        print(f"{ROWS} rows x {DIMENSIONS} dims ({index.stats()['bytes'] / 2 ** 20:.0f} MiB): "
+              f"appended in {appended:.1f} s, {index.nlist} partitions trained in {trained:.1f} s")
+
+        start = time.perf_counter()
+        opened = VectorIndex(index.path)
+        opened.refresh()
+        print(f"open from another worker: {(time.perf_counter() - start) * 1000:.2f} ms (maps, reads no vectors)")
+
+        queries = clustered(rng, centers, QUERIES)
+        class_documents = rng.choice(np.arange(1, documents + 1), CLASS_DOCUMENTS, replace=False)
+        (exact_p50, exact_p99), exact = timed(lambda q: opened.search(q, K, exact_below=ROWS + 1)[0], queries)
+        (ivf_p50, ivf_p99), ivf = timed(
+            lambda q: opened.search(q, K, nprobe=config.VECTOR_NPROBE, exact_below=0)[0], queries
+        )
+        opened.search(queries[0], K, document_ids=class_documents)  # builds the per-document order once
+        (class_p50, class_p99), _ = timed(lambda q: opened.search(q, K, document_ids=class_documents)[0], queries)
+        start = time.perf_counter()
+        opened.search(queries, K, exact_below=ROWS + 1)
+        batched = (time.perf_counter() - start) / QUERIES * 1000
+        recall = np.mean([
+            len({row for row, _ in a} & {row for row, _ in b}) / K for a, b in zip(exact, ivf)
+        ])
+
+        print(f"{'top-' + str(K) + ' search':>34} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'full scan':>34} {exact_p50:>8.2f} {exact_p99:>8.2f}")
+        print(f"{'full scan, ' + str(QUERIES) + ' queries batched':>34} {batched:>8.2f} {'':>8}")
+        print(f"{'IVF, nprobe=' + str(config.VECTOR_NPROBE):>34} {ivf_p50:>8.2f} {ivf_p99:>8.2f}")
+        print(f"{'one class (' + str(CLASS_DOCUMENTS * CHUNKS_PER_DOCUMENT) + ' rows)':>34} {class_p50:>8.2f} {class_p99:>8.2f}")
+        print(f"IVF recall@{K} against the full scan: {recall:.3f}")
+
+        deck = [(documents, ordinal, ordinal + 1, 0, 0) for ordinal in range(CHUNKS_PER_DOCUMENT)]
+        start = time.perf_counter()
+        index.replace_documents([documents], deck, clustered(rng, centers, CHUNKS_PER_DOCUMENT))
+        replaced = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        opened.refresh()
+        remapped = (time.perf_counter() - start) * 1000
+        print(f"re-embedded deck ({CHUNKS_PER_DOCUMENT} tombstones + {CHUNKS_PER_DOCUMENT} rows): {replaced:.1f} ms, "
+              f"other worker remaps in {remapped:.2f} ms")
+
+        db = FakeDatabase(latency=LATENCY)
+        db.install(database)
+        class_id, document_size = seed_class(db, [int(d) for d in class_documents])
+        concept = "eigenvalues of a symmetric matrix"
+        query_vector = clustered(rng, centers, 1)[0].tolist()
+        embeddings.find_passages(class_id, [concept], 5, embed=lambda texts: [query_vector] * len(texts), model_id=MODEL)
+        db.reset_counters()
+        (p50, p99), found = timed(
+            lambda q: embeddings.find_passages(class_id, [concept], 5, embed=None, model_id=MODEL), range(QUERIES)
+        )
+        print(f"find_passages, one weak concept, {LATENCY * 1000:.0f} ms per round trip: p50 {p50:.2f} ms, "
+              f"p99 {p99:.2f} ms, {db.round_trips / QUERIES:.0f} round trips, {len(found[0][0])} passages")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Round trips per create operation: the previous INSERT followed by a
+"newest row with this name" re-SELECT vs INSERT ... RETURNING INTO.
+
+The "before" column replays the old statements; "after" calls the current
+handlers. Password hashing is swapped out, since bcrypt's cost is not what
+this measures.
+
+    python -m benchmarks.bench_write_paths
+"""
+import asyncio
+import time
+from datetime import date
+
+from app import database
+from app.routers import auth, classes, lectures
+from app.schemas import ClassCreate
+from app.schemas.user import UserCreate
+from app.utils.labels import label_cache, link_lecture_labels
+from .fakedb import FakeDatabase
+
+LATENCY = 0.002  # simulated network round trip to the database
+RUNS = 50
+LABELS = "week-1,intro,syllabus"
+
+
+async def old_create_class(n):
+    async with database.get_async_connection() as conn:
+        cursor = conn.cursor()
+        await cursor.execute("SELECT id FROM classes WHERE class_name = :class_name", {"class_name": f"old-{n}"})
+        await cursor.fetchone()
+        await cursor.execute("INSERT INTO classes (class_name) VALUES (:class_name)", {"class_name": f"old-{n}"})
+        await cursor.execute("""
+            SELECT id, class_name, created_at FROM classes WHERE class_name = :class_name
+            ORDER BY created_at DESC FETCH FIRST 1 ROW ONLY
+        """, {"class_name": f"old-{n}"})
+        await cursor.fetchone()
+        await conn.commit()
+
+
+async def new_create_class(n):
+    await classes.create_class(ClassCreate(class_name=f"new-{n}"))
+
+
+def old_register(n):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        email = f"old-{n}@example.com"
+        cursor.execute("SELECT id, email, password_hash, created_at FROM users WHERE email = :email", {"email": email})
+        cursor.fetchone()
+        cursor.execute("INSERT INTO users (email, password_hash) VALUES (:email, :password_hash)",
+                       {"email": email, "password_hash": "x"})
+        cursor.execute("""
+            SELECT id, email, password_hash, created_at FROM users WHERE email = :email
+            ORDER BY created_at DESC FETCH FIRST 1 ROW ONLY
+        """, {"email": email})
+        cursor.fetchone()
+        conn.commit()
+
+
+async def old_upload_lecture(n):
+    """The lecture part of the old upload_lecture (no files), then the same label and reload steps."""
+    async with database.get_async_connection() as conn:
+        cursor = conn.cursor()
+        binds = {"class_id": 1, "lecture_title": "Lecture", "lecture_date": date(2024, 1, 1)}
+        await cursor.execute("""
+            INSERT INTO lectures (class_id, lecture_title, lecture_date)
+            VALUES (:class_id, :lecture_title, :lecture_date)
+        """, binds)
+        await cursor.execute("""
+            SELECT id, class_id, lecture_title, lecture_date, created_at FROM lectures
+            WHERE class_id = :class_id AND lecture_title = :lecture_title
+            ORDER BY created_at DESC FETCH FIRST 1 ROW ONLY
+        """, {"class_id": 1, "lecture_title": "Lecture"})
+        lecture_id = (await cursor.fetchone())[0]
+        label_ids = await link_lecture_labels(cursor, lecture_id, LABELS.split(","))
+        await conn.commit()
+        label_cache.put_many(label_ids)
+        await lectures.get_lecture_data_async(cursor, lecture_id)
+
+
+async def new_upload_lecture(n):
+    await lectures.upload_lecture(
+        pdf_file=None, transcript_file=None, class_id=1,
+        lecture_title="Lecture", lecture_date=date(2024, 1, 1), labels=LABELS,
+    )
+
+
+async def measure(db, fn):
+    db.reset_counters()
+    start = time.perf_counter()
+    for n in range(RUNS):
+        result = fn(n)
+        if asyncio.iscoroutine(result):
+            await result
+    elapsed = (time.perf_counter() - start) * 1000
+    return db.round_trips / RUNS, elapsed / RUNS
+
+
+async def no_hash(password):
+    return "x"
+
+
+async def main():
+    auth.hash_password = no_hash
+    db = FakeDatabase(latency=LATENCY)
+    db.install(database)
+    db.seed_class("Bench", 0)
+
+    print(f"{LATENCY * 1000:.0f} ms per round trip, mean of {RUNS} runs")
+    print(f"{'operation':>16} {'trips before':>13} {'trips after':>12} {'ms before':>10} {'ms after':>9}")
+    for name, old, new in (
+        ("create_class", old_create_class, new_create_class),
+        ("register", old_register, lambda n: auth.register(UserCreate(email=f"new-{n}@example.com", password="x"))),
+        ("upload_lecture", old_upload_lecture, new_upload_lecture),
+    ):
+        old_trips, old_ms = await measure(db, old)
+        new_trips, new_ms = await measure(db, new)
+        print(f"{name:>16} {old_trips:>13.0f} {new_trips:>12.0f} {old_ms:>10.1f} {new_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,416 @@
+"""
+SQLite stand-in for the Oracle schema, used by the benchmarks.
+
+Every ``execute``/``executemany`` counts as one round trip and can sleep for a
+configurable latency, which is what the benchmarks measure against. A handful
+of Oracle-only constructs used by the routers are rewritten to SQLite.
+"""
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import oracledb
+
+# Timestamps are stored with millisecond precision, so bind them the same way
+# to keep keyset comparisons exact.
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", "milliseconds"))
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE classes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_name TEXT UNIQUE NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE lectures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_id INTEGER NOT NULL,
+    lecture_title TEXT NOT NULL,
+    lecture_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT UNIQUE NOT NULL,
+    byte_size INTEGER NOT NULL,
+    extracted_text TEXT,
+    page_offsets TEXT,
+    ref_count INTEGER DEFAULT 0 NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE document_chunks (
+    document_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    char_start INTEGER NOT NULL,
+    char_end INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (document_id, ordinal)
+);
+CREATE INDEX document_chunks_hash_ix ON document_chunks (content_hash);
+CREATE TABLE lecture_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lecture_id INTEGER NOT NULL,
+    file_type TEXT NOT NULL,
+    pdf_text TEXT,
+    document_id INTEGER,
+    uploaded_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE lecture_digests (
+    lecture_id INTEGER PRIMARY KEY,
+    digest_text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE labels (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label_name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE lecture_labels (
+    lecture_id INTEGER NOT NULL,
+    label_id INTEGER NOT NULL
+);
+CREATE TABLE quizzes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_id INTEGER NOT NULL,
+    quiz_title TEXT NOT NULL,
+    quiz_content TEXT,
+    quiz_results TEXT,
+    document_id INTEGER,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE class_analysis (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_id INTEGER NOT NULL,
+    analysis_text TEXT,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+-- The dictionary view search consults; empty, as there is no Oracle Text index
+CREATE TABLE user_indexes (
+    table_name TEXT,
+    index_type TEXT,
+    ityp_name TEXT
+);
+"""
+
+_REWRITES = [
+    # Single-row insert-if-missing MERGE (see app.utils.labels)
+    (re.compile(
+        r"MERGE\s+INTO\s+(\w+)\s+\w+\s+USING\s+\(SELECT\s+:(\w+)\s+AS\s+\w+\s+FROM\s+dual\)\s+\w+\s+"
+        r"ON\s+\(.*?\)\s+WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s+\((\w+)\)\s+VALUES\s+\([\w.]+\)",
+        re.I | re.S,
+    ), r"INSERT OR IGNORE INTO \1 (\3) VALUES (:\2)"),
+    # Array upsert of document references (see app.utils.documents)
+    (re.compile(
+        r"MERGE\s+INTO\s+documents\b.*?WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s+\(([^)]*)\)\s+VALUES\s+\([^)]*\)",
+        re.I | re.S,
+    ), r"INSERT INTO documents (\1) VALUES (:sha256, :byte_size, :extracted_text, :page_offsets, :refs) "
+       r"ON CONFLICT (sha256) DO UPDATE SET ref_count = ref_count + excluded.ref_count"),
+    (re.compile(r"FETCH\s+FIRST\s+(:?\w+)\s+ROWS?\s+ONLY", re.I), r"LIMIT \1"),
+    (re.compile(r"\bSYSTIMESTAMP\b", re.I), "CURRENT_TIMESTAMP"),
+]
+
+
+_RETURNING = re.compile(r"\s+RETURNING\s+(.+?)\s+INTO\s+(.+?)\s*$", re.I | re.S)
+
+
+def to_sqlite(sql):
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class FakeVar:
+    """Mirrors an oracledb variable bound for DML RETURNING ... INTO."""
+
+    def __init__(self, arraysize=1):
+        self.values = [[] for _ in range(arraysize)]
+
+    def getvalue(self, pos=0):
+        return self.values[pos]
+
+
+def split_returning(sql):
+    """SQLite statement plus the (column, bind name) pairs of a RETURNING ... INTO clause."""
+    match = _RETURNING.search(sql)
+    if match is None:
+        return sql, []
+    columns = [c.strip() for c in match.group(1).split(",")]
+    names = [n.strip().lstrip(":") for n in match.group(2).split(",")]
+    return f"{sql[:match.start()]} RETURNING {', '.join(columns)}", list(zip(columns, names))
+
+
+class FakeOraError:
+    """Stands in for the error object oracledb puts in ``args[0]``: its ORA code and message."""
+
+    CODES = {"UNIQUE": 1, "NOT NULL": 1400, "CHECK": 2290, "FOREIGN KEY": 2291}
+
+    def __init__(self, message: str):
+        self.message = message
+        self.code = next((code for kind, code in self.CODES.items() if message.startswith(f"{kind} constraint")), 0)
+        self.full_code = f"ORA-{self.code:05d}"
+
+    def __str__(self):
+        return f"{self.full_code}: {self.message}"
+
+
+class FakeCursor:
+    def __init__(self, db, blocking=True):
+        self._db = db
+        self._cursor = db.raw.cursor()
+        self._blocking = blocking
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self._input_vars = {}
+
+    def _round_trip(self):
+        self._db.round_trips += 1
+        if self._blocking and self._db.latency:
+            time.sleep(self._db.latency)
+
+    def var(self, typ, arraysize=1):
+        return FakeVar(arraysize)
+
+    def setinputsizes(self, **sizes):
+        self._input_vars = {name: v for name, v in sizes.items() if isinstance(v, FakeVar)}
+
+    def _execute_returning(self, sql, returning, rows):
+        # One statement per row, filling the RETURNING vars like an array DML would
+        for pos, binds in enumerate(rows):
+            out = dict(self._input_vars)
+            out.update({k: v for k, v in binds.items() if isinstance(v, FakeVar)})
+            binds = {k: v for k, v in binds.items() if not isinstance(v, FakeVar)}
+            self._cursor.execute(sql, binds)
+            result = self._cursor.fetchall()
+            for index, (_, name) in enumerate(returning):
+                out[name].values[pos] = [r[index] for r in result]
+
+    @contextmanager
+    def _statement(self):
+        # Constraint violations surface as oracledb's, with the ORA code the app checks
+        with self._db.lock:
+            try:
+                yield
+            except sqlite3.IntegrityError as e:
+                raise oracledb.IntegrityError(FakeOraError(str(e))) from e
+
+    def execute(self, sql, binds=None):
+        self._round_trip()
+        sql, returning = split_returning(to_sqlite(sql))
+        with self._statement():
+            if returning:
+                self._execute_returning(sql, returning, [binds or {}])
+            else:
+                self._cursor.execute(sql, binds or {})
+        return self
+
+    def executemany(self, sql, rows):
+        self._round_trip()
+        sql, returning = split_returning(to_sqlite(sql))
+        with self._statement():
+            if returning:
+                self._execute_returning(sql, returning, list(rows))
+            else:
+                self._cursor.executemany(sql, rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self.arraysize)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self._db = db
+
+    def cursor(self):
+        return FakeCursor(self._db)
+
+    def commit(self):
+        self._db.raw.commit()
+
+    def rollback(self):
+        self._db.raw.rollback()
+
+    def close(self):
+        if self._db.slots is not None:
+            self._db.slots.release()
+
+
+class AsyncFakeCursor:
+    """Mirrors oracledb.AsyncCursor: execute and fetch calls are awaitable."""
+
+    def __init__(self, db):
+        self._db = db
+        self._cursor = FakeCursor(db, blocking=False)
+
+    @property
+    def arraysize(self):
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value):
+        self._cursor.arraysize = value
+
+    def var(self, typ, arraysize=1):
+        return self._cursor.var(typ, arraysize)
+
+    def setinputsizes(self, **sizes):
+        self._cursor.setinputsizes(**sizes)
+
+    async def execute(self, sql, binds=None):
+        self._cursor.execute(sql, binds)
+        if self._db.latency:
+            await asyncio.sleep(self._db.latency)
+
+    async def executemany(self, sql, rows):
+        self._cursor.executemany(sql, rows)
+        if self._db.latency:
+            await asyncio.sleep(self._db.latency)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+    async def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class AsyncFakeConnection:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def cursor(self):
+        return AsyncFakeCursor(self._pool.db)
+
+    async def commit(self):
+        self._pool.db.raw.commit()
+
+    async def rollback(self):
+        self._pool.db.raw.rollback()
+
+    async def close(self):
+        if self._pool.slots is not None:
+            self._pool.slots.release()
+
+
+class FakeAsyncPool:
+    """Mirrors oracledb.AsyncConnectionPool for app.database.get_async_connection."""
+
+    def __init__(self, db):
+        self.db = db
+        self.slots = None
+
+    async def acquire(self):
+        if self.db.max_connections is not None:
+            if self.slots is None:
+                self.slots = asyncio.Semaphore(self.db.max_connections)
+            await self.slots.acquire()
+        return AsyncFakeConnection(self)
+
+    async def close(self, force=False):
+        pass
+
+
+class FakeDatabase:
+    """
+    In-memory database that also acts as the connection pool.
+    ``max_connections`` caps concurrently acquired connections like a real pool's ``max``.
+    """
+
+    def __init__(self, latency=0.0, max_connections=None):
+        self.raw = sqlite3.connect(
+            ":memory:", check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self.raw.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.max_connections = max_connections
+        self.slots = threading.BoundedSemaphore(max_connections) if max_connections else None
+        self.round_trips = 0
+        self._async_pool = None
+
+    # Pool interface used by app.database.get_connection
+    def acquire(self):
+        if self.slots is not None:
+            self.slots.acquire()
+        return FakeConnection(self)
+
+    def async_pool(self):
+        """Pool for app.database.async_pool, sharing this database's tables and counters."""
+        if self._async_pool is None:
+            self._async_pool = FakeAsyncPool(self)
+        return self._async_pool
+
+    def install(self, database_module):
+        """Point app.database's sync and async pools at this fake."""
+        database_module.pool = self
+        database_module.async_pool = self.async_pool()
+
+    def reset_counters(self):
+        self.round_trips = 0
+
+    def seed_class(self, class_name, lectures, text_size=2000, labels_per_lecture=3):
+        """Insert a class with ``lectures`` lectures, each with two files and some labels."""
+        cur = self.raw.cursor()
+        cur.execute("INSERT INTO classes (class_name) VALUES (?)", (class_name,))
+        class_id = cur.lastrowid
+        body = "lorem ipsum " * (text_size // 12)
+        for n in range(lectures):
+            cur.execute(
+                "INSERT INTO lectures (class_id, lecture_title, lecture_date) VALUES (?, ?, '2024-01-01')",
+                (class_id, f"Lecture {n}"),
+            )
+            lecture_id = cur.lastrowid
+            for file_type in ("pdf", "transcript"):
+                cur.execute(
+                    "INSERT INTO lecture_files (lecture_id, file_type, pdf_text) VALUES (?, ?, ?)",
+                    (lecture_id, file_type, body),
+                )
+            for k in range(labels_per_lecture):
+                name = f"topic-{(n + k) % 50}"
+                cur.execute("INSERT OR IGNORE INTO labels (label_name) VALUES (?)", (name,))
+                cur.execute("SELECT id FROM labels WHERE label_name = ?", (name,))
+                cur.execute(
+                    "INSERT INTO lecture_labels (lecture_id, label_id) VALUES (?, ?)",
+                    (lecture_id, cur.fetchone()[0]),
+                )
+        self.raw.commit()
+        return class_id
@@ -99,6 +99,42 @@ interface Class {
   description?: string;
 }
 
+// POST to the class analysis stream and hand each server-sent event to onEvent.
+// EventSource only does GET, so the response body is read and split into events here.
+async function streamClassAnalysis(classId: number, onEvent: (event: string, data: any) => void) {
+  const res = await fetch(`http://localhost:8000/quizzes/class_analytics/${classId}/stream`, { method: 'POST' });
+  if (!res.ok || !res.body) {
+    const body = await res.json().catch(() => null);
+    throw new Error(body?.detail || 'Failed to run analysis');
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // Events end with a blank line
+    let end: number;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      const data: string[] = [];
+      frame.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+      });
+      if (data.length > 0) onEvent(event, JSON.parse(data.join('\n')));
+    }
+  }
+}
+
+const analysisStages: Record<string, string> = {
+  building_prompt: 'Preparing class material...',
+  generating: 'Generating analysis...',
+};
+
 const Dashboard: React.FC = () => {
   const [classes, setClasses] = useState<Class[]>([]);
   const [selectedClass, setSelectedClass] = useState<Class | null>(null);
@@ -109,6 +145,7 @@ const Dashboard: React.FC = () => {
   const [analysisDate, setAnalysisDate] = useState<string | null>(null);
   const [analysisLoading, setAnalysisLoading] = useState(false);
   const [analysisError, setAnalysisError] = useState('');
+  const [analysisStage, setAnalysisStage] = useState<string | null>(null);
   const [lectureRefreshKey, setLectureRefreshKey] = useState(0);
   const [quizRefreshKey, setQuizRefreshKey] = useState(0);
   const [feedback, setFeedback] = useState<string | null>(null);
@@ -177,20 +214,34 @@ const Dashboard: React.FC = () => {
       .finally(() => setAnalysisLoading(false));
   }, [selectedClass]);
 
-  // Handler to run analysis
+  // Handler to run analysis: streamed, so the text shows up as it is generated
   const handleRunAnalysis = async () => {
     if (!selectedClass) return;
     setAnalysisLoading(true);
     setAnalysisError('');
+    setAnalysisStage(null);
+    let text = '';
+    let finished = false;
     try {
-      const res = await fetch(`http://localhost:8000/quizzes/class_analytics/${selectedClass.id}`, { method: 'POST' });
-      if (!res.ok) throw new Error('Failed to run analysis');
-      const data = await res.json();
-      setAnalysis(data.analysis);
-      setAnalysisDate(new Date().toISOString());
+      await streamClassAnalysis(selectedClass.id, (event, data) => {
+        if (event === 'status') {
+          setAnalysisStage(analysisStages[data.stage] || null);
+        } else if (event === 'token') {
+          text += data.text;
+          setAnalysis({ text });
+        } else if (event === 'done') {
+          finished = true;
+          setAnalysis(data.analysis);
+          setAnalysisDate(new Date().toISOString());
+        } else if (event === 'error') {
+          throw new Error(data.detail || 'Failed to run analysis');
+        }
+      });
+      if (!finished) throw new Error('Analysis stream ended early');
     } catch (err: any) {
       setAnalysisError(err.message || 'Error running analysis');
     } finally {
+      setAnalysisStage(null);
       setAnalysisLoading(false);
     }
   };
@@ -235,7 +286,11 @@ const Dashboard: React.FC = () => {
             {/* Class Analysis Section */}
             <div className="mb-8">
               <h2 className="text-xl font-semibold mb-2 text-dark">Class Analysis</h2>
-              {analysisLoading && <div className="text-dark">Loading analysis...</div>}
+              {analysisLoading && <div className="text-dark">{analysisStage || 'Loading analysis...'}</div>}
+              {/* Text streamed so far, until the finished analysis fills the cards */}
+              {analysisLoading && analysis && typeof analysis.text === 'string' && (
+                <div className="whitespace-pre-wrap text-sm text-gray-700 bg-primary rounded p-4 mb-4 max-h-64 overflow-y-auto">{analysis.text}</div>
+              )}
               {analysisError && <div className="text-orange-light">{analysisError}</div>}
               {analysis && (
                 <>
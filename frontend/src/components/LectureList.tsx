@@ -22,7 +22,7 @@ const LectureList: React.FC<LectureListProps> = ({ classId, refreshKey }) => {
       setLoading(true);
       setError('');
       try {
-        const res = await fetch(`http://localhost:8000/lectures/by_class/${classId}`);
+        const res = await fetch(`http://localhost:8000/lectures/by_class/${classId}?fields=summary`);
         if (!res.ok) throw new Error('Failed to fetch lectures');
         const data = await res.json();
         setLectures(data);
@@ -24,7 +24,7 @@ const QuizList: React.FC<QuizListProps> = ({ classId, refreshKey }) => {
       setLoading(true);
       setError('');
       try {
-        const res = await fetch(`http://localhost:8000/quizzes/by_class/${classId}`);
+        const res = await fetch(`http://localhost:8000/quizzes/by_class/${classId}?fields=summary`);
         if (!res.ok) throw new Error('Failed to fetch quizzes');
         const data = await res.json();
         setQuizzes(data);